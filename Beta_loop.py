@@ -1,3 +1,4 @@
+import time
 import numpy as np
 
 """
@@ -12,42 +13,102 @@ Functions:
     main_loop(Mission: List[segments], WC: float, WP: float, guess_WTO: float, 
               max_iteration=20, tolerance=0.001, WSR_guess=110, TWR_guess=0.3) -> Tuple[float, float, float, float, List[float], List[float], List[segments]]:
         Main loop for computing the weight take-off (WTO) by iterating over beta values and updating segments.
+        Raises a `Sizing.utils.feasibility.InfeasibleDesign` error as soon as the design is infeasible.
+    solve_steps(Mission, WC, WP, guess_WTO, ...) -> Iterator[SolverState]:
+        Generator version of main_loop, yields the state of the loops after each iteration.
+    solve_until(Mission, WC, WP, guess_WTO, deadline=None, stop=None, ...) -> SolverState:
+        main_loop with a time budget or a custom stopping criterion, returns the best-so-far design.
 """
 from Sizing.Variable_info.variables import Aircraft
 from Sizing.Mission_analysis import Main_Mission_Parametric
 from Sizing.constraint_analysis import Constraints_Parametric
 from Sizing.MissionProfile.segments import segments
-from tqdm import tqdm
+from Sizing.utils.events import dispatcher
+from Sizing.utils import instrumentation
+from Sizing.utils import feasibility
 from typing import List
 
 
-def Iter_Beta(
+class SolverState:
+    """
+    State of the sizing loops after an iteration, yielded by `Beta_Steps`, `WTO_Steps` and
+    `solve_steps`.
+    Attributes:
+        loop (str): Loop of the iteration, "Beta" or "WTO".
+        iteration (int): Iteration number in the loop.
+        WSR (float): Wing loading of the last Beta iteration.
+        TWR (float): Thrust-to-weight ratio of the last Beta iteration.
+        betas (List[float]): Beta chain of the last mission analysis.
+        constraints (tuple): Results of the last constraint analysis.
+        segments (List[segments]): Segments of the mission, updated in place by the iterations.
+        WTO (float): Takeoff weight, None during the Beta loop.
+        residuals (dict): Absolute change of the values of the loop since the previous iteration.
+        converged (bool): True if the loop of the iteration has converged.
+        beta_converged (bool): True if the Beta loop has converged.
+        elapsed (float): Wall time since the start of the loops (s).
+    """
+
+    def __init__(
+        self,
+        loop,
+        iteration,
+        WSR,
+        TWR,
+        betas,
+        constraints,
+        segments,
+        residuals,
+        converged,
+        elapsed,
+        WTO=None,
+        beta_converged=None,
+    ):
+        self.loop = loop
+        self.iteration = iteration
+        self.WSR = WSR
+        self.TWR = TWR
+        self.betas = betas
+        self.constraints = constraints
+        self.segments = segments
+        self.residuals = residuals
+        self.converged = converged
+        self.elapsed = elapsed
+        self.WTO = WTO
+        self.beta_converged = converged if beta_converged is None else beta_converged
+
+    def results(self):
+        """Results in the format of `main_loop` (WTO is None during the Beta loop)."""
+        return (
+            self.WTO,
+            self.WSR,
+            self.TWR,
+            self.betas[-1],
+            self.betas,
+            self.constraints,
+            self.segments,
+        )
+
+
+def Beta_Steps(
     segments_list: List[segments],
     max_iteration=20,
     tolerance=0.001,
     WSR_guess=110,
     TWR_guess=0.3,
+    start_time=None,
 ):
     """
-    Iteratively computes the Wing Loading (WSR) and Thrust-to-Weight Ratio (TWR)
-    for a given mission profile until convergence is reached or the maximum number
-    of iterations is exceeded. See report section III.A for more details.
+    Generator version of `Iter_Beta`: yields the state of the loop after each iteration, so the
+    caller can follow the convergence or stop the loop on its own criteria.
     Args:
-        segments_list (List[segments]): List of mission segments.
-        max_iteration (int, optional): Maximum number of iterations. Defaults to 20.
-        tolerance (float, optional): Convergence tolerance for WSR and TWR. Defaults to 0.001.
-        WSR_guess (float, optional): Initial guess for Wing Loading (WSR). Defaults to 110.
-        TWR_guess (float, optional): Initial guess for Thrust-to-Weight Ratio (TWR). Defaults to 0.3.
-    Returns:
-        tuple: A tuple containing:
-            - WSR (float): Final Wing Loading after convergence.
-            - TWR (float): Final Thrust-to-Weight Ratio after convergence.
-            - updated_segments_list (List[segments]): Updated list of mission segments.
-            - last_beta (float): Last computed beta value.
-            - betas_list (List[float]): List of all computed beta values.
-            - constraints (List[float]): List of constraint values from the last iteration.
+        segments_list, max_iteration, tolerance, WSR_guess, TWR_guess: See `Iter_Beta`.
+        start_time (float, optional): `time.perf_counter()` origin of the elapsed times.
+                                      Defaults to None (start of the loop).
+    Yields:
+        SolverState: State after each iteration, the last one has converged unless
+                     max_iteration is reached.
     """
-
+    start_time = time.perf_counter() if start_time is None else start_time
     WSR = WSR_guess
     TWR = TWR_guess
     WSR_old = WSR_guess
@@ -55,32 +116,91 @@ def Iter_Beta(
     betas_list = []
 
     for i in range(max_iteration):
-        tqdm.write(f"Starting iteration {i} for Beta loop, WSR: {WSR}, TWR: {TWR}")
-        betas_list, updated_segments_list = (
-            Main_Mission_Parametric.Compute_Mission_Profile_Parametric(
-                WSR, TWR, segments_list
+        with instrumentation.stage("mission"):
+            betas_list, updated_segments_list = (
+                Main_Mission_Parametric.Compute_Mission_Profile_Parametric(
+                    WSR, TWR, segments_list
+                )
             )
-        )
         # betas_updated = [self.weight_fraction.value for self in updated_segments_list]
         # print(f"Betas_updated: {betas_updated}")
-        constraints = Constraints_Parametric.constraint_analysis_main(
-            updated_segments_list, plot=False
-        )
+        with instrumentation.stage("constraint analysis"):
+            constraints = Constraints_Parametric.constraint_analysis_main(
+                updated_segments_list, plot=False
+            )
         segments_list = updated_segments_list
         WSR = constraints[0]
         TWR = constraints[1]
-        if np.abs(WSR - WSR_old) < tolerance and np.abs(TWR - TWR_old) < tolerance:
-            print(f"Convergence reached at iteration {i}")
-            print(f"WSR final: {WSR}, TWR final: {TWR}")
+        residuals = {"WSR": np.abs(WSR - WSR_old), "TWR": np.abs(TWR - TWR_old)}
+        if dispatcher.observers:
+            dispatcher.iteration("Beta", i, {"WSR": WSR, "TWR": TWR}, residuals)
+        converged = residuals["WSR"] < tolerance and residuals["TWR"] < tolerance
+        if converged and dispatcher.observers:
+            dispatcher.converged("Beta", i, {"WSR": WSR, "TWR": TWR})
+        yield SolverState(
+            "Beta",
+            i,
+            WSR,
+            TWR,
+            betas_list,
+            constraints,
+            segments_list,
+            residuals,
+            converged,
+            time.perf_counter() - start_time,
+        )
+        if converged:
             break
         WSR_old = WSR
         TWR_old = TWR
         # print("beta list", betas_list)
-        # print(
-        #     "Betas_updated",
-        #     [self.weight_fraction.value for self in updated_segments_list],
-        # )
-    return WSR, TWR, updated_segments_list, betas_list[-1], betas_list, constraints
+    else:
+        if dispatcher.observers:
+            dispatcher.not_converged("Beta", i, {"WSR": WSR, "TWR": TWR})
+
+
+def Iter_Beta(
+    segments_list: List[segments],
+    max_iteration=20,
+    tolerance=0.001,
+    WSR_guess=110,
+    TWR_guess=0.3,
+):
+    """
+    Iteratively computes the Wing Loading (WSR) and Thrust-to-Weight Ratio (TWR)
+    for a given mission profile until convergence is reached or the maximum number
+    of iterations is exceeded. See report section III.A for more details.
+    The iterations and the convergence are reported to the observers of `Sizing.utils.events`.
+    Args:
+        segments_list (List[segments]): List of mission segments.
+        max_iteration (int, optional): Maximum number of iterations. Defaults to 20.
+        tolerance (float, optional): Convergence tolerance for WSR and TWR. Defaults to 0.001.
+        WSR_guess (float, optional): Initial guess for Wing Loading (WSR). Defaults to 110.
+        TWR_guess (float, optional): Initial guess for Thrust-to-Weight Ratio (TWR). Defaults to 0.3.
+    Returns:
+        tuple: A tuple containing:
+            - WSR (float): Final Wing Loading after convergence.
+            - TWR (float): Final Thrust-to-Weight Ratio after convergence.
+            - updated_segments_list (List[segments]): Updated list of mission segments.
+            - last_beta (float): Last computed beta value.
+            - betas_list (List[float]): List of all computed beta values.
+            - constraints (List[float]): List of constraint values from the last iteration.
+    Raises:
+        InfeasibleDesign: As soon as a segment or the design point is infeasible, see
+            `Sizing.utils.feasibility`.
+    """
+    for state in Beta_Steps(
+        segments_list, max_iteration, tolerance, WSR_guess, TWR_guess
+    ):
+        pass
+    return (
+        state.WSR,
+        state.TWR,
+        state.segments,
+        state.betas[-1],
+        state.betas,
+        state.constraints,
+    )
 
 
 def gamma(WTO):
@@ -96,7 +216,57 @@ def gamma(WTO):
     return kwe / (WTO**0.06)
 
 
-def main_loop(
+def WTO_Steps(beta_state: SolverState, WC, WP, guess_WTO, max_iteration=20, start_time=None):
+    """
+    Generator of the WTO loop for the beta chain of a Beta loop state: yields the state after
+    each iteration (see `Beta_Steps`).
+    """
+    start_time = time.perf_counter() if start_time is None else start_time
+    Beta_final = beta_state.betas[-1]
+
+    def WTO_computed(beta, WC, WP, WTO):
+        denominator = 1 - 1.06 * (1 - beta) - gamma(WTO)
+        feasibility.require(
+            denominator > 0,
+            feasibility.WeightNotClosing,
+            lambda: "The fuel and empty weight fractions leave no room for the payload at "
+            f"WTO = {float(WTO):.1f} lb (1 - Wf/WTO - We/WTO = {float(denominator):.4g})",
+            value=denominator,
+        )
+        return (WC + WP) / denominator
+
+    for i in range(max_iteration):
+        WTO = WTO_computed(Beta_final, WC, WP, guess_WTO)
+        # print(f"Iteration {i} WTO")
+        residuals = {"WTO": np.abs(WTO - guess_WTO)}
+        if dispatcher.observers:
+            dispatcher.iteration("WTO", i, {"WTO": WTO}, residuals)
+        converged = residuals["WTO"] < 1
+        if converged and dispatcher.observers:
+            dispatcher.converged("WTO", i, {"WTO": WTO})
+        yield SolverState(
+            "WTO",
+            i,
+            beta_state.WSR,
+            beta_state.TWR,
+            beta_state.betas,
+            beta_state.constraints,
+            beta_state.segments,
+            residuals,
+            converged,
+            time.perf_counter() - start_time,
+            WTO,
+            beta_state.converged,
+        )
+        if converged:
+            break
+        guess_WTO = WTO
+    else:
+        if dispatcher.observers:
+            dispatcher.not_converged("WTO", i, {"WTO": WTO})
+
+
+def solve_steps(
     Mission: List[segments],
     WC,
     WP,
@@ -106,24 +276,81 @@ def main_loop(
     WSR_guess=110,
     TWR_guess=0.3,
 ):
+    """
+    Generator version of `main_loop`: yields the state after each iteration of the Beta loop,
+    then after each iteration of the WTO loop. The results of the last state are the ones of
+    `main_loop`:
+        for state in solve_steps(Mission, WC, WP, 10000):
+            print(state.loop, state.iteration, state.residuals, state.elapsed)
+        WTO, WSR, TWR, Beta_final, list_betas, constraints, segments = state.results()
+    Yields:
+        SolverState: State after each iteration.
+    """
+    start_time = time.perf_counter()
+    for state in Beta_Steps(
+        Mission, max_iteration, tolerance, WSR_guess, TWR_guess, start_time
+    ):
+        yield state
+    yield from WTO_Steps(state, WC, WP, guess_WTO, max_iteration, start_time)
+
+
+def solve_until(
+    Mission: List[segments],
+    WC,
+    WP,
+    guess_WTO,
+    deadline=None,
+    stop=None,
+    max_iteration=20,
+    tolerance=0.001,
+    WSR_guess=110,
+    TWR_guess=0.3,
+) -> SolverState:
+    """
+    Sizes the aircraft with a time budget or a custom stopping criterion, e.g. in latency-sensitive
+    services. The Beta loop stops at the first iteration ending after the deadline or for which
+    stop(state) is True, then the WTO loop (cheap) is run on the last beta chain, so the returned
+    state is the best design found so far.
+    Parameters:
+    Mission, WC, WP, guess_WTO, max_iteration, tolerance, WSR_guess, TWR_guess: See `main_loop`.
+    deadline (float, optional): Time budget of the Beta loop (s). Defaults to None (no limit).
+    stop (callable, optional): stop(state) -> bool, called after each Beta iteration.
+                               Defaults to None.
+    Returns:
+    SolverState: Last state of the WTO loop, `beta_converged` tells if the Beta loop converged
+                 before being stopped.
+    """
+    start_time = time.perf_counter()
+    for beta_state in Beta_Steps(
+        Mission, max_iteration, tolerance, WSR_guess, TWR_guess, start_time
+    ):
+        if (deadline is not None and beta_state.elapsed >= deadline) or (
+            stop is not None and stop(beta_state)
+        ):
+            break
+    for state in WTO_Steps(beta_state, WC, WP, guess_WTO, max_iteration, start_time):
+        pass
+    return state
 
-    iter_beta = Iter_Beta(Mission, max_iteration, tolerance, WSR_guess, TWR_guess)
 
-    WSR = iter_beta[0]
-    TWR = iter_beta[1]
-    updated_segments_list = iter_beta[2]
-    Beta_final = iter_beta[3]
-    list_betas = iter_beta[4]
-    constraints = iter_beta[5]
+def main_loop(
+    Mission: List[segments],
+    WC,
+    WP,
+    guess_WTO,
+    max_iteration=20,
+    tolerance=0.001,
+    WSR_guess=110,
+    TWR_guess=0.3,
+):
 
-    def WTO_computed(beta, WC, WP, WTO):
-        return (WC + WP) / (1 - 1.06 * (1 - beta) - gamma(WTO))
+    with instrumentation.stage("Beta loop"):
+        for beta_state in Beta_Steps(
+            Mission, max_iteration, tolerance, WSR_guess, TWR_guess
+        ):
+            pass
 
-    for i in range(max_iteration):
-        WTO = WTO_computed(Beta_final, WC, WP, guess_WTO)
-        # print(f"Iteration {i} WTO")
-        if np.abs(WTO - guess_WTO) < 1:
-            print(f"Convergence WTO reached at iteration {i}")
-            break
-        guess_WTO = WTO
-    return (WTO, WSR, TWR, Beta_final, list_betas, constraints, updated_segments_list)
+    with instrumentation.stage("WTO loop"):
+        for state in WTO_Steps(beta_state, WC, WP, guess_WTO, max_iteration):
+            pass
+    return state.results()
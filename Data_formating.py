@@ -1,5 +1,5 @@
+import copy
 import json
-import Inputs.Mission_example as Mission_example
 from Sizing.Variable_info.variables import Variable
 import Sizing.MissionProfile.Segments.acceleration as acceleration_segment
 import Sizing.MissionProfile.Segments.Cruise as cruise_segment
@@ -28,6 +28,12 @@ Functions:
     generate_example_test():
     load_mission_profile(json_file_path) -> List:
         Loads a mission profile from a JSON file and creates a list of phase objects.
+    load_mission_data(json_file_path) -> dict:
+        Loads the raw mission data (the "phases" dictionary) from a JSON file.
+    apply_overrides(mission_data, overrides) -> dict:
+        Returns a copy of the mission data with some phase fields replaced.
+    build_mission(mission_data, overrides=None) -> List:
+        Creates a list of phase objects from raw mission data, with optional overrides.
 """
 
 
@@ -125,6 +131,8 @@ def generate_example_test():
     Returns:
         list: A list of phases created from the mission data.
     """
+    import Inputs.Mission_example as Mission_example
+
     real_segments_list = Mission_example.example()
     generate_json(segment_list=real_segments_list)
 
@@ -145,8 +153,54 @@ def generate_example_test():
 
 
 def load_mission_profile(json_file_path) -> List[segments]:
+    return build_mission(load_mission_data(json_file_path))
+
+
+def load_mission_data(json_file_path) -> dict:
     with open(json_file_path, "r") as json_file:
         data = json.load(json_file)
+    return data
+
+
+def apply_overrides(mission_data: dict, overrides: dict) -> dict:
+    """
+    Returns a copy of the mission data where some fields of the phases are replaced.
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `load_mission_data`.
+    overrides (dict): Mapping "<phase_number>.<field>" -> new value,
+                      e.g. {"7.range": 2500, "7.altitude": 37000}.
+    Returns:
+    dict: A new mission data dictionary, the input one is left untouched.
+    Raises:
+    KeyError: If the phase number or the field does not exist in the mission data.
+    """
+    data = copy.deepcopy(mission_data)
+    phases = {str(phase["phase_number"]): phase for phase in data["phases"]}
+    for key, value in overrides.items():
+        phase_number, field = key.split(".", 1)
+        if phase_number not in phases:
+            raise KeyError(f"Unknown phase number in override {key!r}")
+        if field not in phases[phase_number]:
+            raise KeyError(f"Unknown field in override {key!r}")
+        phases[phase_number][field] = value
+    return data
+
+
+def build_mission(mission_data: dict, overrides: dict = None) -> List[segments]:
+    """
+    Creates a new list of phase objects from raw mission data.
+    The mission data is copied, so the same data can be used to build several missions
+    (each call returns fresh segments that can be modified by the sizing loop).
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `load_mission_data`.
+    overrides (dict, optional): Phase fields to replace, see `apply_overrides`.
+    Returns:
+    List[segments]: The list of phase objects.
+    """
+    if overrides:
+        data = apply_overrides(mission_data, overrides)
+    else:
+        data = copy.deepcopy(mission_data)
     segments_list = []
     for phase_data in data["phases"]:
         phase = create_phase(phase_data)
@@ -1,6 +1,4 @@
 import numpy as np
-import tkinter as tk
-from tkinter import ttk
 import Sizing.MissionProfile.Segments.acceleration as acceleration_segment
 import Sizing.MissionProfile.Segments.Cruise as cruise_segment
 import Sizing.MissionProfile.Segments.Climb as climb_segment
@@ -21,28 +21,19 @@ import argparse as argparse
 import os
 import Data_formating as df
 import Beta_loop as bl
-import gui as gui
 from Sizing.Variable_info.variables import Aircraft
-import gui.Constraints_plot
-import gui.aero_prop
-import gui.weight_breakdown
+from Sizing.results.cache import ResultCache
+from Sizing.results.catalog import RunCatalog
+from Sizing.utils import events
+from Sizing.utils import instrumentation
+from Sizing.utils.feasibility import InfeasibleDesign
 
 
-def main(mission_file):
-    print("\n")
-    print("#############################################")
-    print("Begining Design Process... (This may take a few minutes)")
-    print("#############################################")
-    print("\n")
-    # Find the Inputs and requirements from the Inputs folder
-    current_dir = os.path.dirname(__file__)
-    Inputs_dir = os.path.join(current_dir, "Inputs")
-    Inputs_dir = os.path.normpath(Inputs_dir)
-
-    # Load the mission profile from the specified mission file
+def solve(mission_file, use_cache=True):
+    """Sizes the aircraft for a mission file of the Inputs folder, returns the `main_loop` results."""
+    Inputs_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), "Inputs"))
     mission_data = df.load_mission_profile(os.path.join(Inputs_dir, mission_file))
-    # Run the case
-    results = bl.main_loop(
+    settings = dict(
         Mission=mission_data,
         WC=Aircraft.Payload.Wcrew.value,
         WP=Aircraft.Payload.Wpayload.value,
@@ -52,12 +43,55 @@ def main(mission_file):
         WSR_guess=110,
         TWR_guess=0.3,
     )
+    if not use_cache:
+        return bl.main_loop(**settings)
+    with RunCatalog() as catalog:
+        return catalog.main_loop(**settings)
+
+
+def report_name(mission_file, taken) -> str:
+    """
+    Name of the report of a mission file in the batch mode: the file name without extension, with
+    a suffix (_2, _3...) if it is already taken (same file name in another folder).
+    """
+    base = os.path.splitext(os.path.basename(mission_file))[0]
+    name = base
+    suffix = 2
+    while name in taken:
+        name = f"{base}_{suffix}"
+        suffix += 1
+    return name
+
+
+def main(mission_file, use_cache=True, headless=False, plotlyjs="embed"):
+    print("\n")
+    print("#############################################")
+    print("Begining Design Process... (This may take a few minutes)")
+    print("#############################################")
+    print("\n")
+    # Display the progress of the sizing loops in the terminal, for this call only
+    progress = events.subscribe(events.TerminalProgress())
+    try:
+        # Run the case (or load it from the run catalog if it was already solved)
+        results = solve(mission_file, use_cache)
+    finally:
+        events.unsubscribe(progress)
+
+    # Adding the final values to the Aircraft class (the plotting libraries are only imported here)
+    import gui.report
+
+    gui.report.apply_design(results)
+
+    if headless:
+        # Single report, nothing is displayed
+        with instrumentation.stage("GUI"):
+            gui.weight_breakdown.print_Final_Design()
+            path = os.path.join(os.path.dirname(__file__), "outputs", "report.html")
+            path = gui.report.render_report(results, path, plotlyjs=plotlyjs)
+            print(f"Report written to {path}")
+        print("Aircraft Design Completed")
+        return results
 
-    WTO = results[0]
-    WSR = results[1]
-    TWR = results[2]
-    Beta_final = results[3]
-    Beta_list = results[4]
     constraints = results[5]
     updated_segments_list = results[6]
 
@@ -67,44 +101,56 @@ def main(mission_file):
     wing_loading_landing = constraints[5]
     names_constraints = constraints[6]
 
-    # Adding the final values to the Aircraft class
-    Aircraft.Design.TOW.value = WTO
-    Aircraft.Design.WING_LOADING.value = WSR
-    Aircraft.Design.THRUST_TO_WEIGHT.value = TWR
-    Aircraft.Design.Weight_fractions.value = [
-        seg.weight_fraction.value for seg in updated_segments_list
-    ]
-    Aircraft.Design.Wing_Area.value = WTO / WSR
-    Aircraft.Design.Sea_level_Thrust.value = TWR * WTO
-    Aircraft.Geometry.Wing.Span.value = (
-        Aircraft.Geometry.Wing.Aspect_Ratio.value * Aircraft.Design.Wing_Area.value
-    ) ** 0.5
-
-    # Calculate the empty weight and fuel weight
-    def empty_weight(WTO):
-        kwe = 1.15
-        return WTO * kwe / (WTO**0.06)
-
-    def fuel_weight(WTO, beta_final):
-        ### 1.06 is obtained from empirical data
-        return 1.06 * (1 - beta_final) * WTO
-
-    Aircraft.Structure.Empty_Weight.value = empty_weight(WTO)
-    Aircraft.Design.Fuel_Weight.value = fuel_weight(WTO, Beta_final)
-
     # Display the results using the GUI
-    gui.aero_prop.plots_aero_prop(updated_segments_list)
-    gui.weight_breakdown.combined_weight_plot(updated_segments_list)
-    gui.Constraints_plot.T_WS_WS_diagram(updated_segments_list)
-    gui.weight_breakdown.print_Final_Design()
-    gui.Constraints_plot.constraints_plots(
-        wing_loading=wing_loading_range,
-        Thrusts_Weight_ratios=thrust_weight_lists,
-        y_max=ymax_constraints,
-        wing_loading_landing=wing_loading_landing,
-        names=names_constraints,
-    )
+    with instrumentation.stage("GUI"):
+        gui.aero_prop.plots_aero_prop(updated_segments_list)
+        gui.weight_breakdown.combined_weight_plot(updated_segments_list)
+        gui.Constraints_plot.T_WS_WS_diagram(updated_segments_list)
+        gui.weight_breakdown.print_Final_Design()
+        gui.Constraints_plot.constraints_plots(
+            wing_loading=wing_loading_range,
+            Thrusts_Weight_ratios=thrust_weight_lists,
+            y_max=ymax_constraints,
+            wing_loading_landing=wing_loading_landing,
+            names=names_constraints,
+        )
     print("Aircraft Design Completed")
+    return results
+
+
+def main_batch(mission_files, use_cache=True, processes=1, plotlyjs="directory"):
+    """
+    Headless batch mode: sizes the aircraft for each mission file, then writes the report of each
+    design in outputs/reports/<mission>.html with a pool of worker processes, and the overlay of
+    their constraint diagrams in outputs/reports/envelopes.html. The infeasible missions are
+    reported and skipped. Mission files with the same name get a suffix (see `report_name`).
+    """
+    designs = {}
+    ## Reserved for the overlay of the constraint diagrams
+    taken = {"envelopes"}
+    for mission_file in mission_files:
+        try:
+            results = solve(mission_file, use_cache)
+        except InfeasibleDesign as error:
+            print(f"{mission_file}: infeasible ({error.reason}), {error}")
+            continue
+        name = report_name(mission_file, taken)
+        taken.add(name)
+        designs[name] = results
+        print(f"{mission_file}: WTO = {float(results[0]):.1f} lb, report {name}.html")
+    import gui.report
+
+    output_dir = os.path.join(os.path.dirname(__file__), "outputs", "reports")
+    with instrumentation.stage("GUI"):
+        paths = gui.report.render_reports(designs, output_dir, processes, plotlyjs)
+        if designs:
+            paths.append(
+                gui.report.render_envelopes(
+                    designs, os.path.join(output_dir, "envelopes.html"), plotlyjs=plotlyjs
+                )
+            )
+    print(f"{len(paths)} reports written to {os.path.normpath(output_dir)}")
+    return designs
 
 
 if __name__ == "__main__":
@@ -112,9 +158,79 @@ if __name__ == "__main__":
     parser.add_argument(
         "mission_file",
         type=str,
-        nargs="?",
-        help="Mission file to load",
-        default="Mission_Profile.json",
+        nargs="*",
+        help="Mission file(s) to load, several files run the headless batch mode",
+        default=["Mission_Profile.json"],
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Write the figures into a single report (outputs/report.html) instead of "
+        "displaying them",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Worker processes rendering the reports of the batch mode",
+    )
+    parser.add_argument(
+        "--plotlyjs",
+        choices=["embed", "directory", "cdn"],
+        default=None,
+        help="How the reports include plotly.js (default: embed for a single report, "
+        "directory for the batch mode)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always run the sizing loop, even if the case is in the results cache",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Remove every result from the results cache before running",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record the time spent in each stage and write outputs/profile_report.json "
+        "(same as setting AE_SIZING_PROFILE=1). Use with --no-cache to profile the solver",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help="Also write the cProfile statistics of the run to outputs/profile.pstats",
     )
     args = parser.parse_args()
-    main(args.mission_file)
+    if args.clear_cache:
+        print(f"Removed {ResultCache().clear()} cached results")
+    if args.profile or args.cprofile:
+        instrumentation.enable()
+    outputs_dir = os.path.join(os.path.dirname(__file__), "outputs")
+
+    def run():
+        if len(args.mission_file) > 1:
+            main_batch(
+                args.mission_file,
+                use_cache=not args.no_cache,
+                processes=args.processes,
+                plotlyjs=args.plotlyjs or "directory",
+            )
+        else:
+            main(
+                args.mission_file[0],
+                use_cache=not args.no_cache,
+                headless=args.headless,
+                plotlyjs=args.plotlyjs or "embed",
+            )
+
+    if args.cprofile:
+        with instrumentation.cprofile(os.path.join(outputs_dir, "profile.pstats")):
+            run()
+    else:
+        run()
+    if instrumentation.enabled:
+        instrumentation.print_report()
+        report_path = os.path.join(outputs_dir, "profile_report.json")
+        print(f"Profiling report written to {instrumentation.write_report(report_path)}")
@@ -7,6 +7,7 @@ import numpy as np
 import Sizing.utils.Constants as const
 from Sizing.MissionProfile.segments import segments
 from Sizing.Variable_info.variables import Aircraft
+from Sizing.utils import feasibility
 
 
 class climb(segments):
@@ -337,7 +338,15 @@ class climb(segments):
         if self.type != "Climb":
             # print("Descending : no fuel burned for phase", self.phase_number)
             return 1
-        return np.exp(-tsfc / utils.knots_to_fts(TAS_knots) * delta / (1 - u))
+        feasibility.require(
+            u < 1,
+            feasibility.InsufficientThrust,
+            lambda: f"Not enough thrust to climb in phase {self.phase_number} (u >= 1)",
+            self.phase_number,
+            u,
+        )
+        wf = np.exp(-tsfc / utils.knots_to_fts(TAS_knots) * delta / (1 - u))
+        return feasibility.mask(u < 1, wf)
 
     def alpha_seg(self, WSR):
         """
@@ -8,6 +8,7 @@ import Sizing.utils.Constants as const
 import Sizing.utils.utils as utils
 from Sizing.MissionProfile.segments import segments
 from Sizing.Variable_info.variables import Aircraft
+from Sizing.utils import feasibility
 
 
 class Takeoff(segments):
@@ -158,11 +159,28 @@ class Takeoff(segments):
         Vt0 = np.sqrt((kt0**2 * 2 * beta * Wing_loading) / (rho * Clmax))
         sr = tr * Vt0
         Rc = Vt0**2 / ((0.8 * kt0**2 - 1) * const.SL_GRAVITY_FT)
+        if np.ndim(beta) == 0:
+            ## Single design: fail if no wing loading of the grid can clear the obstacle
+            feasibility.require(
+                np.any(Rc >= hobst / 2),
+                feasibility.TakeoffInfeasible,
+                lambda: f"The obstacle of phase {self.phase_number} cannot be cleared "
+                "(rotation radius below half the obstacle height)",
+                self.phase_number,
+            )
         theta_obs = np.arccos(1 - hobst / Rc)
         s_obst = Rc * np.sin(theta_obs)
         sg_time_thrust_ratio = (beta**2 * kt0**2 * Wing_loading) / (
             alpha * rho * Clmax * const.SL_GRAVITY_FT
         )
+        if np.ndim(beta) == 0:
+            feasibility.require(
+                np.any(st0 - s_obst - sr > 0),
+                feasibility.TakeoffInfeasible,
+                lambda: f"The takeoff field of phase {self.phase_number} is shorter than the "
+                "rotation and obstacle distances",
+                self.phase_number,
+            )
         return sg_time_thrust_ratio / (st0 - s_obst - sr)
 
     ### Mission Analysis
@@ -188,6 +206,14 @@ class Takeoff(segments):
 
         alpha = self.__alpha__(WSR)
         u = (self.ksi(WSR) / self.Cl() + self.mu.value) * (old_beta / (alpha * TWR))
+        feasibility.require(
+            u < 1,
+            feasibility.InsufficientThrust,
+            lambda: f"Not enough thrust to accelerate on the runway in phase {self.phase_number} "
+            "(u >= 1)",
+            self.phase_number,
+            u,
+        )
         WF_over_WI_accel = np.exp(
             -tsfc / const.SL_GRAVITY_FT * (utils.knots_to_fts(Vt0) / (1 - u))
         )
@@ -195,7 +221,7 @@ class Takeoff(segments):
         #### Rotation###
         new_beta = old_beta * WF_over_WI_accel
         Pi_rotation = 1 - tsfc * alpha / new_beta * TWR * self.tr.value
-        return Pi_rotation * WF_over_WI_accel
+        return feasibility.mask(u < 1, Pi_rotation * WF_over_WI_accel)
 
     def alpha_seg(self, WSR):
         return self.__alpha__(WSR)
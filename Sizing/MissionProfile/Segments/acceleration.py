@@ -43,6 +43,7 @@ from Sizing.utils.atmosphere import Atmosphere
 import numpy as np
 import Sizing.utils.Constants as const
 from Sizing.MissionProfile.segments import segments
+from Sizing.utils import feasibility
 
 
 class acceleration(segments):
@@ -241,7 +242,16 @@ class acceleration(segments):
         )
         V = utils.knots_to_fts(V_start + V_end) / 2
         delta_V = (V_end**2 - V_start**2) / (2 * const.SL_GRAVITY_FT)
-        return np.exp(-self.tsfc(WSR) / V * delta_V / (1 - self.u(WSR, TWR)))
+        u = self.u(WSR, TWR)
+        feasibility.require(
+            u < 1,
+            feasibility.InsufficientThrust,
+            lambda: f"Not enough thrust to accelerate in phase {self.phase_number} (u >= 1)",
+            self.phase_number,
+            u,
+        )
+        wf = np.exp(-self.tsfc(WSR) / V * delta_V / (1 - u))
+        return feasibility.mask(u < 1, wf)
 
     def alpha_seg(self, WSR):
         return self.thrust_lapse()
@@ -0,0 +1,165 @@
+import copy
+import json
+import Data_formating as df
+from Sizing.Mission_analysis.Main_Mission_Parametric import Compute_Beta_Segment
+from Sizing.MissionProfile.segments import segments
+from Sizing.Variable_info.Variable import Variable
+from Sizing.utils.events import dispatcher
+from Sizing.utils import feasibility
+from typing import List
+
+"""
+This module provides an incremental mission evaluator.
+`Compute_Mission_Profile_Parametric` integrates every segment from taxi-out to landing. The
+weight fraction at the end of a segment only depends on the weight fraction entering it, so when
+only a late segment of the mission changes (e.g. the loiter time or the reserve cruise range), the
+segments before it do not need to be computed again.
+The evaluator records the beta entering and leaving each segment, together with a signature of
+each segment definition. A new evaluation (or a what-if question) only recomputes the first
+modified segment and its successors, and reuses the stored upstream betas.
+Each computed segment goes through the same feasibility check as in
+`Compute_Mission_Profile_Parametric`, so both raise `WeightNotClosing` for the same mission.
+Classes:
+    MissionEvaluator:
+        Mission evaluation that recomputes only the modified part of the mission.
+Functions:
+    segment_signature(segment) -> str:
+        Canonical description of a segment definition, used to detect modified segments.
+"""
+
+
+def segment_signature(segment: segments) -> str:
+    """
+    Returns a canonical description of the segment definition. The weight fraction is not part
+    of the signature: it is the result of the upstream segments.
+    """
+    attributes = df.extract_attributes(segment)
+    attributes.pop("weight_fraction")
+    return json.dumps(attributes, sort_keys=True, default=str)
+
+
+class MissionEvaluator:
+    """
+    Evaluates the mission profile and keeps, for each segment, the beta entering and leaving it.
+    Attributes:
+        segments_list (List[segments]): Segments of the mission, updated with the computed betas.
+        betas_in (List[float]): Weight fraction at the beginning of each segment.
+        betas_out (List[float]): Weight fraction at the end of each segment.
+        computed_segments (int): Number of segments computed by the last evaluation.
+    """
+
+    def __init__(self, segments_list: List[segments]):
+        self.segments_list = segments_list
+        self.betas_in = []
+        self.betas_out = []
+        self.computed_segments = 0
+        self._signatures = []
+        self._WSR = None
+        self._TWR = None
+
+    def first_modified_segment(self, WSR, TWR):
+        """
+        Returns the index of the first segment that has to be computed again, len(segments_list)
+        if the stored results are up to date.
+        """
+        if (
+            self._WSR != WSR
+            or self._TWR != TWR
+            or not self.betas_out
+            or self.segments_list[0].weight_fraction.value != self.betas_in[0]
+        ):
+            return 0
+        for i, segment in enumerate(self.segments_list):
+            if i >= len(self._signatures) or segment_signature(segment) != (
+                self._signatures[i]
+            ):
+                return i
+        return len(self.segments_list)
+
+    def evaluate(self, WSR, TWR):
+        """
+        Computes the mission profile, reusing the betas of the segments that did not change since
+        the last evaluation. Same results as `Compute_Mission_Profile_Parametric`.
+        Parameters:
+        WSR (float): Wing loading ratio.
+        TWR (float): Thrust-to-weight ratio.
+        Returns:
+        tuple: (Betas_list, segments_list) as returned by `Compute_Mission_Profile_Parametric`.
+        Raises:
+        WeightNotClosing: If the weight fraction at the end of a segment is not finite and positive.
+        """
+        start = self.first_modified_segment(WSR, TWR)
+        betas_in, betas_out = self._compute(WSR, TWR, self.segments_list, start)
+        self.betas_in = betas_in
+        self.betas_out = betas_out
+        self._signatures = self._signatures[:start] + [
+            segment_signature(segment) for segment in self.segments_list[start:]
+        ]
+        self._WSR = WSR
+        self._TWR = TWR
+        return list(self.betas_out), self.segments_list
+
+    def replace_segment(self, index, segment: segments, WSR=None, TWR=None):
+        """
+        Replaces the segment at index and recomputes the mission from this segment.
+        WSR and TWR default to the values of the last evaluation.
+        """
+        self.segments_list[index] = segment
+        return self.evaluate(
+            self._WSR if WSR is None else WSR, self._TWR if TWR is None else TWR
+        )
+
+    def what_if(self, index, segment: segments = None, **changes):
+        """
+        Computes the betas of the mission if the segment at index was modified, without changing
+        the stored mission. Only the segment and its successors are computed.
+        Parameters:
+        index (int): Index of the modified segment.
+        segment (segments, optional): New definition of the segment.
+        **changes: New values of some attributes of the segment, e.g. time=30 for a loiter.
+        Returns:
+        List[float]: Weight fraction at the end of each segment of the modified mission.
+        Raises:
+        ValueError: If the mission has not been evaluated yet.
+        """
+        if not self.betas_out:
+            raise ValueError("The mission must be evaluated before asking a what-if")
+        new_segment = copy.deepcopy(
+            self.segments_list[index] if segment is None else segment
+        )
+        for name, value in changes.items():
+            attribute = getattr(new_segment, name)
+            if isinstance(attribute, Variable):
+                attribute.value = value
+            else:
+                setattr(new_segment, name, value)
+        suffix = [new_segment] + copy.deepcopy(self.segments_list[index + 1 :])
+        suffix[0].weight_fraction.value = self.betas_in[index]
+        _, betas_out = self._compute(self._WSR, self._TWR, suffix, 0)
+        return list(self.betas_out[:index]) + betas_out
+
+    def _compute(self, WSR, TWR, segments_list, start):
+        betas_in = list(self.betas_in[:start])
+        betas_out = list(self.betas_out[:start])
+        if 0 < start < len(segments_list):
+            segments_list[start].weight_fraction.value = betas_out[start - 1]
+        for i in range(start, len(segments_list)):
+            betas_in.append(segments_list[i].weight_fraction.value)
+            if dispatcher.observers:
+                dispatcher.segment_start(i, segments_list[i])
+            Beta = float(Compute_Beta_Segment(WSR, TWR, segments_list[i]))
+            if dispatcher.observers:
+                dispatcher.segment_end(i, segments_list[i], Beta)
+            feasibility.require(
+                feasibility.finite(Beta) & (Beta > 0),
+                feasibility.WeightNotClosing,
+                lambda: f"Invalid weight fraction {Beta} at the end of phase "
+                f"{segments_list[i].phase_number}",
+                segments_list[i].phase_number,
+                Beta,
+            )
+            betas_out.append(Beta)
+            if i != len(segments_list) - 1:
+                segments_list[i + 1].weight_fraction.value = Beta
+        self.computed_segments = len(segments_list) - start
+        return betas_in, betas_out
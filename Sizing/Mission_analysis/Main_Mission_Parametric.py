@@ -1,10 +1,13 @@
+import numpy as np
 from Sizing.MissionProfile.segments import segments
 import Sizing.MissionProfile.Segments.acceleration as acceleration_segment
 import Sizing.MissionProfile.Segments.Cruise as cruise_segment
 import Sizing.MissionProfile.Segments.Climb as climb_segment
 import Sizing.MissionProfile.Segments.approach as approach_segment
+from Sizing.utils.events import dispatcher
+from Sizing.utils import instrumentation
+from Sizing.utils import feasibility
 from typing import List
-from tqdm import tqdm
 
 
 def Compute_Beta_Climb(WSR, TWR, climb_leg: climb_segment.climb, step=500):
@@ -22,27 +25,30 @@ def Compute_Beta_Climb(WSR, TWR, climb_leg: climb_segment.climb, step=500):
     The final beta_climb value is returned.
     """
 
-    start_altitude = climb_leg.start_altitude.value
-    end_altitude = climb_leg.end_altitude.value
     beta_climb = climb_leg.weight_fraction.value
-    for i in tqdm(
-        range(start_altitude, end_altitude, step),
-        desc="Climbing_decomposition phase number " + str(climb_leg.phase_number),
-        leave=False,
-    ):
-        climb = climb_segment.climb(
+    for climb in Climb_Steps(climb_leg, step):
+        climb.weight_fraction.value = beta_climb
+        beta_climb = beta_climb * climb.wf_wi(WSR, TWR)
+        # print(f"Climbing {i} to {i + step} fts: beta_end_of_leg :  ", beta_climb)
+    return beta_climb
+
+
+def Climb_Steps(climb_leg: climb_segment.climb, step=500):
+    """
+    Yields the sub-segments of step feet of a climb segment, their weight fraction being set by
+    the caller.
+    """
+    for i in range(climb_leg.start_altitude.value, climb_leg.end_altitude.value, step):
+        yield climb_segment.climb(
             climb_rate=climb_leg.climb_rate.value,
             KEAS=climb_leg.KEAS.value,
             start_altitude=i,
             end_altitude=i + step,
             time=climb_leg.time.value,
-            weight_fraction=beta_climb,
+            weight_fraction=None,
             flight_path_angle=climb_leg.flight_path_angle.value,
             MACH=climb_leg.MACH.value,
         )
-        beta_climb *= climb.wf_wi(WSR, TWR)
-        # print(f"Climbing {i} to {i + step} fts: beta_end_of_leg :  ", beta_climb)
-    return beta_climb
 
 
 def Compute_Beta_Acceleration(
@@ -61,22 +67,10 @@ def Compute_Beta_Acceleration(
     The initial beta value comes from the segment given. The final beta_accel value is returned.
     """
 
-    start_speed = accel_leg.KEAS_start.value
-    end_speed = accel_leg.KEAS_end.value
     beta_accel = accel_leg.weight_fraction.value
-    for speed in tqdm(
-        range(start_speed, end_speed, step),
-        desc="Acceleration decomposition, phase number:" + str(accel_leg.phase_number),
-        leave=False,
-    ):
-        acceleration = acceleration_segment.acceleration(
-            KEAS_start=speed,
-            KEAS_end=speed + step,
-            time=accel_leg.time.value,
-            weight_fraction=beta_accel,
-            altitude=accel_leg.altitude.value,
-        )
-        beta_accel *= acceleration.wf_wi(WSR, TWR)
+    for acceleration in Acceleration_Steps(accel_leg, step):
+        acceleration.weight_fraction.value = beta_accel
+        beta_accel = beta_accel * acceleration.wf_wi(WSR, TWR)
         # print(
         #     f"Accelerating from {speed} to {speed + step} kts: beta_end_of_leg :  ",
         #     beta_accel,
@@ -84,6 +78,21 @@ def Compute_Beta_Acceleration(
     return beta_accel
 
 
+def Acceleration_Steps(accel_leg: acceleration_segment.acceleration, step=1):
+    """
+    Yields the sub-segments of step knots of an acceleration segment, their weight fraction being
+    set by the caller.
+    """
+    for speed in range(accel_leg.KEAS_start.value, accel_leg.KEAS_end.value, step):
+        yield acceleration_segment.acceleration(
+            KEAS_start=speed,
+            KEAS_end=speed + step,
+            time=accel_leg.time.value,
+            weight_fraction=None,
+            altitude=accel_leg.altitude.value,
+        )
+
+
 def Compute_Beta_Cruise(WSR, cruise_leg: cruise_segment.cruise, steps=10):
     """
     Computes the weight fraction (beta) for a cruise segment of an aircraft mission profile.
@@ -96,25 +105,29 @@ def Compute_Beta_Cruise(WSR, cruise_leg: cruise_segment.cruise, steps=10):
     float: The weight fraction (beta) at the end of the cruise segment.
     The function calculates the weight fraction using the wf_wi method of the cruise_segment.cruise class and returns the beta_cruise value.
     """
-    ranges_nmi = cruise_leg.range.value / steps
     beta_cruise = cruise_leg.weight_fraction.value
-    for i in tqdm(
-        range(steps),
-        desc="Cruise decomposition :  phase number" + str(cruise_leg.phase_number),
-        leave=False,
-    ):
-        cruise = cruise_segment.cruise(
+    for cruise in Cruise_Steps(cruise_leg, steps):
+        cruise.weight_fraction.value = beta_cruise
+        beta_cruise = beta_cruise * cruise.wf_wi(WSR)
+        # print(f"Cruising step {i} beta_end_of_leg :  ", beta_cruise)
+    return beta_cruise
+
+
+def Cruise_Steps(cruise_leg: cruise_segment.cruise, steps=10):
+    """
+    Yields the steps sub-segments of equal range of a cruise segment, their weight fraction being
+    set by the caller.
+    """
+    ranges_nmi = cruise_leg.range.value / steps
+    for i in range(steps):
+        yield cruise_segment.cruise(
             altitude=cruise_leg.altitude.value,
             range=ranges_nmi,
-            weight_fraction=beta_cruise,
+            weight_fraction=None,
             EAS=cruise_leg.EAS.value,
             Mach=cruise_leg.Mach.value,
             bank_angle=cruise_leg.bank_angle.value,
         )
-        beta_cruise *= cruise.wf_wi(WSR)
-        # print(f"Cruising step {i} beta_end_of_leg :  ", beta_cruise)
-        # print("From ", i * ranges_nmi, " to ", (i + 1) * ranges_nmi)
-    return beta_cruise
 
 
 def Compute_Beta_Approach(WSR, TWR, approach_leg: approach_segment.approach, steps=100):
@@ -128,22 +141,9 @@ def Compute_Beta_Approach(WSR, TWR, approach_leg: approach_segment.approach, ste
     float: The weight fraction (beta) at the end of the approach segment.
     The function calculates the weight fraction using the wf_wi method of the approach_segment.approach class and returns the beta_approach value.
     """
-    start_altitude = approach_leg.start_altitude.value
-    end_altitude = approach_leg.end_altitude.value
     beta_approach = approach_leg.weight_fraction.value
-    for i in tqdm(
-        range(start_altitude, end_altitude, -steps),
-        desc="Approach decomposition. Phase number :" + str(approach_leg.phase_number),
-        leave=False,
-    ):
-        approach_seg = approach_segment.approach(
-            flight_path_angle=approach_leg.flight_path_angle.value,
-            start_altitude=i,
-            end_altitude=i - steps,
-            weight_fraction=beta_approach,
-            KEAS=approach_leg.KEAS.value,
-            percent_fuel_flow=approach_leg.percent_fuel_flow.value,
-        )
+    for approach_seg in Approach_Steps(approach_leg, steps):
+        approach_seg.weight_fraction.value = beta_approach
         # print(
         #     "Approaching step ",
         #     i,
@@ -152,12 +152,72 @@ def Compute_Beta_Approach(WSR, TWR, approach_leg: approach_segment.approach, ste
         #     "weight fraction",
         #     approach_seg.wf_wi(WSR, TWR),
         # )
-        beta_approach *= approach_seg.wf_wi(WSR, TWR)
+        beta_approach = beta_approach * approach_seg.wf_wi(WSR, TWR)
         # print(f"Approaching step {i} beta_end_of_leg :  ", beta_approach)
-        # print("from ", i, " to ", i - steps)
     return beta_approach
 
 
+def Approach_Steps(approach_leg: approach_segment.approach, steps=100):
+    """
+    Yields the sub-segments of steps feet of an approach segment, their weight fraction being set
+    by the caller.
+    """
+    for i in range(approach_leg.start_altitude.value, approach_leg.end_altitude.value, -steps):
+        yield approach_segment.approach(
+            flight_path_angle=approach_leg.flight_path_angle.value,
+            start_altitude=i,
+            end_altitude=i - steps,
+            weight_fraction=None,
+            KEAS=approach_leg.KEAS.value,
+            percent_fuel_flow=approach_leg.percent_fuel_flow.value,
+        )
+
+
+def Compute_Beta_Segment(WSR, TWR, segment: segments):
+    """
+    Computes the weight fraction (beta) at the end of any segment of the mission profile.
+    The weight fraction at the beginning of the segment is the one stored in the segment.
+    Parameters:
+    WSR (float): Wing loading ratio.
+    TWR (float): Thrust-to-weight ratio.
+    segment (segments): The segment to compute.
+    Returns:
+    float: The weight fraction (beta) at the end of the segment.
+    Climb, cruise, approach and acceleration segments are decomposed in smaller steps,
+    the other segments are computed in one step.
+    """
+    match segment.type:
+        case "Climb":
+            return Compute_Beta_Climb(WSR, TWR, segment, step=500)
+        case "Cruise":
+            return Compute_Beta_Cruise(WSR, segment, steps=10)
+        case "Approach":
+            return Compute_Beta_Approach(WSR, TWR, segment, steps=100)
+        case "Acceleration":
+            return Compute_Beta_Acceleration(WSR, TWR, segment, step=5)
+        case _:
+            return segment.weight_fraction.value * segment.wf_wi(WSR, TWR)
+
+
+def Segment_Steps(segment: segments):
+    """
+    Yields the sub-segments used by `Compute_Beta_Segment` to integrate a segment: the steps of the
+    climb, cruise, approach and acceleration segments, the segment itself for the other ones.
+    The weight fraction of each sub-segment is set by the caller before it is evaluated.
+    """
+    match segment.type:
+        case "Climb":
+            return Climb_Steps(segment, step=500)
+        case "Cruise":
+            return Cruise_Steps(segment, steps=10)
+        case "Approach":
+            return Approach_Steps(segment, steps=100)
+        case "Acceleration":
+            return Acceleration_Steps(segment, step=5)
+        case _:
+            return iter((segment,))
+
+
 def Compute_Mission_Profile_Parametric(
     WSR, TWR, segments_list: List[segments]
 ) -> tuple[list, List[segments]]:
@@ -173,22 +233,24 @@ def Compute_Mission_Profile_Parametric(
     updated_segments_list = segments_list
     Beta = updated_segments_list[0].weight_fraction.value  ## Initial weight fraction
     Betas_list = []
-    for i in tqdm(range(len(updated_segments_list))):
-        match segments_list[i].type:
-            case "Climb":
-                Beta = Compute_Beta_Climb(WSR, TWR, updated_segments_list[i], step=500)
-            case "Cruise":
-                Beta = Compute_Beta_Cruise(WSR, updated_segments_list[i], steps=10)
-            case "Approach":
-                Beta = Compute_Beta_Approach(
-                    WSR, TWR, updated_segments_list[i], steps=100
-                )
-            case "Acceleration":
-                Beta = Compute_Beta_Acceleration(
-                    WSR, TWR, updated_segments_list[i], step=5
-                )
-            case _:
-                Beta *= float(updated_segments_list[i].wf_wi(WSR, TWR))
+    if dispatcher.observers:
+        dispatcher.mission_start(updated_segments_list)
+    for i in range(len(updated_segments_list)):
+        if dispatcher.observers:
+            dispatcher.segment_start(i, updated_segments_list[i])
+        with instrumentation.stage("mission/" + updated_segments_list[i].type):
+            Beta = Compute_Beta_Segment(WSR, TWR, updated_segments_list[i])
+        if dispatcher.observers:
+            dispatcher.segment_end(i, updated_segments_list[i], Beta)
+        ## The segments return one-element arrays, the mission loop evaluates a single design
+        feasibility.require(
+            np.all(feasibility.finite(Beta) & (Beta > 0)),
+            feasibility.WeightNotClosing,
+            lambda: f"Invalid weight fraction {float(Beta)} at the end of phase "
+            f"{updated_segments_list[i].phase_number}",
+            updated_segments_list[i].phase_number,
+            Beta,
+        )
         # print(
         #     "Phase ",
         #     updated_segments_list[i].phase_number,
@@ -207,4 +269,6 @@ def Compute_Mission_Profile_Parametric(
     # print(
     #     "Betas_updated", [self.weight_fraction.value for self in updated_segments_list]
     # )
+    if dispatcher.observers:
+        dispatcher.mission_end(Betas_list)
     return Betas_list, updated_segments_list
@@ -0,0 +1,379 @@
+import numpy as np
+import Sizing.constraint_analysis.Additional_Constraints as Additional_Constraints
+from Sizing.Mission_analysis.Main_Mission_Parametric import Compute_Beta_Segment
+from Sizing.MissionProfile.segments import segments
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.utils import dual
+from typing import List
+
+"""
+This module computes the derivatives of the mission and constraint analyses.
+The weight fractions (`wf_wi`) and thrust-to-weight ratios (`Thrust_Weight_Ratio`) of the segments
+are closed-form expressions. They are differentiated in forward mode by evaluating them once with
+dual numbers (`Sizing.utils.dual`) as wing loading, thrust-to-weight ratio and incoming beta, so a
+gradient costs about one extra evaluation instead of two or more per variable with finite
+differences. The segment derivatives are chained through the mission (each beta depends on the
+previous one) and through the constraint analysis, up to the design level:
+    - d beta_i / d(WSR, TWR) for every segment of the mission,
+    - d(WSR_design, TWR_design) / d beta_i through the constraint envelope,
+    - the Jacobian of the Beta loop iteration (WSR, TWR) -> (WSR_design, TWR_design), for Newton solvers,
+    - d(WTO, fuel weight, Beta_final) / d(WSR, TWR), the WTO being differentiated implicitly.
+Functions:
+    wf_wi_derivatives(segment, WSR, TWR) -> tuple:
+        wf_wi of a segment and its derivatives with respect to WSR, TWR and the incoming beta.
+    thrust_weight_derivatives(segment, wing_loading) -> tuple:
+        Thrust_Weight_Ratio of a segment and its derivatives with respect to wing loading and beta.
+    beta_derivatives(segment, WSR, TWR) -> tuple:
+        Beta at the end of a segment (integrated in steps) and its derivatives.
+    mission_derivatives(WSR, TWR, segments_list) -> dict:
+        Betas of the mission and their derivatives with respect to WSR and TWR.
+    constraint_derivatives(segments_list) -> dict:
+        Design point of the constraint analysis and its derivatives with respect to the betas.
+    WTO_derivative(WTO, Beta_final) -> float:
+        Derivative of the converged WTO with respect to the final beta.
+    design_gradients(results) -> dict:
+        Design-level gradients at a solution of `Beta_loop.main_loop`.
+    input_gradients(results, names) -> dict:
+        Gradients of the sized aircraft with respect to the inputs (coefficients, phase fields).
+"""
+
+## Fields going through the atmosphere model, see `differentiable`
+NON_DIFFERENTIABLE_FIELDS = ("altitude", "altitude_runway")
+
+
+class _DualWeightFraction:
+    """
+    Context manager replacing the weight fraction of segments by dual numbers, and restoring
+    the float values on exit.
+    """
+
+    def __init__(self, segments_list: List[segments], duals):
+        self.segments_list = segments_list
+        self.duals = duals
+
+    def __enter__(self):
+        self.saved = [segment.weight_fraction.value for segment in self.segments_list]
+        for segment, beta in zip(self.segments_list, self.duals):
+            segment.weight_fraction.value = beta
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for segment, beta in zip(self.segments_list, self.saved):
+            segment.weight_fraction.value = beta
+            if hasattr(segment, "weight_fraction_constraint"):
+                segment.weight_fraction_constraint.value = dual.value(
+                    segment.weight_fraction_constraint.value
+                )
+        return False
+
+
+def _value_and_gradient(x, k):
+    return np.asarray(dual.value(x), dtype=float), dual.gradient(x, k)
+
+
+def wf_wi_derivatives(segment: segments, WSR, TWR):
+    """
+    Computes the weight fraction wf_wi of a segment (one step) and its derivatives.
+    Returns:
+    tuple: (wf_wi, gradient), the gradient being the derivatives with respect to
+           (WSR, TWR, incoming beta).
+    """
+    WSR_d, TWR_d, beta_d = dual.variables(WSR, TWR, segment.weight_fraction.value)
+    with _DualWeightFraction([segment], [beta_d]):
+        wf = segment.wf_wi(WSR_d, TWR_d)
+    value, grad = _value_and_gradient(wf, 3)
+    return value.reshape(()), grad.reshape(3)
+
+
+def thrust_weight_derivatives(segment: segments, wing_loading):
+    """
+    Computes the thrust-to-weight ratio of a segment and its derivatives.
+    Parameters:
+    wing_loading (float or np.ndarray): Wing loadings at which the constraint is computed.
+    Returns:
+    tuple: (T/W, gradient), the gradient having a last axis of size 2 with the derivatives with
+           respect to (wing loading, beta of the segment).
+    """
+    wing_loading = np.asarray(wing_loading, dtype=float)
+    grad = np.zeros(wing_loading.shape + (2,))
+    grad[..., 0] = 1
+    wing_loading_d = dual.Dual(wing_loading, grad)
+    beta_d = dual.Dual(segment.weight_fraction.value, np.array([0.0, 1.0]))
+    with _DualWeightFraction([segment], [beta_d]):
+        TW = segment.Thrust_Weight_Ratio(wing_loading_d)
+    value, grad = _value_and_gradient(TW, 2)
+    return (
+        np.broadcast_to(value, wing_loading.shape),
+        np.broadcast_to(grad, wing_loading.shape + (2,)),
+    )
+
+
+def beta_derivatives(segment: segments, WSR, TWR):
+    """
+    Computes the beta at the end of a segment (as `Compute_Beta_Segment`, with the same steps)
+    and its derivatives with respect to (WSR, TWR, incoming beta).
+    """
+    WSR_d, TWR_d, beta_d = dual.variables(WSR, TWR, segment.weight_fraction.value)
+    with _DualWeightFraction([segment], [beta_d]):
+        beta = Compute_Beta_Segment(WSR_d, TWR_d, segment)
+    value, grad = _value_and_gradient(beta, 3)
+    return value.reshape(()), grad.reshape(3)
+
+
+def mission_derivatives(WSR, TWR, segments_list: List[segments]) -> dict:
+    """
+    Computes the mission profile (as `Compute_Mission_Profile_Parametric`) and the derivatives of
+    every beta with respect to WSR and TWR, in a single evaluation of the mission.
+    The segments are updated with the computed (float) betas.
+    Returns:
+    dict: "betas" (List[float]) beta at the end of each segment and "jacobian" (np.ndarray of
+          shape (number of segments, 2)) their derivatives with respect to (WSR, TWR).
+    """
+    WSR_d, TWR_d = dual.variables(WSR, TWR)
+    betas = []
+    jacobian = []
+    Beta = segments_list[0].weight_fraction.value
+    for i, segment in enumerate(segments_list):
+        if i > 0:
+            segment.weight_fraction.value = Beta
+        Beta = Compute_Beta_Segment(WSR_d, TWR_d, segment)
+        value, grad = _value_and_gradient(Beta, 2)
+        betas.append(float(value.reshape(())))
+        jacobian.append(grad.reshape(2))
+        Beta = dual.Dual(betas[-1], grad.reshape(2))
+    for segment, beta in zip(segments_list[1:], betas[:-1]):
+        segment.weight_fraction.value = beta
+    return {"betas": betas, "jacobian": np.array(jacobian)}
+
+
+def _design_point(segments_list: List[segments], k) -> dict:
+    """
+    Constraint analysis with a dual wing loading (first of the k variables of the gradients) and
+    the current weight fractions of the segments, which can be dual numbers of the same k variables.
+    """
+    wing_min = 30
+    wing_max = 170
+    num_points = 700
+    wing_loading = np.linspace(wing_min, wing_max, num_points)
+    grad = np.zeros((num_points, k))
+    grad[:, 0] = 1
+    wing_loading_d = dual.Dual(wing_loading, grad)
+    Thrusts_Weight_ratios = []
+    for segment in segments_list:
+        Thrusts_Weight_ratios.append(segment.Thrust_Weight_Ratio(wing_loading_d))
+        if segment.type == "Landing":
+            landing_segment = segment
+        if segment.phase_number == 7:  ## Top of climb = begining of cruise
+            weight_fraction_top_of_climb = segment.weight_fraction.value
+    Additional_Constraints.Additional_constraints(
+        [], Thrusts_Weight_ratios, wing_loading_d, weight_fraction_top_of_climb
+    )
+    wing_loading_landing = landing_segment.landing_constraint()
+
+    values = np.array(
+        [np.broadcast_to(dual.value(TW), (num_points,)) for TW in Thrusts_Weight_ratios]
+    )
+    grads = np.array(
+        [
+            np.broadcast_to(dual.gradient(TW, k), (num_points, k))
+            for TW in Thrusts_Weight_ratios
+        ]
+    )
+    active = np.argmax(values, axis=0)
+    points = np.arange(num_points)
+    y_max = values[active, points]
+    y_max_grad = grads[active, points]
+
+    min_index = np.argmin(y_max)
+    WSR = wing_loading[min_index]
+    TWR = y_max[min_index]
+    d_WSR = np.zeros(k)
+    d_TWR = y_max_grad[min_index]
+    landing_value, landing_grad = _value_and_gradient(wing_loading_landing, k)
+    landing_value = float(landing_value.reshape(()))
+    if WSR > landing_value:
+        WSR = landing_value
+        landing_index = np.where(
+            np.abs(wing_loading - landing_value) <= (wing_max - wing_min) / num_points
+        )[0][0]
+        TWR = y_max[landing_index]
+        d_WSR = landing_grad.reshape(k)
+        d_TWR = y_max_grad[landing_index] + y_max_grad[landing_index, 0] * d_WSR
+    return {
+        "WSR": float(WSR),
+        "TWR": float(TWR),
+        "d_WSR": d_WSR,
+        "d_TWR": d_TWR,
+        "wing_loading": wing_loading,
+        "y_max": y_max,
+        "d_y_max": y_max_grad[:, 0],
+    }
+
+
+def constraint_derivatives(segments_list: List[segments]) -> dict:
+    """
+    Computes the design point of the constraint analysis (as `constraint_analysis_main`) and its
+    derivatives with respect to the beta at the beginning of each segment.
+    When the landing constraint sets the wing loading, the thrust-to-weight ratio read on the
+    envelope is differentiated as a continuous function of the wing loading.
+    Returns:
+    dict: "WSR", "TWR" design point, "d_WSR", "d_TWR" (np.ndarray of size number of segments)
+          derivatives with respect to the betas, "wing_loading", "y_max" envelope and
+          "d_y_max" (np.ndarray (700,)) slope of the envelope.
+    """
+    n = len(segments_list)
+    k = n + 1  ## wing loading and the beta of each segment
+    betas_d = []
+    for j, segment in enumerate(segments_list):
+        grad = np.zeros(k)
+        grad[j + 1] = 1
+        betas_d.append(dual.Dual(segment.weight_fraction.value, grad))
+    with _DualWeightFraction(segments_list, betas_d):
+        design = _design_point(segments_list, k)
+    design["d_WSR"] = design["d_WSR"][1:]
+    design["d_TWR"] = design["d_TWR"][1:]
+    return design
+
+
+def WTO_derivative(WTO, Beta_final):
+    """
+    Derivative of the converged WTO with respect to the final beta. The WTO loop solves
+    WTO (1 - 1.06 (1 - beta) - kwe WTO^-0.06) = WC + WP, which is differentiated implicitly.
+    """
+    kwe = Aircraft.Structure.KWE.value
+    dF_dWTO = 1 - 1.06 * (1 - Beta_final) - kwe * WTO**-0.06 + 0.06 * kwe * WTO**-0.06
+    dF_dbeta = 1.06 * WTO
+    return -dF_dbeta / dF_dWTO
+
+
+def design_gradients(results) -> dict:
+    """
+    Computes the design-level gradients at a solution of `Beta_loop.main_loop`, with one dual
+    evaluation of the mission and one of the constraint analysis.
+    Parameters:
+    results (tuple): Results of `Beta_loop.main_loop`.
+    Returns:
+    dict: Gradients with respect to (WSR, TWR) of "Beta_final", "WTO" and "fuel_weight"
+          (keys "d_..."), "d_betas" (derivatives of every beta), "d_WTO_d_Beta_final" and
+          "beta_loop_jacobian", the 2x2 Jacobian of the Beta loop iteration
+          (WSR, TWR) -> (WSR_design, TWR_design).
+    """
+    WTO, WSR, TWR, Beta_final = (float(x) for x in results[:4])
+    segments_list = results[6]
+    mission = mission_derivatives(WSR, TWR, segments_list)
+    constraints = constraint_derivatives(segments_list)
+    ## The constraint analysis depends on the beta at the beginning of each segment
+    d_betas_in = np.vstack([np.zeros((1, 2)), mission["jacobian"][:-1]])
+    beta_loop_jacobian = np.array(
+        [constraints["d_WSR"] @ d_betas_in, constraints["d_TWR"] @ d_betas_in]
+    )
+    d_Beta_final = mission["jacobian"][-1]
+    d_WTO_d_Beta_final = WTO_derivative(WTO, Beta_final)
+    d_WTO = d_WTO_d_Beta_final * d_Beta_final
+    d_fuel_weight = 1.06 * ((1 - Beta_final) * d_WTO - WTO * d_Beta_final)
+    return {
+        "Beta_final": Beta_final,
+        "d_Beta_final": d_Beta_final,
+        "d_betas": mission["jacobian"],
+        "WTO": WTO,
+        "d_WTO": d_WTO,
+        "d_WTO_d_Beta_final": d_WTO_d_Beta_final,
+        "fuel_weight": 1.06 * (1 - Beta_final) * WTO,
+        "d_fuel_weight": d_fuel_weight,
+        "beta_loop_jacobian": beta_loop_jacobian,
+    }
+
+
+def differentiable(name):
+    """
+    True if the derivatives with respect to an input (see `input_gradients`) can be computed with
+    dual numbers. The altitudes go through the tabulated atmosphere model, they cannot.
+    """
+    return name.partition(".")[2] not in NON_DIFFERENTIABLE_FIELDS
+
+
+def input_gradients(results, names) -> dict:
+    """
+    Computes the gradients of the sized aircraft with respect to inputs of the solver, at a solution
+    of `Beta_loop.main_loop` obtained with the current values of the inputs.
+    The inputs are the ones of `Sizing.uncertainty.monte_carlo` (K1, K2, kTSFC, kWE, AR, Npax and
+    "<phase_number>.<field>"). The mission and the constraint analysis are evaluated once with dual
+    numbers of (wing loading, WSR, TWR, inputs), and the fixed point of the Beta loop
+    (WSR, TWR) = G(WSR, TWR, inputs) is differentiated implicitly:
+        d(WSR, TWR) / d inputs = (I - dG/d(WSR, TWR))^-1 dG/d inputs
+    Parameters:
+    results (tuple): Results of `Beta_loop.main_loop`.
+    names (List[str]): Names of the inputs, see `differentiable`.
+    Returns:
+    dict: Derivatives (np.ndarray of size len(names)) of "WTO", "fuel_weight", "Beta_final",
+          "WSR" and "TWR" (keys "d_..."), and "d_betas" (number of segments, len(names)).
+    Raises:
+    ValueError: If an input is not differentiable.
+    """
+    from Sizing.uncertainty.monte_carlo import (
+        COEFFICIENTS,
+        AppliedInputs,
+        check_inputs,
+        input_values,
+    )
+
+    segments_list = results[6]
+    check_inputs(segments_list, names)
+    for name in names:
+        if not differentiable(name):
+            raise ValueError(f"The derivatives with respect to {name!r} are not available")
+    WTO, WSR, TWR, Beta_final = (float(x) for x in results[:4])
+    m = len(names)
+    k = 3 + m  ## wing loading, WSR, TWR and the inputs
+    seeds = {
+        name: dual.Dual(v, np.eye(k)[3 + j])
+        for j, (name, v) in enumerate(input_values(segments_list, names).items())
+    }
+    WSR_d = dual.Dual(WSR, np.eye(k)[1])
+    TWR_d = dual.Dual(TWR, np.eye(k)[2])
+
+    with _DualWeightFraction(segments_list, []), AppliedInputs(
+        segments_list, seeds, column=False
+    ):
+        Beta = segments_list[0].weight_fraction.value
+        betas = []
+        for i, segment in enumerate(segments_list):
+            if i > 0:
+                segment.weight_fraction.value = Beta
+            Beta = Compute_Beta_Segment(WSR_d, TWR_d, segment)
+            value, grad = _value_and_gradient(Beta, k)
+            Beta = dual.Dual(float(value.reshape(())), grad.reshape(k))
+            betas.append(Beta)
+        design = _design_point(segments_list, k)
+    ## AppliedInputs only restores the coefficients, the segment fields are restored here
+    phases = {str(segment.phase_number): segment for segment in segments_list}
+    for name, seed in seeds.items():
+        if name not in COEFFICIENTS:
+            phase_number, _, field = name.partition(".")
+            getattr(phases[phase_number], field).value = seed.value
+
+    ## Implicit differentiation of the Beta loop
+    G = np.array([design["d_WSR"], design["d_TWR"]])
+    d_design = np.linalg.solve(np.eye(2) - G[:, 1:3], G[:, 3:])
+    d_betas = np.array([beta.grad for beta in betas])
+    d_betas = d_betas[:, 1:3] @ d_design + d_betas[:, 3:]
+    d_Beta_final = d_betas[-1]
+
+    ## Implicit differentiation of the WTO loop
+    kwe = Aircraft.Structure.KWE.value
+    dF_dWTO = 1 - 1.06 * (1 - Beta_final) - kwe * WTO**-0.06 + 0.06 * kwe * WTO**-0.06
+    d_WTO = -1.06 * WTO / dF_dWTO * d_Beta_final
+    if "kWE" in seeds:
+        d_WTO = d_WTO + WTO**0.94 / dF_dWTO * seeds["kWE"].grad[3:]
+    if "Npax" in seeds:
+        d_WP = Aircraft.Payload.Pax_weight.value + Aircraft.Payload.Baggage_weight.value
+        d_WTO = d_WTO + d_WP / dF_dWTO * seeds["Npax"].grad[3:]
+    d_fuel_weight = 1.06 * ((1 - Beta_final) * d_WTO - WTO * d_Beta_final)
+    return {
+        "d_WTO": d_WTO,
+        "d_fuel_weight": d_fuel_weight,
+        "d_Beta_final": d_Beta_final,
+        "d_WSR": d_design[0],
+        "d_TWR": d_design[1],
+        "d_betas": d_betas,
+    }
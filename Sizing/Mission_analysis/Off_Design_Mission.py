@@ -0,0 +1,335 @@
+import argparse
+import json
+import os
+import numpy as np
+import Beta_loop as bl
+import Data_formating as df
+from Sizing.Mission_analysis.Main_Mission_Parametric import Compute_Beta_Segment
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.results.cache import ResultCache
+from Sizing.utils import atmosphere, dual
+
+"""
+This module flies a sized aircraft on off-design missions and builds its payload-range diagram.
+Once `Beta_loop.main_loop` has converged, the aircraft is fixed: maximum takeoff weight
+MTOW = WTO, wing loading WSR and thrust-to-weight ratio TWR at MTOW, and empty weight
+WE = gamma(MTOW) MTOW. The weight fractions (betas) of the segments are fractions of the MTOW, so an
+off-design mission with a takeoff weight W0 = WE + WC + payload + fuel starts at beta = W0 / MTOW
+instead of 1. The fuel needed by the mission is 1.06 MTOW (beta_0 - beta_final), as in the sizing.
+For each case (payload, fuel), the cruise range of the cruise phase (phase 7 by default) is solved
+so that the mission uses all the fuel, the other phases (reserves included) being kept.
+The cases are solved all at once: the payloads and fuels are column arrays going through the
+segment physics as in `Sizing.uncertainty.monte_carlo`. The segments before the cruise do not depend
+on the range, so they are computed once; then each Newton iteration only flies the cruise and the
+following segments, with the derivative with respect to the range given by dual numbers.
+The payload-range diagram goes through the corners:
+    - A: maximum payload, no cruise,
+    - B: maximum payload at MTOW (the harmonic range), the MTOW-limited branch goes from A to B,
+    - C: maximum fuel at MTOW, the fuel-limited branch (MTOW-limited payload) goes from B to C,
+    - D: maximum fuel and no payload (ferry range), below MTOW, from C to D.
+The maximum payload defaults to the design payload and the maximum fuel to the fuel of the design
+mission, in which case B and C are the design point: give the fuel capacity of the tanks to get the
+whole diagram.
+Usage:
+    python -m Sizing.Mission_analysis.Off_Design_Mission --max-fuel 55000 --output payload_range.json
+`OffDesign.mission_fuel` solves the other way round the fuel needed for given payloads and ranges.
+Classes:
+    OffDesign:
+        Sized aircraft flying off-design missions.
+"""
+
+
+class OffDesign:
+    """
+    Sized aircraft flying off-design missions.
+    Attributes:
+        mission_data (dict): Raw mission data of the design mission.
+        MTOW, WSR, TWR (float): Sized aircraft.
+        WE, WC (float): Empty weight and crew weight.
+        design_payload, design_fuel (float): Payload and fuel of the design mission.
+        cruise_phase (str): Phase number of the cruise whose range is solved.
+        design_range (float): Range of the cruise phase on the design mission (nmi).
+    """
+
+    def __init__(self, mission_data: dict, results, WC=None, WP=None, cruise_phase="7"):
+        """
+        Parameters:
+        mission_data (dict): Raw mission data, as loaded by `Data_formating.load_mission_data`.
+        results (tuple): Results of `Beta_loop.main_loop` on this mission.
+        WC, WP (float, optional): Crew and payload weights of the sizing. Default to the inputs.
+        cruise_phase (str, optional): Phase number of the cruise. Defaults to "7".
+        Raises:
+        ValueError: If the mission has no such cruise phase.
+        """
+        self.mission_data = mission_data
+        self.MTOW = float(results[0])
+        self.WSR = float(results[1])
+        self.TWR = float(results[2])
+        Beta_final = float(results[3])
+        self.WC = Aircraft.Payload.Wcrew.value if WC is None else WC
+        self.design_payload = Aircraft.Payload.Wpayload.value if WP is None else WP
+        self.WE = bl.gamma(self.MTOW) * self.MTOW
+        self.design_fuel = 1.06 * (1 - Beta_final) * self.MTOW
+        self.cruise_phase = str(cruise_phase)
+        Mission = df.build_mission(mission_data)
+        phases = [str(segment.phase_number) for segment in Mission]
+        if self.cruise_phase not in phases:
+            raise ValueError(f"The mission has no phase {self.cruise_phase!r}")
+        self.cruise_index = phases.index(self.cruise_phase)
+        cruise = Mission[self.cruise_index]
+        if cruise.type != "Cruise":
+            raise ValueError(f"The phase {self.cruise_phase!r} is not a cruise")
+        self.design_range = float(cruise.range.value)
+
+    def _fly(self, Mission, start, beta, betas=None):
+        """
+        Flies the segments from start to the end of the mission, returns the final beta.
+        The beta at the end of each segment is appended to betas if given.
+        """
+        for segment in Mission[start:]:
+            segment.weight_fraction.value = beta
+            beta = Compute_Beta_Segment(self.WSR, self.TWR, segment)
+            if betas is not None:
+                betas.append(beta)
+        return beta
+
+    def fuel_burn(self, takeoff_weights, ranges):
+        """
+        Fuel needed (reserves included) by the missions with the given takeoff weights and cruise
+        ranges (arrays of the same size).
+        """
+        W0 = np.asarray(takeoff_weights, dtype=float).reshape(-1, 1)
+        with atmosphere.cached():
+            Mission = df.build_mission(self.mission_data)
+            Mission[self.cruise_index].range.value = np.asarray(
+                ranges, dtype=float
+            ).reshape(-1, 1)
+            beta_0 = W0 / self.MTOW
+            beta = self._fly(Mission, 0, beta_0)
+        return (1.06 * self.MTOW * (beta_0 - beta)).ravel()
+
+    def max_range(self, payloads, fuels, tolerance=1e-3, max_iteration=20) -> dict:
+        """
+        Solves the cruise range using all the fuel, for each case (payload, fuel).
+        Parameters:
+        payloads, fuels (np.ndarray): Payload and fuel weights of the cases (lb), same size.
+        tolerance (float, optional): Tolerance on the range (nmi). Defaults to 1e-3.
+        max_iteration (int, optional): Maximum number of Newton iterations. Defaults to 20.
+        Returns:
+        dict: Arrays "payload", "fuel", "takeoff_weight" and "range" (nmi, NaN when the takeoff
+              weight is above the MTOW or the fuel does not cover the mission without cruise),
+              and "converged".
+        """
+        payloads = np.asarray(payloads, dtype=float).ravel()
+        fuels = np.broadcast_to(np.asarray(fuels, dtype=float).ravel(), payloads.shape)
+        n = payloads.size
+        W0 = self.WE + self.WC + payloads + fuels
+        beta_0 = (W0 / self.MTOW)[:, None]
+        ranges = np.full(n, np.nan)
+        converged = np.zeros(n, dtype=bool)
+
+        with atmosphere.cached():
+            Mission = df.build_mission(self.mission_data)
+            ## The segments before the cruise do not depend on the range
+            beta_cruise = beta_0
+            for segment in Mission[: self.cruise_index]:
+                segment.weight_fraction.value = beta_cruise
+                beta_cruise = Compute_Beta_Segment(self.WSR, self.TWR, segment)
+            beta_cruise = np.broadcast_to(beta_cruise, (n, 1))
+            cruise = Mission[self.cruise_index]
+
+            ## Newton iterations on the range, the converged cases leave the batch
+            active = np.flatnonzero(W0 <= self.MTOW * (1 + 1e-12))
+            R = self.design_range * fuels[active] / self.design_fuel
+            for i in range(max_iteration):
+                if active.size == 0:
+                    break
+                m = active.size
+                cruise.range.value = dual.Dual(R[:, None], np.ones((m, 1, 1)))
+                beta_final = self._fly(
+                    Mission, self.cruise_index, beta_cruise[active]
+                )
+                burn = 1.06 * self.MTOW * (beta_0[active] - beta_final)
+                f = dual.value(burn)[:, 0] - fuels[active]
+                slope = dual.gradient(burn, 1)[:, 0, 0]
+                step = f / slope
+                R_new = R - step
+                ## Range 0: the fuel covers the mission without cruise or not
+                at_zero = (R_new < 0) & (R <= 0)
+                infeasible = at_zero & (f > 1e-6 * self.MTOW)
+                R_new = np.maximum(R_new, 0)
+                done = (np.abs(R_new - R) < tolerance) | at_zero
+                ranges[active[done & ~infeasible]] = R_new[done & ~infeasible]
+                converged[active[done]] = True
+                active = active[~done]
+                R = R_new[~done]
+        return {
+            "payload": payloads,
+            "fuel": fuels,
+            "takeoff_weight": W0,
+            "range": ranges,
+            "converged": converged,
+        }
+
+    def mission_fuel(
+        self, payloads, ranges, block_end_phase="10", tolerance=1e-3, max_iteration=20
+    ) -> dict:
+        """
+        Solves the fuel to load for missions of given payloads and cruise ranges (e.g. the routes
+        of a network). The takeoff weight depends on the fuel, so the fuel is solved by Newton
+        iterations, the derivative of the fuel burn with respect to the takeoff weight being given
+        by dual numbers.
+        Parameters:
+        payloads, ranges (np.ndarray): Payload weights (lb) and cruise ranges (nmi), same size.
+        block_end_phase (str, optional): Last phase of the block fuel. Defaults to "10".
+        tolerance (float, optional): Tolerance on the fuel (lb). Defaults to 1e-3.
+        max_iteration (int, optional): Maximum number of Newton iterations. Defaults to 20.
+        Returns:
+        dict: Arrays "fuel" (loaded fuel, reserves included), "block_fuel" (fuel burned until the
+              end of block_end_phase), "takeoff_weight" and "converged".
+        Raises:
+        ValueError: If the mission has no phase block_end_phase.
+        """
+        payloads = np.asarray(payloads, dtype=float).ravel()
+        ranges = np.broadcast_to(np.asarray(ranges, dtype=float).ravel(), payloads.shape)
+        n = payloads.size
+        fuel = np.full(n, np.nan)
+        block_fuel = np.full(n, np.nan)
+        converged = np.zeros(n, dtype=bool)
+        with atmosphere.cached():
+            Mission = df.build_mission(self.mission_data)
+            phases = [str(segment.phase_number) for segment in Mission]
+            if str(block_end_phase) not in phases:
+                raise ValueError(f"The mission has no phase {block_end_phase!r}")
+            block_index = phases.index(str(block_end_phase))
+            active = np.arange(n)
+            F = self.design_fuel * ranges / self.design_range
+            for i in range(max_iteration):
+                if active.size == 0:
+                    break
+                m = active.size
+                W0 = self.WE + self.WC + payloads[active] + F
+                beta_0 = dual.Dual(
+                    (W0 / self.MTOW)[:, None], np.full((m, 1, 1), 1 / self.MTOW)
+                )
+                Mission[self.cruise_index].range.value = ranges[active][:, None]
+                betas = []
+                beta_final = self._fly(Mission, 0, beta_0, betas)
+                burn = 1.06 * self.MTOW * (beta_0 - beta_final)
+                g = dual.value(burn)[:, 0] - F
+                slope = dual.gradient(burn, 1)[:, 0, 0] - 1
+                F_new = F - g / slope
+                done = np.abs(F_new - F) < tolerance
+                fuel[active] = F_new
+                block_fuel[active] = self.MTOW * (
+                    dual.value(beta_0) - dual.value(betas[block_index])
+                )[:, 0]
+                converged[active[done]] = True
+                active = active[~done]
+                F = F_new[~done]
+        return {
+            "fuel": fuel,
+            "block_fuel": block_fuel,
+            "takeoff_weight": self.WE + self.WC + payloads + fuel,
+            "converged": converged,
+        }
+
+    def payload_range(self, n_points=50, max_payload=None, max_fuel=None) -> dict:
+        """
+        Computes the payload-range diagram.
+        Parameters:
+        n_points (int, optional): Number of points of each branch. Defaults to 50.
+        max_payload (float, optional): Maximum payload (lb). Defaults to the design payload.
+        max_fuel (float, optional): Fuel capacity (lb). Defaults to the fuel of the design mission.
+        Returns:
+        dict: Arrays "payload", "fuel", "takeoff_weight", "range" of the diagram, from A to D, and
+              "corners" {"A", "B", "C", "D": {"payload", "fuel", "range"}}.
+        Raises:
+        ValueError: If the maximum payload and fuel cannot be carried at all.
+        """
+        max_payload = self.design_payload if max_payload is None else max_payload
+        max_fuel = self.design_fuel if max_fuel is None else max_fuel
+        useful_load = self.MTOW - self.WE - self.WC
+        if max_payload > useful_load:
+            raise ValueError(
+                f"The maximum payload {max_payload:.0f} lb is above the useful load {useful_load:.0f} lb"
+            )
+        ## All the missions of the diagram share the atmosphere properties
+        with atmosphere.cached():
+            ## Payload at the corner C (maximum fuel at MTOW), B = C if the tanks are full before MTOW
+            payload_C = min(max(useful_load - max_fuel, 0), max_payload)
+            ## Fuel of the mission without cruise at maximum payload (fixed point on the takeoff weight)
+            fuel_A = 0.0
+            for i in range(20):
+                fuel_A_new = float(
+                    self.fuel_burn([self.WE + self.WC + max_payload + fuel_A], [0])[0]
+                )
+                if abs(fuel_A_new - fuel_A) < 1e-6:
+                    break
+                fuel_A = fuel_A_new
+            fuel_A = fuel_A_new
+            fuel_B = min(max_fuel, useful_load - max_payload)
+            t = np.linspace(0, 1, n_points)
+            payloads = np.concatenate(
+                [
+                    np.full(n_points, max_payload),
+                    max_payload + t * (payload_C - max_payload),
+                    payload_C * (1 - t),
+                ]
+            )
+            fuels = np.minimum(max_fuel, useful_load - payloads)
+            fuels[:n_points] = fuel_A + t * (fuel_B - fuel_A)
+            diagram = self.max_range(payloads, fuels)
+        corner_rows = {"A": 0, "B": n_points - 1, "C": 2 * n_points - 1, "D": 3 * n_points - 1}
+        diagram["corners"] = {
+            corner: {
+                "payload": float(diagram["payload"][row]),
+                "fuel": float(diagram["fuel"][row]),
+                "range": float(diagram["range"][row]),
+            }
+            for corner, row in corner_rows.items()
+        }
+        return diagram
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Payload-range diagram of the sized aircraft")
+    parser.add_argument("--mission", default="Mission_Profile.json")
+    parser.add_argument("--max-payload", type=float, default=None)
+    parser.add_argument("--max-fuel", type=float, default=None, help="Fuel capacity (lb)")
+    parser.add_argument("--points", type=int, default=50, help="Points per branch")
+    parser.add_argument("--output", help="Write the diagram to a JSON file")
+    args = parser.parse_args(argv)
+
+    mission_file = os.path.join(
+        os.path.dirname(__file__), "..", "..", "Inputs", args.mission
+    )
+    mission_data = df.load_mission_data(os.path.normpath(mission_file))
+    results = ResultCache().main_loop(
+        Mission=df.build_mission(mission_data),
+        WC=Aircraft.Payload.Wcrew.value,
+        WP=Aircraft.Payload.Wpayload.value,
+        guess_WTO=10000,
+    )
+    diagram = OffDesign(mission_data, results).payload_range(
+        args.points, args.max_payload, args.max_fuel
+    )
+    for corner, point in diagram["corners"].items():
+        print(
+            f"{corner}: payload {point['payload']:10.0f} lb, fuel {point['fuel']:10.0f} lb, "
+            f"range {point['range']:8.1f} nmi"
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    name: v.tolist() if isinstance(v, np.ndarray) else v
+                    for name, v in diagram.items()
+                },
+                file,
+                indent=4,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+import numpy as np
+import Data_formating as df
+from Sizing.Mission_analysis.Off_Design_Mission import OffDesign
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.results.cache import ResultCache
+from Sizing.utils import atmosphere
+
+"""
+This module evaluates the fuel of the sized aircraft on a network of routes (city pairs) read from a
+CSV file, e.g. a schedule of airline routes.
+The file is streamed: the routes are read by chunks of chunk_size rows, each chunk is solved at once
+by `OffDesign.mission_fuel` (vectorized over the routes) and its results are written to the output
+file before the next chunk is read, so the memory does not grow with the size of the network.
+Input columns:
+    - distance (nmi, "distance" by default): cruise range of the route,
+    - payload (lb, optional): payload of the route, the design payload if missing or empty,
+    - frequency (optional): number of flights on the route, weighting the network totals.
+The other columns are copied to the output file, followed by "fuel" (loaded fuel, reserves
+included), "block_fuel", "takeoff_weight" and "feasible" (takeoff weight below the MTOW, fuel below
+the fuel capacity if given).
+Usage:
+    python -m Sizing.Mission_analysis.Route_Network routes.csv --output routes_fuel.csv --chunk-size 10000
+Functions:
+    evaluate_routes(aircraft, input_file, output_file, ...) -> dict:
+        Streams the routes of input_file through the aircraft and returns the network totals.
+"""
+
+OUTPUT_COLUMNS = ("fuel", "block_fuel", "takeoff_weight", "feasible")
+
+
+def _column(rows, name, default):
+    """Float column of the rows, default for the missing or empty values."""
+    return np.array(
+        [float(row[name]) if row.get(name) not in (None, "") else default for row in rows]
+    )
+
+
+def evaluate_routes(
+    aircraft: OffDesign,
+    input_file,
+    output_file=None,
+    distance_column="distance",
+    payload_column="payload",
+    frequency_column=None,
+    max_fuel=None,
+    block_end_phase="10",
+    chunk_size=10000,
+    verbose=False,
+) -> dict:
+    """
+    Streams the routes of a CSV file through the aircraft.
+    Parameters:
+    aircraft (OffDesign): Sized aircraft.
+    input_file (str): CSV file of the routes, with a header row.
+    output_file (str, optional): CSV file of the results. Defaults to None (totals only).
+    distance_column (str, optional): Column of the ranges (nmi). Defaults to "distance".
+    payload_column (str, optional): Column of the payloads (lb). Defaults to "payload".
+    frequency_column (str, optional): Column of the flight frequencies. Defaults to None (1 flight
+                                      per route).
+    max_fuel (float, optional): Fuel capacity (lb). Defaults to None (no limit).
+    block_end_phase (str, optional): Last phase of the block fuel. Defaults to "10".
+    chunk_size (int, optional): Number of routes solved at once. Defaults to 10000.
+    verbose (bool, optional): Print the progress of the chunks. Defaults to False.
+    Returns:
+    dict: Network totals: number of routes, of feasible and of non-converged routes, flights, block
+          fuel and fuel loaded on the feasible routes (weighted by the frequencies).
+    Raises:
+    ValueError: If the distance or frequency column is missing from the file.
+    """
+    totals = {
+        "routes": 0,
+        "feasible_routes": 0,
+        "not_converged": 0,
+        "flights": 0.0,
+        "block_fuel": 0.0,
+        "fuel": 0.0,
+    }
+    start_time = time.perf_counter()
+    with open(input_file, "r", newline="") as file:
+        reader = csv.DictReader(file)
+        fields = reader.fieldnames or []
+        for name in (distance_column, frequency_column):
+            if name is not None and name not in fields:
+                raise ValueError(f"The file {input_file!r} has no column {name!r}")
+        output = None if output_file is None else open(output_file, "w", newline="")
+        try:
+            if output is not None:
+                writer = csv.DictWriter(
+                    output, [f for f in fields if f not in OUTPUT_COLUMNS] + list(OUTPUT_COLUMNS)
+                )
+                writer.writeheader()
+            ## The atmosphere memo is shared by all the chunks
+            with atmosphere.cached():
+                while True:
+                    rows = list(itertools.islice(reader, chunk_size))
+                    if not rows:
+                        break
+                    payloads = _column(rows, payload_column, aircraft.design_payload)
+                    results = aircraft.mission_fuel(
+                        payloads,
+                        _column(rows, distance_column, np.nan),
+                        block_end_phase=block_end_phase,
+                    )
+                    feasible = results["converged"] & (
+                        results["takeoff_weight"] <= aircraft.MTOW * (1 + 1e-9)
+                    )
+                    if max_fuel is not None:
+                        feasible &= results["fuel"] <= max_fuel
+                    flights = (
+                        np.ones(len(rows))
+                        if frequency_column is None
+                        else _column(rows, frequency_column, 0.0)
+                    )
+                    totals["routes"] += len(rows)
+                    totals["feasible_routes"] += int(feasible.sum())
+                    totals["not_converged"] += int((~results["converged"]).sum())
+                    totals["flights"] += float(flights[feasible].sum())
+                    totals["block_fuel"] += float(
+                        (flights * results["block_fuel"])[feasible].sum()
+                    )
+                    totals["fuel"] += float((flights * results["fuel"])[feasible].sum())
+                    if output is not None:
+                        for i, row in enumerate(rows):
+                            row.update(
+                                fuel=f"{results['fuel'][i]:.3f}",
+                                block_fuel=f"{results['block_fuel'][i]:.3f}",
+                                takeoff_weight=f"{results['takeoff_weight'][i]:.3f}",
+                                feasible=int(feasible[i]),
+                            )
+                        writer.writerows(rows)
+                    if verbose:
+                        print(
+                            f"{totals['routes']} routes, "
+                            f"{time.perf_counter() - start_time:.1f} s"
+                        )
+        finally:
+            if output is not None:
+                output.close()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fuel of the sized aircraft on a route network")
+    parser.add_argument("routes", help="CSV file of the routes")
+    parser.add_argument("--mission", default="Mission_Profile.json")
+    parser.add_argument("--output", help="CSV file of the results")
+    parser.add_argument("--distance-column", default="distance")
+    parser.add_argument("--payload-column", default="payload")
+    parser.add_argument("--frequency-column", default=None)
+    parser.add_argument("--max-fuel", type=float, default=None, help="Fuel capacity (lb)")
+    parser.add_argument("--block-end-phase", default="10")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    mission_file = os.path.join(
+        os.path.dirname(__file__), "..", "..", "Inputs", args.mission
+    )
+    mission_data = df.load_mission_data(os.path.normpath(mission_file))
+    results = ResultCache().main_loop(
+        Mission=df.build_mission(mission_data),
+        WC=Aircraft.Payload.Wcrew.value,
+        WP=Aircraft.Payload.Wpayload.value,
+        guess_WTO=10000,
+    )
+    totals = evaluate_routes(
+        OffDesign(mission_data, results),
+        args.routes,
+        args.output,
+        distance_column=args.distance_column,
+        payload_column=args.payload_column,
+        frequency_column=args.frequency_column,
+        max_fuel=args.max_fuel,
+        block_end_phase=args.block_end_phase,
+        chunk_size=args.chunk_size,
+        verbose=True,
+    )
+    print(json.dumps(totals, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import numpy as np
+from Sizing.MissionProfile.segments import segments
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.utils import atmosphere
+from typing import List
+
+"""
+This module computes the aerodynamic and propulsion snapshot of the segments of a sized mission.
+The plots of `gui` used to call the segment physics themselves: the lift-to-drag ratio, TSFC, lift
+and drag coefficients and thrust lapse of every segment for the aerodynamics and propulsion chart,
+and the thrust lapse again for the TWR/WSR per phase chart, each call recomputing the atmosphere.
+The snapshot evaluates each of them once per segment at the converged design (wing loading and
+weight fractions of the final Beta loop), inside `atmosphere.cached()`, and stores them in a
+structured array of SNAPSHOT_DTYPE, one record per segment:
+    phase, name, type: phase number, name and type of the segment,
+    weight_fraction: weight fraction at the beginning of the segment,
+    lift_drag_ratio, tsfc (1/s), Cl, Cd, thrust_lapse: at the design wing loading,
+    WSR, TWR: design the snapshot was computed for.
+`gui.report.apply_design` stores the snapshot of a design in Aircraft.Design.Segment_snapshot, and
+the plots render from it. The plots only use the stored snapshot if it is current: same phases and
+weight fractions as the segments plotted, same WSR and TWR as the design of the Aircraft class.
+Otherwise it is computed again, so a design changed without `apply_design` is not plotted with the
+snapshot of the previous one.
+Functions:
+    segment_snapshot(WSR, TWR, segments_list) -> np.ndarray:
+        Snapshot of the segments at the wing loading WSR.
+    is_current(snapshot, WSR, TWR, segments_list) -> bool:
+        True if the snapshot was computed for this design and these segments.
+    design_snapshot(segments_list) -> np.ndarray:
+        Snapshot stored in the Aircraft class, computed if the design has none or a stale one.
+"""
+
+SNAPSHOT_DTYPE = np.dtype(
+    [
+        ("phase", "U8"),
+        ("name", "U64"),
+        ("type", "U32"),
+        ("weight_fraction", "f8"),
+        ("lift_drag_ratio", "f8"),
+        ("tsfc", "f8"),
+        ("Cl", "f8"),
+        ("Cd", "f8"),
+        ("thrust_lapse", "f8"),
+        ("WSR", "f8"),
+        ("TWR", "f8"),
+    ]
+)
+
+
+def _design_value(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def segment_snapshot(WSR, TWR, segments_list: List[segments]) -> np.ndarray:
+    """
+    Aerodynamic and propulsion characteristics of each segment at the wing loading WSR.
+    Parameters:
+    WSR (float): Wing loading of the design.
+    TWR (float): Thrust-to-weight ratio of the design, stored with the snapshot.
+    segments_list (List[segments]): Segments of the sized mission, with their weight fractions.
+    Returns:
+    np.ndarray: One record of SNAPSHOT_DTYPE per segment.
+    """
+    snapshot = np.empty(len(segments_list), dtype=SNAPSHOT_DTYPE)
+    with atmosphere.cached():
+        for i, segment in enumerate(segments_list):
+            snapshot[i] = (
+                str(segment.phase_number),
+                str(segment.name),
+                str(segment.type),
+                float(segment.weight_fraction.value),
+                float(segment.lift_drag_ratio(WSR)),
+                float(segment.tsfc(WSR)),
+                float(segment.Cl(WSR)),
+                float(segment.Cd(WSR)),
+                float(segment.alpha_seg(WSR)),
+                _design_value(WSR),
+                _design_value(TWR),
+            )
+    return snapshot
+
+
+def is_current(snapshot, WSR, TWR, segments_list: List[segments]) -> bool:
+    """
+    True if the snapshot was computed for the design (WSR, TWR) and for the phases and weight
+    fractions of segments_list.
+    """
+    if snapshot is None or len(snapshot) != len(segments_list):
+        return False
+    phases = [str(segment.phase_number) for segment in segments_list]
+    weight_fractions = [float(segment.weight_fraction.value) for segment in segments_list]
+    design = np.array([[_design_value(WSR), _design_value(TWR)]] * len(snapshot))
+    return (
+        np.array_equal(snapshot["phase"], phases)
+        and np.array_equal(snapshot["weight_fraction"], weight_fractions)
+        and np.array_equal(
+            np.column_stack([snapshot["WSR"], snapshot["TWR"]]), design, equal_nan=True
+        )
+    )
+
+
+def design_snapshot(segments_list: List[segments]) -> np.ndarray:
+    """
+    Snapshot of the design stored in Aircraft.Design.Segment_snapshot. It is computed and stored
+    at the design wing loading if there is none, or if it is not current (e.g. plots called
+    without `gui.report.apply_design`, or for another design), see `is_current`.
+    """
+    WSR = Aircraft.Design.WING_LOADING.value
+    TWR = Aircraft.Design.THRUST_TO_WEIGHT.value
+    snapshot = Aircraft.Design.Segment_snapshot.value
+    if not is_current(snapshot, WSR, TWR, segments_list):
+        snapshot = segment_snapshot(WSR, TWR, segments_list)
+        Aircraft.Design.Segment_snapshot.value = snapshot
+    return snapshot
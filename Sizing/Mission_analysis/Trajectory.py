@@ -0,0 +1,273 @@
+import argparse
+import csv
+import os
+import numpy as np
+import Data_formating as df
+import Sizing.utils.utils as utils
+from Sizing.Mission_analysis.Main_Mission_Parametric import Segment_Steps
+from Sizing.MissionProfile.segments import segments
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.results.cache import ResultCache
+from Sizing.utils import atmosphere
+from typing import List
+
+"""
+This module computes the time history of the aircraft along the mission (trajectory mode).
+The mission is integrated with the sub-steps of `Compute_Beta_Segment` (500 ft of climb, tenth of
+the cruise, 100 ft of approach, 5 kt of acceleration, one step for the other segments), and the
+state of each sub-step is yielded as a record instead of being discarded:
+    segment, phase: index and phase number of the mission segment,
+    time (s), distance (nmi), altitude (ft): at the end of the sub-step,
+    KEAS, Mach, TAS (kt): average over the sub-step,
+    thrust_lapse, TSFC (1/s), L_D: of the sub-step,
+    beta: weight fraction at the end of the sub-step,
+    fuel_burned: fuel burned since the beginning of the mission (lb if WTO is given, else fraction
+                 of WTO).
+The records are plain tuples in the order of TRAJECTORY_DTYPE, streamed by the generator
+`trajectory`, so a full time history costs the integration of the mission and no list of segments.
+`trajectory_array` fills a preallocated structured array and `write_trajectory` streams the records
+to a CSV file. The time of a takeoff is the ground roll at constant acceleration plus the rotation.
+Usage:
+    python -m Sizing.Mission_analysis.Trajectory --output trajectory.csv
+Functions:
+    trajectory(WSR, TWR, segments_list, WTO=None) -> Iterator[tuple]:
+        Records of the sub-steps of the mission.
+    count_steps(segments_list) -> int:
+        Number of records of the mission.
+    trajectory_array(WSR, TWR, segments_list, WTO=None, out=None) -> np.ndarray:
+        Time history in a structured array.
+    write_trajectory(path, WSR, TWR, segments_list, WTO=None) -> int:
+        Writes the time history to a CSV file.
+"""
+
+TRAJECTORY_DTYPE = np.dtype(
+    [
+        ("segment", "i4"),
+        ("phase", "U8"),
+        ("time", "f8"),
+        ("distance", "f8"),
+        ("altitude", "f8"),
+        ("KEAS", "f8"),
+        ("Mach", "f8"),
+        ("TAS", "f8"),
+        ("thrust_lapse", "f8"),
+        ("TSFC", "f8"),
+        ("L_D", "f8"),
+        ("beta", "f8"),
+        ("fuel_burned", "f8"),
+    ]
+)
+
+
+def _scalar(value):
+    """Float of a scalar or of a single-element array (e.g. the takeoff results)."""
+    return float(np.squeeze(value))
+
+
+def _defined(step: segments, method):
+    """True if the segment class implements method (the base class returns placeholders)."""
+    return getattr(type(step), method) is not getattr(segments, method)
+
+
+def _climb_kinematics(step):
+    start, end = step.start_altitude.value, step.end_altitude.value
+    if step.KEAS.value is not None:
+        KEAS = step.KEAS.value
+        TAS = (utils.KEAS_to_TAS(KEAS, start) + utils.KEAS_to_TAS(KEAS, end)) / 2
+        Mach = (utils.KEAS_to_Mach(KEAS, start) + utils.KEAS_to_Mach(KEAS, end)) / 2
+    else:
+        Mach = step.MACH.value
+        TAS = (utils.Mach_to_TAS(Mach, start) + utils.Mach_to_TAS(Mach, end)) / 2
+        KEAS = (utils.Mach_to_KEAS(Mach, start) + utils.Mach_to_KEAS(Mach, end)) / 2
+    if step.climb_rate.value is not None:
+        time = abs(end - start) / (abs(step.climb_rate.value) / 60)
+    else:
+        time = abs(end - start) / (
+            utils.knots_to_fts(TAS) * np.sin(abs(step.flight_path_angle.value) * np.pi / 180)
+        )
+    return time, end, KEAS, Mach, TAS
+
+
+def _kinematics(step: segments, WSR):
+    """Duration (s), final altitude (ft), KEAS, Mach and TAS (kt) of a sub-step."""
+    match step.type:
+        case "Climb" | "Descent":
+            return _climb_kinematics(step)
+        case "Cruise":
+            TAS = step.TAS_knots()
+            time = utils.nmi_to_ft(step.range.value) / utils.knots_to_fts(TAS)
+            return time, step.altitude.value, step.EAS_knots(), step.Mach_number(), TAS
+        case "Approach":
+            KEAS = step.KEAS.value
+            Mach = (
+                utils.KEAS_to_Mach(KEAS, step.start_altitude.value)
+                + utils.KEAS_to_Mach(KEAS, step.end_altitude.value)
+            ) / 2
+            return step.delta_t(), step.end_altitude.value, KEAS, Mach, step.TAS_knots()
+        case "Acceleration" | "Deceleration":
+            altitude = step.altitude.value
+            KEAS = (step.KEAS_start.value + step.KEAS_end.value) / 2
+            ## Time of the whole segment, shared by its sub-steps in `trajectory`
+            return (
+                step.time.value,
+                altitude,
+                KEAS,
+                utils.KEAS_to_Mach(KEAS, altitude),
+                utils.KEAS_to_TAS(KEAS, altitude),
+            )
+        case "Takeoff":
+            altitude = step.altitude_runway.value
+            KEAS = _scalar(step.takeoff_EAS_speed(WSR))
+            TAS = utils.KEAS_to_TAS(KEAS, altitude)
+            time = 2 * step.takeoff_distance.value / utils.knots_to_fts(TAS) + step.tr.value
+            return time, altitude, KEAS / 2, utils.KEAS_to_Mach(KEAS, altitude) / 2, TAS / 2
+        case "Loiter":
+            altitude = step.altitude.value
+            KEAS = step.iter_best_L_D_speed_EAS(WSR)
+            return (
+                step.time.value * 60,
+                altitude,
+                KEAS,
+                utils.KEAS_to_Mach(KEAS, altitude),
+                utils.KEAS_to_TAS(KEAS, altitude),
+            )
+        case "Landing":
+            KEAS = step.KEAS.value
+            return 0.0, 0.0, KEAS, utils.KEAS_to_Mach(KEAS, 0), KEAS
+        case _:  ## Taxi
+            altitude = step.altitude.value
+            TAS = step.speed.value
+            return step.time.value * 60, altitude, TAS, step.Mach(), TAS
+
+
+def trajectory(WSR, TWR, segments_list: List[segments], WTO=None):
+    """
+    Integrates the mission and yields the record of each sub-step (see TRAJECTORY_DTYPE).
+    The weight fraction at the beginning of the mission is the one of the first segment, and the
+    weight fractions of the following segments are updated as in
+    `Compute_Mission_Profile_Parametric`.
+    Parameters:
+    WSR (float): Wing loading.
+    TWR (float): Thrust-to-weight ratio.
+    segments_list (List[segments]): Segments of the mission.
+    WTO (float, optional): Takeoff weight, to give the fuel burned in lb. Defaults to None.
+    Yields:
+    tuple: Record of a sub-step.
+    """
+    beta_0 = float(segments_list[0].weight_fraction.value)
+    scale = 1.0 if WTO is None else float(WTO)
+    beta = beta_0
+    time = 0.0
+    distance = 0.0
+    for index, segment in enumerate(segments_list):
+        phase = str(segment.phase_number)
+        steps = Segment_Steps(segment)
+        n_steps = 1
+        if segment.type == "Acceleration":
+            steps = list(steps)
+            n_steps = max(len(steps), 1)
+        for step in steps:
+            step.weight_fraction.value = beta
+            thrust_lapse = step.alpha_seg(WSR) if _defined(step, "alpha_seg") else np.nan
+            tsfc = step.tsfc(WSR) if _defined(step, "tsfc") else np.nan
+            L_D = step.lift_drag_ratio(WSR) if _defined(step, "lift_drag_ratio") else np.nan
+            beta = _scalar(beta * step.wf_wi(WSR, TWR))
+            duration, altitude, KEAS, Mach, TAS = map(_scalar, _kinematics(step, WSR))
+            duration = duration / n_steps
+            time += duration
+            if segment.type == "Cruise":
+                distance += step.range.value
+            else:
+                distance += TAS * duration / 3600
+            yield (
+                index,
+                phase,
+                time,
+                distance,
+                altitude,
+                KEAS,
+                Mach,
+                TAS,
+                _scalar(thrust_lapse),
+                _scalar(tsfc),
+                _scalar(L_D),
+                beta,
+                (beta_0 - beta) * scale,
+            )
+        if index != len(segments_list) - 1:
+            segments_list[index + 1].weight_fraction.value = beta
+
+
+def count_steps(segments_list: List[segments]) -> int:
+    """Number of records of the trajectory of the mission (no physics is computed)."""
+    return sum(sum(1 for _ in Segment_Steps(segment)) for segment in segments_list)
+
+
+def trajectory_array(
+    WSR, TWR, segments_list: List[segments], WTO=None, out=None
+) -> np.ndarray:
+    """
+    Fills a structured array of dtype TRAJECTORY_DTYPE with the trajectory of the mission.
+    Parameters:
+    WSR, TWR, segments_list, WTO: See `trajectory`.
+    out (np.ndarray, optional): Preallocated array of at least `count_steps(segments_list)` records,
+                                e.g. reused between missions. Defaults to None (new array).
+    Returns:
+    np.ndarray: The filled records (a view of out if given).
+    Raises:
+    ValueError: If out is too small.
+    """
+    n = count_steps(segments_list)
+    if out is None:
+        out = np.empty(n, dtype=TRAJECTORY_DTYPE)
+    elif out.shape[0] < n or out.dtype != TRAJECTORY_DTYPE:
+        raise ValueError(
+            f"The output buffer must hold {n} records of dtype TRAJECTORY_DTYPE, "
+            f"got {out.shape[0]} of {out.dtype}"
+        )
+    for i, record in enumerate(trajectory(WSR, TWR, segments_list, WTO)):
+        out[i] = record
+    return out[:n]
+
+
+def write_trajectory(path, WSR, TWR, segments_list: List[segments], WTO=None) -> int:
+    """
+    Streams the trajectory of the mission to a CSV file.
+    Returns:
+    int: Number of records written.
+    """
+    n = 0
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(TRAJECTORY_DTYPE.names)
+        for record in trajectory(WSR, TWR, segments_list, WTO):
+            writer.writerow(record)
+            n += 1
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time history of the sized aircraft mission")
+    parser.add_argument("--mission", default="Mission_Profile.json")
+    parser.add_argument("--output", default="trajectory.csv", help="CSV file of the records")
+    args = parser.parse_args(argv)
+
+    mission_file = os.path.join(
+        os.path.dirname(__file__), "..", "..", "Inputs", args.mission
+    )
+    mission_data = df.load_mission_data(os.path.normpath(mission_file))
+    WTO, WSR, TWR = ResultCache().main_loop(
+        Mission=df.build_mission(mission_data),
+        WC=Aircraft.Payload.Wcrew.value,
+        WP=Aircraft.Payload.Wpayload.value,
+        guess_WTO=10000,
+    )[:3]
+    with atmosphere.cached():
+        n = write_trajectory(
+            args.output, WSR, TWR, df.build_mission(mission_data), float(WTO)
+        )
+    print(f"{n} records written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -75,6 +75,12 @@ class Aircraft:
             unit="",
             description="Weight fractions list of the aircraft",
         )
+        Segment_snapshot = Variable(
+            "Segment_snapshot",
+            value=None,
+            unit="",
+            description="Aerodynamic and propulsion snapshot of the segments at the design point",
+        )
         Sea_level_Thrust = Variable(
             "Sea_level_Thrust", 1, "lbf", description="Sea level thrust of the engine"
         )
@@ -2,13 +2,12 @@ import Sizing.MissionProfile.Segments.Takeoff as takeoff_segment
 import Sizing.MissionProfile.Segments.approach as approach_segment
 import Sizing.MissionProfile.Segments.landing as landing_segment
 import numpy as np
-import matplotlib.pyplot as plt
-import os
 
 
 import Sizing.utils.utils as utils
 import Sizing.constraint_analysis.Additional_Constraints as Additional_Constraints
-import plotly.graph_objects as go
+from Sizing.utils import instrumentation
+from Sizing.utils import feasibility
 from Sizing.MissionProfile.segments import segments
 from typing import List
 
@@ -32,6 +31,9 @@ def constraint_analysis_main(segment_list: List[segments], plot=False):
             - y_max (np.ndarray): Maximum thrust-to-weight ratios across all segments.
             - wing_loading_landing (float): Wing loading constraint for landing.
             - names (List[str]): List of segment names.
+    Raises:
+        InfeasibleDesign: If a constraint or the design point is infeasible, see
+            `Sizing.utils.feasibility`.
     """
     wing_min = 30
     wing_max = 170
@@ -60,9 +62,10 @@ def constraint_analysis_main(segment_list: List[segments], plot=False):
     """ADDITIONAL CONSTRAINTS SPECIFIC TO THE PROJECT"""
     ### Additional constraints ###
 
-    Additional_Constraints.Additional_constraints(
-        names, Thrusts_Weight_ratios, wing_loading, weight_fraction_top_of_climb
-    )
+    with instrumentation.stage("additional constraints"):
+        Additional_Constraints.Additional_constraints(
+            names, Thrusts_Weight_ratios, wing_loading, weight_fraction_top_of_climb
+        )
     """END OF ADDITIONAL CONSTRAINTS"""
 
     """Find the landing constraint"""
@@ -87,6 +90,13 @@ def constraint_analysis_main(segment_list: List[segments], plot=False):
         )[0][0]
         TWR_design = float(y_max[landing_index])
         print("Landing constraint is more restrictive than the design point")
+    feasibility.require(
+        np.isfinite(TWR_design) & (TWR_design > 0),
+        feasibility.NoDesignPoint,
+        lambda: "No design point: the thrust-to-weight ratio of the constraint envelope is "
+        f"{TWR_design} at a wing loading of {wing_loading_design} lb/ft^2",
+        value=TWR_design,
+    )
 
     # print(
     #     f"Design Point: Wing Loading = {wing_loading_design} lb/ft^2, TWR = {TWR_design}"
@@ -0,0 +1,498 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import Beta_loop as bl
+import Data_formating as df
+from Sizing.Mission_analysis import Mission_Derivatives
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.results.cache import DEFAULT_CACHE_DIR, ResultCache
+from Sizing.uncertainty.monte_carlo import AppliedInputs, check_inputs, input_values
+from Sizing.utils import atmosphere
+from Sizing.utils.feasibility import InfeasibleDesign
+
+"""
+This module optimizes the design over continuous inputs of the sizing loop.
+The design variables are the inputs of `Sizing.uncertainty.monte_carlo`: the coefficients K1, K2,
+kTSFC, kWE, the number of passengers Npax, the wing aspect ratio AR (through K1 = 1 / (pi e AR))
+and the fields of the mission phases ("<phase_number>.<field>", e.g. "7.Mach" or "7.altitude" for
+the cruise), each between two bounds:
+    {"AR": [8, 12], "7.Mach": [0.72, 0.8], "7.altitude": [31000, 39000]}
+The objective is the WTO, the fuel weight or the block fuel (fuel burned from the beginning of the
+mission to the end of the phase `block_end_phase`, i.e. without the reserve phases).
+Methods:
+    - "L-BFGS-B", "SLSQP" (scipy.optimize.minimize): gradient-based. The gradient with respect to
+      the inputs is computed with dual numbers at the converged design (see
+      `Mission_Derivatives.input_gradients`), the inputs going through the atmosphere model
+      (altitudes) by forward finite differences solved in parallel with the point itself.
+    - "differential_evolution" (scipy.optimize): population-based, each generation is solved in
+      parallel. Use it when the objective is not smooth enough for a gradient-based method.
+Every sizing solve goes through an in-memory cache of the points already evaluated during the
+optimization, and through the results cache on disk (optimizations already run are not solved
+again). The solves are spread over a process pool (`processes`).
+Infeasible points (see `Sizing.utils.feasibility`) are rejected instead of stopping the optimization:
+their objective is infinite for differential evolution, and twice the largest objective met so far
+(with a zero gradient) for the gradient-based methods, whose line searches then step back. SLSQP
+also gets a feasibility constraint, violated at the infeasible points. The number of rejected
+points is given with the results.
+The Beta loop is solved with a tighter tolerance than `Main.py` and the WTO is converged to 1e-6 lb,
+otherwise the convergence noise of the loops is larger than the changes of the objective.
+Note: AR only changes K1 in this model (the structural coefficient kWE does not depend on AR), so
+an optimization over AR alone goes to its upper bound.
+Usage:
+    python -m Sizing.optimization.optimizer bounds.json --objective fuel_weight --processes 4
+Classes:
+    OptimizationResults:
+        Optimum, outputs at the optimum, number of evaluations and wall time.
+Functions:
+    solve_point(mission_data, values, ...) -> dict:
+        Sizes the aircraft for given values of the inputs.
+    optimize(mission_data, bounds, objective, method, ...) -> OptimizationResults:
+        Minimizes the objective within the bounds.
+"""
+
+OBJECTIVES = ("WTO", "fuel_weight", "block_fuel")
+METHODS = ("L-BFGS-B", "SLSQP", "differential_evolution")
+GRADIENT_METHODS = ("L-BFGS-B", "SLSQP")
+OUTPUTS = ("WTO", "fuel_weight", "block_fuel", "WSR", "TWR", "Beta_final")
+
+
+def converged_WTO(Beta_final, WC, WP, guess_WTO, tolerance=1e-6, max_iteration=200):
+    """Solves the WTO loop of `Beta_loop.main_loop` to a given tolerance (lb)."""
+    WTO = guess_WTO
+    for i in range(max_iteration):
+        WTO_new = (WC + WP) / (1 - 1.06 * (1 - Beta_final) - bl.gamma(WTO))
+        if np.abs(WTO_new - WTO) < tolerance:
+            return WTO_new
+        WTO = WTO_new
+    return WTO
+
+
+def _block_index(Mission, block_end_phase):
+    for i, segment in enumerate(Mission):
+        if str(segment.phase_number) == str(block_end_phase):
+            return i
+    raise ValueError(f"The mission has no phase {block_end_phase!r}")
+
+
+def solve_point(
+    mission_data: dict,
+    values: dict,
+    gradient=(),
+    block_end_phase="10",
+    cache_directory=DEFAULT_CACHE_DIR,
+    max_iteration=20,
+    tolerance=1e-6,
+) -> dict:
+    """
+    Sizes the aircraft for given values of the inputs.
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `Data_formating.load_mission_data`.
+    values (dict): {input name: value}.
+    gradient (List[str], optional): Inputs with respect to which the gradients are computed
+                                    (dual numbers, see `Mission_Derivatives.differentiable`).
+    block_end_phase (str, optional): Last phase of the block fuel. Defaults to "10".
+    cache_directory (str, optional): Results cache, None to disable it.
+    max_iteration, tolerance: See `Beta_loop.main_loop`.
+    Returns:
+    dict: "WTO", "fuel_weight", "block_fuel", "WSR", "TWR", "Beta_final" and, for each of them
+          except WSR and TWR, its gradient "d_..." (np.ndarray of size len(gradient)).
+    """
+    Mission = df.build_mission(mission_data)
+    with AppliedInputs(Mission, values, column=False), atmosphere.cached():
+        WC = Aircraft.Payload.Wcrew.value
+        WP = Aircraft.Payload.Wpayload.value
+        run = bl.main_loop
+        if cache_directory is not None:
+            run = ResultCache(cache_directory).main_loop
+        results = run(
+            Mission=Mission,
+            WC=WC,
+            WP=WP,
+            guess_WTO=10000,
+            max_iteration=max_iteration,
+            tolerance=tolerance,
+        )
+        Beta_final = float(results[3])
+        WTO = converged_WTO(Beta_final, WC, WP, float(results[0]))
+        results = (WTO,) + tuple(results[1:])
+        if gradient:
+            gradients = Mission_Derivatives.input_gradients(results, list(gradient))
+    block = _block_index(Mission, block_end_phase)
+    beta_start = float(Mission[0].weight_fraction.value)
+    beta_block = float(results[4][block])
+    outputs = {
+        "WTO": WTO,
+        "fuel_weight": 1.06 * (1 - Beta_final) * WTO,
+        "block_fuel": (beta_start - beta_block) * WTO,
+        "WSR": float(results[1]),
+        "TWR": float(results[2]),
+        "Beta_final": Beta_final,
+    }
+    if gradient:
+        d_WTO = gradients["d_WTO"]
+        outputs["d_WTO"] = d_WTO
+        outputs["d_fuel_weight"] = gradients["d_fuel_weight"]
+        outputs["d_block_fuel"] = (
+            beta_start - beta_block
+        ) * d_WTO - WTO * gradients["d_betas"][block]
+        outputs["d_Beta_final"] = gradients["d_Beta_final"]
+    return outputs
+
+
+def _solve_point_worker(args):
+    """Solves a point, the result of an infeasible point is its InfeasibleDesign error."""
+    try:
+        return solve_point(*args)
+    except InfeasibleDesign as error:
+        return error
+
+
+class OptimizationResults:
+    """
+    Results of an optimization.
+    Attributes:
+        x (dict): {input name: optimal value}.
+        objective (str): Name of the objective.
+        outputs (dict): WTO, fuel weight, block fuel, WSR, TWR and Beta_final at the optimum.
+        success (bool), message (str): Status of the scipy optimizer.
+        iterations (int): Iterations (or generations) of the optimizer.
+        evaluations (int): Objective evaluations requested by the optimizer.
+        solves (int): Sizing solves, finite difference points included, the points found in the
+                      in-memory cache excluded.
+        rejected (int): Sizing solves of infeasible points.
+        wall_time (float): Wall time of the optimization (s).
+        history (List[float]): Objective of each evaluation.
+    """
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "objective": self.objective,
+            "x": self.x,
+            "outputs": self.outputs,
+            "success": bool(self.success),
+            "message": str(self.message),
+            "iterations": int(self.iterations),
+            "evaluations": int(self.evaluations),
+            "solves": int(self.solves),
+            "rejected": int(self.rejected),
+            "wall_time": float(self.wall_time),
+        }
+
+    def report(self) -> str:
+        lines = [f"Minimize {self.objective}: {self.message}"]
+        for name, value in self.x.items():
+            lines.append(f"    {name:<20} {value:.6g}")
+        for name, value in self.outputs.items():
+            lines.append(f"    {name:<20} {value:.6g}")
+        lines.append(
+            f"{self.iterations} iterations, {self.evaluations} evaluations, "
+            f"{self.solves} sizing solves ({self.rejected} infeasible), "
+            f"{self.wall_time:.1f} s"
+        )
+        return "\n".join(lines)
+
+
+class _Problem:
+    """
+    Objective of the optimizer in the unit box, with the in-memory cache of the solved points and
+    the process pool.
+    """
+
+    def __init__(
+        self,
+        mission_data,
+        bounds,
+        objective,
+        block_end_phase,
+        cache_directory,
+        pool,
+        fd_step,
+        max_iteration,
+        tolerance,
+    ):
+        self.mission_data = mission_data
+        self.names = list(bounds.keys())
+        self.low = np.array([b[0] for b in bounds.values()], dtype=float)
+        self.high = np.array([b[1] for b in bounds.values()], dtype=float)
+        self.objective = objective
+        self.block_end_phase = block_end_phase
+        self.cache_directory = cache_directory
+        self.pool = pool
+        self.fd_step = fd_step
+        self.max_iteration = max_iteration
+        self.tolerance = tolerance
+        self.dual_names = [
+            name for name in self.names if Mission_Derivatives.differentiable(name)
+        ]
+        self.cache = {}
+        self.evaluations = 0
+        self.solves = 0
+        self.rejected = 0
+        self.history = []
+
+    def values(self, u):
+        return dict(zip(self.names, self.low + np.asarray(u) * (self.high - self.low)))
+
+    def solve(self, points, gradient=()):
+        """
+        Solves the points (unit box) not solved yet, in parallel. The result of an infeasible point
+        is its InfeasibleDesign error.
+        """
+        keys = [(tuple(np.round(u, 12)), tuple(gradient)) for u in points]
+        new = list(dict.fromkeys(key for key in keys if key not in self.cache))
+        tasks = [
+            (
+                self.mission_data,
+                self.values(key[0]),
+                key[1],
+                self.block_end_phase,
+                self.cache_directory,
+                self.max_iteration,
+                self.tolerance,
+            )
+            for key in new
+        ]
+        if self.pool is not None and len(tasks) > 1:
+            solved = self.pool.map(_solve_point_worker, tasks)
+        else:
+            solved = [_solve_point_worker(task) for task in tasks]
+        self.solves += len(tasks)
+        self.rejected += sum(isinstance(outputs, InfeasibleDesign) for outputs in solved)
+        self.cache.update(zip(new, solved))
+        return [self.cache[key] for key in keys]
+
+    def penalty(self):
+        """Objective of an infeasible point for the gradient-based methods."""
+        feasible = [
+            outputs[self.objective]
+            for outputs in self.cache.values()
+            if not isinstance(outputs, InfeasibleDesign)
+        ]
+        return 2 * max(feasible) if feasible else np.inf
+
+    def feasibility(self, u):
+        """SLSQP inequality constraint: 0 at a feasible point, -1 at an infeasible one."""
+        outputs = self.solve([np.clip(np.asarray(u, dtype=float), 0, 1)], self.dual_names)[0]
+        return -1.0 if isinstance(outputs, InfeasibleDesign) else 0.0
+
+    def value_and_gradient(self, u):
+        """Objective and its gradient in the unit box, see `penalty` for infeasible points."""
+        u = np.clip(np.asarray(u, dtype=float), 0, 1)
+        self.evaluations += 1
+        if isinstance(self.solve([u], self.dual_names)[0], InfeasibleDesign):
+            value = self.penalty()
+            self.history.append(value)
+            return value, np.zeros(len(u))
+        ## Forward differences for the inputs without dual derivatives, away from the bounds
+        fd = [i for i, name in enumerate(self.names) if name not in self.dual_names]
+        points = [u]
+        for i in fd:
+            step = np.zeros_like(u)
+            step[i] = self.fd_step if u[i] + self.fd_step <= 1 else -self.fd_step
+            points.append(u + step)
+        solved = self.solve(points[:1], self.dual_names) + self.solve(points[1:])
+        value = solved[0][self.objective]
+        grad = np.zeros(len(u))
+        dual_grad = solved[0].get("d_" + self.objective, [])
+        for j, name in enumerate(self.dual_names):
+            i = self.names.index(name)
+            grad[i] = dual_grad[j] * (self.high[i] - self.low[i])
+        for i, point, outputs in zip(fd, points[1:], solved[1:]):
+            if isinstance(outputs, InfeasibleDesign):
+                ## The step crosses into the infeasible region: difference on the other side
+                point = 2 * u - point
+                if not 0 <= point[i] <= 1:
+                    continue
+                outputs = self.solve([point])[0]
+                if isinstance(outputs, InfeasibleDesign):
+                    continue
+            grad[i] = (outputs[self.objective] - value) / (point[i] - u[i])
+        self.history.append(value)
+        return value, grad
+
+    def population(self, U):
+        """Objectives of a population (differential evolution, shape (d, S))."""
+        solved = self.solve(np.asarray(U).T)
+        values = np.array(
+            [
+                np.inf if isinstance(outputs, InfeasibleDesign) else outputs[self.objective]
+                for outputs in solved
+            ]
+        )
+        self.evaluations += len(values)
+        self.history.extend(values.tolist())
+        return values
+
+
+def optimize(
+    mission_data: dict,
+    bounds: dict,
+    objective="WTO",
+    method="L-BFGS-B",
+    x0: dict = None,
+    processes=1,
+    cache_directory=DEFAULT_CACHE_DIR,
+    block_end_phase="10",
+    fd_step=1e-3,
+    maxiter=100,
+    popsize=15,
+    seed=None,
+    max_iteration=20,
+    tolerance=1e-6,
+) -> OptimizationResults:
+    """
+    Minimizes an objective of the sized aircraft over inputs within bounds.
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `Data_formating.load_mission_data`.
+    bounds (dict): {input name: (low, high)}.
+    objective (str, optional): "WTO", "fuel_weight" or "block_fuel". Defaults to "WTO".
+    method (str, optional): "L-BFGS-B", "SLSQP" or "differential_evolution".
+    x0 (dict, optional): Starting point of the gradient-based methods. Defaults to the current
+                         values of the inputs, clipped to the bounds.
+    processes (int, optional): Number of processes solving the points. Defaults to 1.
+    cache_directory (str, optional): Results cache, None to disable it.
+    block_end_phase (str, optional): Last phase of the block fuel. Defaults to "10".
+    fd_step (float, optional): Finite difference step, as a fraction of the bounds. Defaults to 1e-3.
+    maxiter (int, optional): Maximum number of iterations (generations). Defaults to 100.
+    popsize (int, optional): Population size multiplier of differential evolution. Defaults to 15.
+    seed (int, optional): Seed of differential evolution. Defaults to None.
+    max_iteration, tolerance: See `Beta_loop.main_loop`.
+    Returns:
+    OptimizationResults: Optimum and statistics of the optimization.
+    Raises:
+    ValueError: If the objective, the method, an input or its bounds are invalid.
+    """
+    from scipy import optimize as scipy_optimize
+
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}, must be one of {OBJECTIVES}")
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, must be one of {METHODS}")
+    Mission = df.build_mission(mission_data)
+    check_inputs(Mission, bounds)
+    _block_index(Mission, block_end_phase)
+    for name, (low, high) in bounds.items():
+        if not low < high:
+            raise ValueError(f"Invalid bounds {[low, high]} for {name!r}")
+
+    start = time.perf_counter()
+    pool = None
+    if processes > 1:
+        from multiprocessing import Pool
+
+        pool = Pool(processes)
+    try:
+        problem = _Problem(
+            mission_data,
+            bounds,
+            objective,
+            block_end_phase,
+            cache_directory,
+            pool,
+            fd_step,
+            max_iteration,
+            tolerance,
+        )
+        d = len(problem.names)
+        if method in GRADIENT_METHODS:
+            if x0 is None:
+                x0 = input_values(Mission, problem.names)
+            x = np.array([x0[name] for name in problem.names], dtype=float)
+            u0 = np.clip((x - problem.low) / (problem.high - problem.low), 0, 1)
+            constraints = ()
+            if method == "SLSQP":
+                constraints = {
+                    "type": "ineq",
+                    "fun": problem.feasibility,
+                    "jac": lambda u: np.zeros((1, d)),
+                }
+            result = scipy_optimize.minimize(
+                problem.value_and_gradient,
+                u0,
+                jac=True,
+                method=method,
+                bounds=[(0, 1)] * d,
+                constraints=constraints,
+                options={"maxiter": maxiter},
+            )
+        else:
+            result = scipy_optimize.differential_evolution(
+                problem.population,
+                [(0, 1)] * d,
+                maxiter=maxiter,
+                popsize=popsize,
+                seed=seed,
+                polish=False,
+                vectorized=True,
+                updating="deferred",
+            )
+        u = np.clip(result.x, 0, 1)
+        outputs = problem.solve([u])[0]
+        success = result.success
+        message = result.message
+        if isinstance(outputs, InfeasibleDesign):
+            success = False
+            message = f"{message} (the final point is infeasible: {outputs})"
+            outputs = {name: np.nan for name in OUTPUTS}
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return OptimizationResults(
+        x={name: float(v) for name, v in problem.values(u).items()},
+        objective=objective,
+        outputs={name: float(outputs[name]) for name in OUTPUTS},
+        success=success,
+        message=message,
+        iterations=getattr(result, "nit", 0),
+        evaluations=problem.evaluations,
+        solves=problem.solves,
+        rejected=problem.rejected,
+        wall_time=time.perf_counter() - start,
+        history=problem.history,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Design optimization")
+    parser.add_argument("bounds", help="JSON file {input name: [low, high]}")
+    parser.add_argument("--mission", default="Mission_Profile.json")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="WTO")
+    parser.add_argument("--method", choices=METHODS, default="L-BFGS-B")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the results cache")
+    parser.add_argument("--block-end-phase", default="10")
+    parser.add_argument("--maxiter", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    with open(args.bounds, "r") as file:
+        bounds = json.load(file)
+    mission_file = os.path.join(
+        os.path.dirname(__file__), "..", "..", "Inputs", args.mission
+    )
+    results = optimize(
+        df.load_mission_data(os.path.normpath(mission_file)),
+        bounds,
+        objective=args.objective,
+        method=args.method,
+        processes=args.processes,
+        cache_directory=None if args.no_cache else DEFAULT_CACHE_DIR,
+        block_end_phase=args.block_end_phase,
+        maxiter=args.maxiter,
+        seed=args.seed,
+    )
+    print(results.report())
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results.to_dict(), file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
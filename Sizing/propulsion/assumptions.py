@@ -1,5 +1,6 @@
 import numpy as np
 from Sizing.Variable_info.variables import Aircraft
+from Sizing.utils import instrumentation
 
 """
 This module contains functions related to propulsion assumptions for aircraft sizing.
@@ -21,6 +22,8 @@ def thrust_lapse(Mach_inf, density_ratio):
     Returns:
         float: Thrust lapse.
     """
+    if instrumentation.enabled:
+        instrumentation.count("propulsion.thrust_lapse")
     temp1 = (1.2 - Mach_inf) ** 3
     return (0.568 + 0.25 * (temp1)) * density_ratio**0.6
 
@@ -34,6 +37,8 @@ def TSFC(Mach_inf, Temp_ratio):
     Returns:
         float: Thrust specific fuel consumption.
     """
+    if instrumentation.enabled:
+        instrumentation.count("propulsion.TSFC")
     return (
         np.sqrt(Temp_ratio) * Aircraft.Propulsion.ktsfc.value * (0.45 + 0.54 * Mach_inf)
     ) / 3600  ## convert from 1/hr to 1/s
@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+import Beta_loop as bl
+import Data_formating as df
+import Sizing.aerodynamics.Assumptions as aerodynamics
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.MissionProfile.segments import segments
+from Sizing.sweep.warm_start import seed_mission
+from typing import List
+
+"""
+This module provides a persistent, content-addressed cache for the results of the sizing loop.
+A sizing case is identified by a hash of:
+    - the normalized mission (attributes of every segment, see `normalized_mission`),
+    - the input coefficients used by the solver (K1, K2, kTSFC, kWE) and the crew and payload weights,
+    - the solver settings (max_iteration, tolerance).
+The initial guesses are not part of the key: they only change the path to the converged solution.
+Each entry is stored as a compressed .npz file holding the converged design, the beta list and the
+constraint curves. When the cache is larger than `max_bytes`, the least recently used entries are removed.
+The cache can be cleared from the command line:
+    python -m Sizing.results.cache clear
+Classes:
+    ResultCache:
+        On-disk cache of `Beta_loop.main_loop` results.
+Functions:
+    normalized_mission(Mission) -> List[dict]:
+        Canonical description of a mission, independent of the current weight fractions.
+    case_key(Mission, WC, WP, max_iteration, tolerance) -> str:
+        Hash identifying a sizing case.
+    results_from_entry(entry, Mission) -> tuple:
+        `main_loop` results of a cache entry.
+"""
+
+DEFAULT_CACHE_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "outputs", "cache")
+)
+DEFAULT_MAX_BYTES = 200 * 1024**2  # 200 MB
+
+
+def _normalize_value(value):
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_normalize_value(v) for v in value]
+    return str(value)
+
+
+def normalized_mission(Mission: List[segments]) -> List[dict]:
+    """
+    Returns a canonical description of the mission used to build the cache key.
+    Numbers are converted to float and phase numbers to str. Only the weight fraction of the
+    first segment is kept: the other ones are recomputed by the mission analysis.
+    """
+    phases = []
+    for i, segment in enumerate(Mission):
+        attributes = df.extract_attributes(segment)
+        if i > 0:
+            attributes.pop("weight_fraction")
+        attributes["phase_number"] = str(attributes["phase_number"])
+        phases.append({key: _normalize_value(v) for key, v in attributes.items()})
+    return phases
+
+
+def input_data(WC, WP) -> dict:
+    """Input coefficients currently used by the solver."""
+    return {
+        "K1": float(aerodynamics.K1),
+        "K2": float(aerodynamics.K2),
+        "kTSFC": float(Aircraft.Propulsion.ktsfc.value),
+        "kWE": float(Aircraft.Structure.KWE.value),
+        "WC": float(WC),
+        "WP": float(WP),
+    }
+
+
+def case_key(Mission: List[segments], WC, WP, max_iteration=20, tolerance=0.001):
+    """
+    Computes the hash identifying a sizing case.
+    Returns:
+    str: Hexadecimal SHA-256 digest.
+    """
+    case = {
+        "mission": normalized_mission(Mission),
+        "inputs": input_data(WC, WP),
+        "solver": {"max_iteration": int(max_iteration), "tolerance": float(tolerance)},
+    }
+    canonical = json.dumps(case, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of `Beta_loop.main_loop` results.
+    Attributes:
+        directory (str): Folder containing the cache entries.
+        max_bytes (int): Maximum total size of the entries, the least recently used are evicted.
+        hits (int): Number of results found in the cache.
+        misses (int): Number of results that had to be computed.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+        """
+        Returns the cached entry for key as a dictionary of arrays, None if not cached.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = {name: data[name] for name in data.files}
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(path)  ## Mark the entry as recently used
+        return entry
+
+    def put(self, key, results):
+        """
+        Stores the results of `main_loop` for key and evicts old entries if needed.
+        """
+        WTO, WSR, TWR, Beta_final, list_betas, constraints = results[:6]
+        wing_loading = np.asarray(constraints[2], dtype=float)
+        curves = [
+            np.broadcast_to(np.asarray(TWR_curve, dtype=float), wing_loading.shape)
+            for TWR_curve in constraints[3]
+        ]
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(key) + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            design=np.array([WTO, WSR, TWR, Beta_final], dtype=float).ravel(),
+            betas=np.asarray(list_betas, dtype=float),
+            constraint_design=np.array(
+                [constraints[0], constraints[1], constraints[5]], dtype=float
+            ).ravel(),
+            wing_loading=wing_loading,
+            thrust_weight_ratios=np.array(curves),
+            y_max=np.asarray(constraints[4], dtype=float),
+            names=np.array([str(name) for name in constraints[6]]),
+        )
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def entries(self):
+        """Returns a list of (path, size in bytes, last use time) for every entry."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz") and not name.endswith(".tmp.npz"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append(
+                    (os.path.join(self.directory, name), stat.st_size, stat.st_mtime)
+                )
+        return entries
+
+    def clear(self):
+        """Removes every entry of the cache. Returns the number of entries removed."""
+        entries = self.entries()
+        for path, _, _ in entries:
+            os.remove(path)
+        return len(entries)
+
+    def main_loop(
+        self,
+        Mission: List[segments],
+        WC,
+        WP,
+        guess_WTO,
+        max_iteration=20,
+        tolerance=0.001,
+        WSR_guess=110,
+        TWR_guess=0.3,
+    ):
+        """
+        Same as `Beta_loop.main_loop`, but returns the cached results when the case has already
+        been solved. On a cache hit, the segments of Mission are updated with the cached weight
+        fractions, as `main_loop` would do.
+        """
+        key = case_key(Mission, WC, WP, max_iteration, tolerance)
+        entry = self.get(key)
+        if entry is None:
+            self.misses += 1
+            results = bl.main_loop(
+                Mission,
+                WC,
+                WP,
+                guess_WTO,
+                max_iteration,
+                tolerance,
+                WSR_guess,
+                TWR_guess,
+            )
+            self.put(key, results)
+            return results
+        self.hits += 1
+        return results_from_entry(entry, Mission)
+
+
+def results_from_entry(entry: dict, Mission: List[segments]):
+    """
+    Converts a cache entry to the results of `main_loop`, the segments of Mission being updated
+    with the cached weight fractions.
+    """
+    WTO, WSR, TWR, Beta_final = (float(x) for x in entry["design"])
+    list_betas = [float(beta) for beta in entry["betas"]]
+    seed_mission(Mission, list_betas)
+    wing_loading_design, TWR_design, wing_loading_landing = (
+        float(x) for x in entry["constraint_design"]
+    )
+    constraints = (
+        wing_loading_design,
+        TWR_design,
+        entry["wing_loading"],
+        list(entry["thrust_weight_ratios"]),
+        entry["y_max"],
+        wing_loading_landing,
+        [str(name) for name in entry["names"]],
+    )
+    return (WTO, WSR, TWR, Beta_final, list_betas, constraints, Mission)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sizing results cache")
+    parser.add_argument("command", choices=["clear", "info"])
+    parser.add_argument("--directory", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+    cache = ResultCache(args.directory)
+    if args.command == "clear":
+        print(f"Removed {cache.clear()} cached results from {args.directory}")
+    else:
+        entries = cache.entries()
+        size = sum(size for _, size, _ in entries) / 1024**2
+        print(f"{len(entries)} cached results ({size:.2f} MB) in {args.directory}")
@@ -0,0 +1,291 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import Beta_loop as bl
+from Sizing.MissionProfile.segments import segments
+from Sizing.results.cache import (
+    DEFAULT_CACHE_DIR,
+    ResultCache,
+    case_key,
+    input_data,
+    normalized_mission,
+    results_from_entry,
+)
+from Sizing.utils import events
+from typing import List
+
+"""
+This module keeps a SQLite catalog of the sizing runs, to find and reuse past results.
+Each run of `main_loop` (single run or point of a sweep) is recorded with:
+    - its case key (see `Sizing.results.cache.case_key`) and a hash of its mission alone,
+    - the key inputs: K1, K2, kTSFC, kWE, crew and payload weights, range, Mach and altitude of the
+      first cruise segment, and the whole normalized mission as JSON,
+    - the key outputs: WTO, WSR, TWR, Beta_final and fuel weight,
+    - solver statistics: iterations of the Beta and WTO loops, convergence and wall time,
+    - the path of the detailed results (the entry of the results cache).
+The commonly filtered columns are indexed. `RunCatalog.main_loop` has the signature of
+`ResultCache.main_loop`: a case already in the catalog, whose detailed results still exist, is
+loaded instead of being solved, so sweeps skip the points computed before:
+    run_sweep(mission_data, points, cache=RunCatalog())
+The catalog can be queried from the command line:
+    python -m Sizing.results.catalog list --where "cruise_range > 3000" --order-by WTO --limit 10
+Classes:
+    RunCatalog:
+        SQLite catalog of the sizing runs.
+"""
+
+DEFAULT_CATALOG_PATH = os.path.normpath(
+    os.path.join(DEFAULT_CACHE_DIR, "..", "catalog.sqlite")
+)
+INPUT_COLUMNS = ("K1", "K2", "kTSFC", "kWE", "WC", "WP")
+CRUISE_COLUMNS = {"cruise_range": "range", "cruise_mach": "Mach", "cruise_altitude": "altitude"}
+OUTPUT_COLUMNS = ("WTO", "WSR", "TWR", "Beta_final", "fuel_weight")
+STATISTICS_COLUMNS = ("beta_iterations", "wto_iterations", "converged", "wall_time")
+COLUMNS = (
+    ("key", "TEXT PRIMARY KEY"),
+    ("created", "REAL"),
+    ("mission_hash", "TEXT"),
+    *((name, "REAL") for name in INPUT_COLUMNS + tuple(CRUISE_COLUMNS) + OUTPUT_COLUMNS),
+    ("beta_iterations", "INTEGER"),
+    ("wto_iterations", "INTEGER"),
+    ("converged", "INTEGER"),
+    ("wall_time", "REAL"),
+    ("max_iteration", "INTEGER"),
+    ("tolerance", "REAL"),
+    ("results_path", "TEXT"),
+    ("mission", "TEXT"),
+)
+INDEXED_COLUMNS = (
+    ("mission_hash",),
+    ("cruise_range", "cruise_mach"),
+    ("WTO",),
+    ("created",),
+)
+
+
+def mission_hash(Mission: List[segments]) -> str:
+    """Hash of the normalized mission, identifying the runs of a same mission."""
+    canonical = json.dumps(normalized_mission(Mission), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _cruise_inputs(Mission: List[segments]) -> dict:
+    for segment in Mission:
+        if segment.type == "Cruise":
+            return {
+                column: float(getattr(segment, field).value)
+                for column, field in CRUISE_COLUMNS.items()
+            }
+    return {column: None for column in CRUISE_COLUMNS}
+
+
+class RunCatalog:
+    """
+    SQLite catalog of the sizing runs.
+    Attributes:
+        path (str): SQLite database file.
+        cache (ResultCache): Results cache holding the detailed results of the runs.
+        hits (int): Number of runs found in the catalog.
+        misses (int): Number of runs that had to be solved.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH, cache: ResultCache = None):
+        self.path = os.path.normpath(path)
+        self.cache = ResultCache() if cache is None else cache
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                + ", ".join(f"{name} {kind}" for name, kind in COLUMNS)
+                + ")"
+            )
+            for columns in INDEXED_COLUMNS:
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS runs_{'_'.join(columns)} "
+                    f"ON runs ({', '.join(columns)})"
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def get(self, key):
+        """Returns the record of a case key as a dict, None if not cataloged."""
+        row = self.connection.execute("SELECT * FROM runs WHERE key = ?", (key,)).fetchone()
+        return None if row is None else dict(row)
+
+    def record(
+        self,
+        key,
+        Mission: List[segments],
+        WC,
+        WP,
+        results,
+        statistics: dict = None,
+        results_path=None,
+        max_iteration=20,
+        tolerance=0.001,
+    ):
+        """
+        Records a run, replacing a previous record of the same case.
+        Parameters:
+        key (str): Case key, see `case_key`.
+        Mission (List[segments]): Mission of the run.
+        WC, WP (float): Crew and payload weights.
+        results (tuple): `main_loop` results.
+        statistics (dict, optional): Values of STATISTICS_COLUMNS. Defaults to None (unknown).
+        results_path (str, optional): Path of the detailed results. Defaults to None.
+        max_iteration, tolerance: Solver settings of the run.
+        """
+        WTO, WSR, TWR, Beta_final = (float(x) for x in results[:4])
+        values = {
+            "key": key,
+            "created": time.time(),
+            "mission_hash": mission_hash(Mission),
+            **input_data(WC, WP),
+            **_cruise_inputs(Mission),
+            "WTO": WTO,
+            "WSR": WSR,
+            "TWR": TWR,
+            "Beta_final": Beta_final,
+            "fuel_weight": 1.06 * (1 - Beta_final) * WTO,
+            **(statistics or {}),
+            "max_iteration": int(max_iteration),
+            "tolerance": float(tolerance),
+            "results_path": results_path,
+            "mission": json.dumps(normalized_mission(Mission), sort_keys=True),
+        }
+        names = list(values)
+        with self.connection:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO runs ({', '.join(names)}) "
+                f"VALUES ({', '.join('?' for _ in names)})",
+                [values[name] for name in names],
+            )
+
+    def query(self, where="", parameters=(), order_by="created", limit=None) -> List[dict]:
+        """
+        Returns the records matching a SQL condition, e.g.
+            catalog.query("cruise_range BETWEEN ? AND ? AND converged", (2500, 3500), "WTO")
+        Parameters:
+        where (str, optional): SQL condition on the columns. Defaults to "" (all the runs).
+        parameters (tuple, optional): Values of the ? placeholders of where.
+        order_by (str, optional): Sort column(s). Defaults to "created".
+        limit (int, optional): Maximum number of records. Defaults to None (no limit).
+        """
+        sql = "SELECT * FROM runs"
+        if where:
+            sql += f" WHERE {where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self.connection.execute(sql, tuple(parameters))]
+
+    def main_loop(
+        self,
+        Mission: List[segments],
+        WC,
+        WP,
+        guess_WTO,
+        max_iteration=20,
+        tolerance=0.001,
+        WSR_guess=110,
+        TWR_guess=0.3,
+    ):
+        """
+        Same as `Beta_loop.main_loop`, but loads the results of a case already in the catalog.
+        The solved cases are recorded and their detailed results put in the results cache.
+        A case whose detailed results were evicted from the cache is solved again.
+        """
+        key = case_key(Mission, WC, WP, max_iteration, tolerance)
+        record = self.get(key)
+        if record is not None and record["results_path"]:
+            entry = self.cache.get(key)
+            if entry is not None:
+                self.hits += 1
+                return results_from_entry(entry, Mission)
+        self.misses += 1
+        metrics = events.subscribe(events.MetricsObserver())
+        start_time = time.perf_counter()
+        try:
+            results = bl.main_loop(
+                Mission,
+                WC,
+                WP,
+                guess_WTO,
+                max_iteration,
+                tolerance,
+                WSR_guess,
+                TWR_guess,
+            )
+        finally:
+            events.unsubscribe(metrics)
+        statistics = {
+            "beta_iterations": metrics.iterations.get("Beta", 0),
+            "wto_iterations": metrics.iterations.get("WTO", 0),
+            "converged": int(
+                all(metrics.convergence.get(loop) is not None for loop in ("Beta", "WTO"))
+            ),
+            "wall_time": time.perf_counter() - start_time,
+        }
+        self.cache.put(key, results)
+        self.record(
+            key,
+            Mission,
+            WC,
+            WP,
+            results,
+            statistics,
+            self.cache._path(key),
+            max_iteration,
+            tolerance,
+        )
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Catalog of the sizing runs")
+    parser.add_argument("command", choices=["list", "info"])
+    parser.add_argument("--path", default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--where", default="", help="SQL condition, e.g. \"WTO < 170000\"")
+    parser.add_argument("--order-by", default="created")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with RunCatalog(args.path) as catalog:
+        if args.command == "info":
+            print(f"{len(catalog)} runs in {catalog.path}")
+            return
+        columns = ("key",) + tuple(CRUISE_COLUMNS) + OUTPUT_COLUMNS[:3] + STATISTICS_COLUMNS
+        print(" ".join(f"{name:>15}" for name in columns))
+        for record in catalog.query(args.where, order_by=args.order_by, limit=args.limit):
+            print(
+                " ".join(
+                    f"{record[name][:15]:>15}"
+                    if isinstance(record[name], str)
+                    else f"{record[name]:>15.6g}"
+                    if record[name] is not None
+                    else f"{'':>15}"
+                    for name in columns
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+import argparse
+import json
+import os
+import numpy as np
+
+"""
+This module stores the results of sweeps and batches of sizing cases in chunked binary files, so
+that large studies can be appended run after run and queried without loading them in memory.
+A store holds one row per sizing case ("case" dimension, which grows at each append):
+    - "input_<name>": inputs of the cases, e.g. "input_K1" or "input_7.range",
+    - "output_<name>": outputs, e.g. "output_WTO", "output_WSR", "output_converged",
+    - "beta" (case, segment), optional: weight fraction at the end of each segment,
+    - "constraint_TWR" (case, constraint, wing_loading), optional: constraint curves,
+with the coordinates "phase" (segment), "constraint" and "wing_loading" written once.
+All the appended batches must have the same variables.
+Backends, chosen from the path:
+    - ".nc", ".h5" or ".hdf5": NetCDF4 file (an HDF5 file, also readable with h5py), written with
+      netCDF4, each variable being chunked along the cases and compressed (zlib). Reads only
+      decompress the chunks of the requested rows, and `open_dataset` opens the file lazily with
+      xarray.
+    - any other path: directory of .npy files, one sub-directory per appended chunk. Reads are
+      memory-mapped (`np.load(mmap_mode="r")`).
+Usage:
+    python -m Sizing.results.store study.nc
+prints the variables and the number of cases of a store.
+Classes:
+    ResultStore:
+        Chunked, appendable store of sizing results.
+Functions:
+    main_loop_batch(results, inputs) -> dict:
+        Batch of `Beta_loop.main_loop` results (e.g. from `warm_start.run_sweep`).
+    monte_carlo_batch(results) -> dict:
+        Batch of Monte Carlo or DOE results.
+"""
+
+NETCDF_EXTENSIONS = (".nc", ".h5", ".hdf5")
+CASE = "case"
+CHUNK_BYTES = 4 * 1024**2
+## Dimensions of the variables after the case dimension
+DIMENSIONS = {
+    "beta": ("segment",),
+    "constraint_TWR": ("constraint", "wing_loading"),
+}
+COORDINATES = {"phase": "segment", "constraint": "constraint", "wing_loading": "wing_loading"}
+
+
+def main_loop_batch(results: list, inputs: dict = None, constraints=False) -> dict:
+    """
+    Builds a batch from `Beta_loop.main_loop` results.
+    Parameters:
+    results (list): `main_loop` results of each case.
+    inputs (dict, optional): {input name: array (n,)} inputs of the cases. Defaults to None.
+    constraints (bool, optional): Store the constraint curves. Defaults to False.
+    Returns:
+    dict: Batch for `ResultStore.append`.
+    """
+    WTO, WSR, TWR, Beta_final = (
+        np.array([float(np.ravel(r[i])[0]) for r in results]) for i in range(4)
+    )
+    batch = {
+        "inputs": dict(inputs or {}),
+        "outputs": {
+            "WTO": WTO,
+            "fuel_weight": 1.06 * (1 - Beta_final) * WTO,
+            "WSR": WSR,
+            "TWR": TWR,
+            "Beta_final": Beta_final,
+        },
+        "beta": np.array([np.asarray(r[4], dtype=float).ravel() for r in results]),
+    }
+    if len(results[0]) > 6:
+        batch["phase"] = [str(segment.phase_number) for segment in results[0][6]]
+    if constraints:
+        wing_loading = np.asarray(results[0][5][2], dtype=float)
+        batch["wing_loading"] = wing_loading
+        batch["constraint"] = [str(name) for name in results[0][5][6]]
+        batch["constraint_TWR"] = np.array(
+            [
+                [np.broadcast_to(np.asarray(c, dtype=float), wing_loading.shape) for c in r[5][3]]
+                for r in results
+            ]
+        )
+    return batch
+
+
+def monte_carlo_batch(results) -> dict:
+    """Builds a batch from `MonteCarloResults` (Monte Carlo or DOE results)."""
+    return {"inputs": dict(results.samples), "outputs": dict(results.outputs)}
+
+
+def _variables(batch: dict) -> dict:
+    """{variable name: array} of the case variables of a batch."""
+    variables = {"input_" + name: v for name, v in batch.get("inputs", {}).items()}
+    variables.update({"output_" + name: v for name, v in batch.get("outputs", {}).items()})
+    for name in DIMENSIONS:
+        if batch.get(name) is not None:
+            variables[name] = batch[name]
+    variables = {name: np.asarray(v) for name, v in variables.items()}
+    for name, v in variables.items():
+        if v.dtype == bool:
+            variables[name] = v.astype(np.int8)
+    sizes = {v.shape[0] for v in variables.values()}
+    if len(sizes) != 1:
+        raise ValueError(f"The variables of the batch have different numbers of cases: {sizes}")
+    return variables
+
+
+class _NetCDFBackend:
+    def __init__(self, path, chunk_size, complevel):
+        import netCDF4
+
+        self.chunk_size = chunk_size
+        self.complevel = complevel
+        mode = "a" if os.path.exists(path) else "w"
+        self.dataset = netCDF4.Dataset(path, mode, format="NETCDF4")
+        self.dataset.set_auto_mask(False)
+        if CASE not in self.dataset.dimensions:
+            self.dataset.createDimension(CASE, None)
+
+    def names(self):
+        return [
+            name
+            for name, v in self.dataset.variables.items()
+            if v.dimensions[:1] == (CASE,)
+        ]
+
+    def __len__(self):
+        return len(self.dataset.dimensions[CASE])
+
+    def create(self, variables: dict, coordinates: dict):
+        for name, values in coordinates.items():
+            dimension = COORDINATES[name]
+            self.dataset.createDimension(dimension, len(values))
+            values = np.asarray(values)
+            if values.dtype.kind in "US":
+                variable = self.dataset.createVariable(name, str, (dimension,))
+                for i, value in enumerate(values):
+                    variable[i] = str(value)
+            else:
+                self.dataset.createVariable(name, values.dtype, (dimension,))[:] = values
+        for name, values in variables.items():
+            tail = DIMENSIONS.get(name, ())
+            ## Chunks of at most CHUNK_BYTES, e.g. for the constraint curves
+            row_bytes = values.dtype.itemsize * int(np.prod(values.shape[1:]))
+            self.dataset.createVariable(
+                name,
+                values.dtype,
+                (CASE,) + tail,
+                zlib=True,
+                complevel=self.complevel,
+                chunksizes=(max(1, min(self.chunk_size, CHUNK_BYTES // row_bytes)),)
+                + values.shape[1:],
+            )
+
+    def append(self, variables: dict):
+        start = len(self)
+        for name, values in variables.items():
+            self.dataset.variables[name][start : start + values.shape[0]] = values
+        self.dataset.sync()
+
+    def coordinate(self, name):
+        if name not in self.dataset.variables:
+            return None
+        return np.asarray(self.dataset.variables[name][:])
+
+    def read(self, name, rows):
+        return np.asarray(self.dataset.variables[name][rows])
+
+    def close(self):
+        self.dataset.close()
+
+
+class _NpyBackend:
+    def __init__(self, path, chunk_size, complevel):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.meta_path = os.path.join(path, "store.json")
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as file:
+                self.meta = json.load(file)
+        else:
+            self.meta = {"variables": [], "coordinates": [], "chunks": []}
+
+    def names(self):
+        return list(self.meta["variables"])
+
+    def __len__(self):
+        return self.meta["chunks"][-1][1] if self.meta["chunks"] else 0
+
+    def _write_meta(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.meta, file)
+        os.replace(tmp_path, self.meta_path)
+
+    def create(self, variables: dict, coordinates: dict):
+        os.makedirs(self.path, exist_ok=True)
+        for name, values in coordinates.items():
+            np.save(os.path.join(self.path, name + ".npy"), np.asarray(values))
+        self.meta.update(variables=list(variables), coordinates=list(coordinates))
+        self._write_meta()
+
+    def _chunk_directory(self, start):
+        return os.path.join(self.path, f"chunk_{start:09d}")
+
+    def append(self, variables: dict):
+        n = next(iter(variables.values())).shape[0]
+        for start in range(0, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            offset = len(self)
+            directory = self._chunk_directory(offset)
+            os.makedirs(directory, exist_ok=True)
+            for name, values in variables.items():
+                np.save(os.path.join(directory, name + ".npy"), values[start:stop])
+            ## The chunk exists once it is in the metadata
+            self.meta["chunks"].append([offset, offset + stop - start])
+            self._write_meta()
+
+    def coordinate(self, name):
+        if name not in self.meta["coordinates"]:
+            return None
+        return np.load(os.path.join(self.path, name + ".npy"))
+
+    def read(self, name, rows):
+        start, stop, step = rows.indices(len(self))
+        parts = []
+        for chunk_start, chunk_stop in self.meta["chunks"]:
+            if chunk_stop <= start or chunk_start >= stop:
+                continue
+            ## First row of the chunk on the step grid
+            first = max(start, chunk_start)
+            first += (start - first) % step
+            if first >= min(stop, chunk_stop):
+                continue
+            values = np.load(
+                os.path.join(self._chunk_directory(chunk_start), name + ".npy"),
+                mmap_mode="r",
+            )
+            parts.append(
+                values[first - chunk_start : min(stop, chunk_stop) - chunk_start : step]
+            )
+        if not parts:
+            return np.empty((0,))
+        return np.concatenate(parts)
+
+    def close(self):
+        pass
+
+
+class ResultStore:
+    """
+    Chunked, appendable store of sizing results.
+    Attributes:
+        path (str): File (NetCDF/HDF5) or directory (.npy chunks) of the store.
+        chunk_size (int): Number of cases per chunk.
+    """
+
+    def __init__(self, path, chunk_size=4096, complevel=4):
+        """
+        Opens the store, creating it if needed.
+        Parameters:
+        path (str): Path of the store, NetCDF/HDF5 file if it ends with .nc, .h5 or .hdf5, else
+                    directory of .npy files.
+        chunk_size (int, optional): Number of cases per chunk. Defaults to 4096.
+        complevel (int, optional): zlib compression level of the NetCDF variables. Defaults to 4.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        backend = (
+            _NetCDFBackend
+            if os.path.splitext(path)[1].lower() in NETCDF_EXTENSIONS
+            else _NpyBackend
+        )
+        self._backend = backend(path, chunk_size, complevel)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._backend.close()
+
+    def __len__(self):
+        return len(self._backend)
+
+    @property
+    def variables(self) -> list:
+        """Names of the case variables."""
+        return self._backend.names()
+
+    def append(self, batch: dict):
+        """
+        Appends a batch of cases at the end of the store.
+        Parameters:
+        batch (dict): {"inputs": {name: array (n,)}, "outputs": {name: array (n,)}} and optionally
+                      "beta" (n, segment), "constraint_TWR" (n, constraint, wing_loading) and the
+                      coordinates "phase", "constraint", "wing_loading", see `main_loop_batch`.
+        Raises:
+        ValueError: If the variables of the batch are not the ones of the store.
+        """
+        variables = _variables(batch)
+        names = self.variables
+        if not names:
+            coordinates = {name: batch[name] for name in COORDINATES if name in batch}
+            self._backend.create(variables, coordinates)
+        elif sorted(names) != sorted(variables):
+            raise ValueError(
+                f"The batch variables {sorted(variables)} are not the ones of the store "
+                f"{sorted(names)}"
+            )
+        self._backend.append(variables)
+
+    def coordinate(self, name):
+        """Values of the coordinate "phase", "constraint" or "wing_loading", None if not stored."""
+        return self._backend.coordinate(name)
+
+    def read(self, name, rows=slice(None)) -> np.ndarray:
+        """
+        Reads the rows of a variable, only the chunks holding these rows are read.
+        Parameters:
+        name (str): Variable name, e.g. "output_WTO".
+        rows (slice, optional): Cases to read. Defaults to all of them.
+        Raises:
+        ValueError: If the variable is not in the store.
+        """
+        if name not in self.variables:
+            raise ValueError(f"Unknown variable {name!r}, must be one of {self.variables}")
+        return self._backend.read(name, rows)
+
+    def iter_chunks(self, names=None, chunk_size=None):
+        """
+        Iterates over the store by blocks of cases, e.g. to reduce a study larger than the memory.
+        Parameters:
+        names (list, optional): Variables to read. Defaults to all of them.
+        chunk_size (int, optional): Number of cases per block. Defaults to the chunk size of the store.
+        Yields:
+        dict: {name: array} of each block.
+        """
+        names = self.variables if names is None else names
+        chunk_size = chunk_size or self.chunk_size
+        for start in range(0, len(self), chunk_size):
+            rows = slice(start, start + chunk_size)
+            yield {name: self.read(name, rows) for name in names}
+
+    def open_dataset(self):
+        """
+        Opens a NetCDF/HDF5 store lazily as an `xarray.Dataset`: the values are read when indexed.
+        Raises:
+        ValueError: If the store is a directory of .npy files.
+        """
+        import xarray
+
+        if not isinstance(self._backend, _NetCDFBackend):
+            raise ValueError("Only the NetCDF/HDF5 stores can be opened with xarray")
+        self._backend.dataset.sync()
+        return xarray.open_dataset(self.path, engine="netcdf4", cache=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summary of a result store")
+    parser.add_argument("path", help="Store file (.nc, .h5) or directory")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        raise ValueError(f"No result store at {args.path!r}")
+    with ResultStore(args.path) as store:
+        print(f"{args.path}: {len(store)} cases")
+        for name in store.variables:
+            print(f"    {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+import argparse
+import itertools
+import json
+import os
+import time
+import numpy as np
+import Data_formating as df
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.sweep.doe import DESIGNS, run_doe
+from Sizing.uncertainty.monte_carlo import check_inputs, solve_batch
+
+"""
+This module builds response surfaces (surrogate models) of the sizing loop, for tools that need the
+sized aircraft millions of times as a function of a few requirements, e.g.
+    {"7.range": [2000, 3500], "Npax": [120, 190], "7.Mach": [0.72, 0.8], "2.takeoff_distance": [5000, 7000]}
+The inputs are the ones of `Sizing.uncertainty.monte_carlo`. The surrogate is trained on sizing
+results (a DOE of `Sizing.sweep.doe` or any sweep of `Beta_loop.main_loop`) and predicts WTO, fuel
+weight, WSR and TWR. Two kinds of models are available:
+    - "polynomial": least-squares polynomial of total degree `degree` of the inputs,
+    - "rbf": cubic radial basis function interpolation with a linear polynomial tail (optionally
+      smoothed), exact at the training points.
+The inputs are scaled to [-1, 1] over the training box. The error of the model is estimated by
+k-fold cross-validation. The model is saved in a compressed .npz file holding only its
+coefficients (and the training points for "rbf") and the mission it was trained on.
+Queries are vectorized (about a microsecond per point or less). With fallback=True, the points
+outside the training box are solved by the vectorized solver (`monte_carlo.solve_batch`) instead of
+being extrapolated. The training designs being space-filling designs of a box, the box is used as
+the training hull.
+Usage:
+    python -m Sizing.surrogate.response_surface bounds.json --points 2000 --kind polynomial --degree 3 --output surrogate.npz
+Classes:
+    ResponseSurface:
+        Surrogate model: fit, predict, cross-validation, save and load.
+Functions:
+    train(mission_data, bounds, n_points, ...) -> ResponseSurface:
+        Runs a DOE and fits a surrogate on it.
+"""
+
+KINDS = ("polynomial", "rbf")
+OUTPUTS = ("WTO", "fuel_weight", "WSR", "TWR")
+_CHUNK = 20000  ## Queries evaluated at once by the rbf models
+
+
+def _exponents(d, degree):
+    """Exponents of the monomials of d variables of total degree <= degree."""
+    exponents = [
+        e for e in itertools.product(range(degree + 1), repeat=d) if sum(e) <= degree
+    ]
+    return np.array(sorted(exponents, key=lambda e: (sum(e), e[::-1])), dtype=int)
+
+
+def _monomials(z, exponents):
+    powers = [np.ones_like(z)]
+    for _ in range(exponents.max(initial=0)):
+        powers.append(powers[-1] * z)
+    features = np.empty((z.shape[0], len(exponents)))
+    for t, exponent in enumerate(exponents):
+        term = np.ones(z.shape[0])
+        for j, e in enumerate(exponent):
+            if e:
+                term = term * powers[e][:, j]
+        features[:, t] = term
+    return features
+
+
+def _distances(a, b):
+    return np.sqrt(
+        np.maximum(
+            np.sum(a**2, axis=1)[:, None]
+            + np.sum(b**2, axis=1)[None, :]
+            - 2 * a @ b.T,
+            0,
+        )
+    )
+
+
+class ResponseSurface:
+    """
+    Surrogate model of the sizing loop.
+    Attributes:
+        names (List[str]): Inputs, in the order of the columns of the queries.
+        low, high (np.ndarray): Training box, the inputs are scaled to [-1, 1] over it.
+        kind (str): "polynomial" or "rbf".
+        degree (int): Degree of the polynomial (of the polynomial tail for "rbf", 1).
+        outputs (List[str]): Predicted outputs.
+        coefficients (np.ndarray): Coefficients of the model, one column per output.
+        centers (np.ndarray): Scaled training points of the "rbf" models (empty otherwise).
+        cross_validation (dict): Errors of the k-fold cross-validation per output.
+        mission_data (dict): Mission the model was trained on, used by the fallback solver.
+    """
+
+    def __init__(
+        self,
+        names,
+        low,
+        high,
+        kind,
+        degree,
+        outputs,
+        coefficients,
+        centers=None,
+        cross_validation=None,
+        mission_data=None,
+    ):
+        self.names = list(names)
+        self.low = np.asarray(low, dtype=float)
+        self.high = np.asarray(high, dtype=float)
+        self.kind = kind
+        self.degree = int(degree)
+        self.outputs = list(outputs)
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.centers = np.empty((0, len(self.names))) if centers is None else centers
+        self.cross_validation = cross_validation or {}
+        self.mission_data = mission_data
+        self.exponents = _exponents(len(self.names), self.degree)
+
+    def scale(self, X):
+        return 2 * (np.asarray(X, dtype=float) - self.low) / (self.high - self.low) - 1
+
+    @classmethod
+    def fit(
+        cls,
+        X,
+        Y,
+        names,
+        outputs=OUTPUTS,
+        kind="polynomial",
+        degree=3,
+        smoothing=0.0,
+        low=None,
+        high=None,
+        mission_data=None,
+    ):
+        """
+        Fits a surrogate model.
+        Parameters:
+        X (np.ndarray): Training inputs, shape (n, len(names)).
+        Y (np.ndarray): Training outputs, shape (n, len(outputs)).
+        kind (str, optional): "polynomial" or "rbf". Defaults to "polynomial".
+        degree (int, optional): Degree of the polynomial. Defaults to 3.
+        smoothing (float, optional): Smoothing of the rbf models, 0 to interpolate. Defaults to 0.
+        low, high (np.ndarray, optional): Training box. Defaults to the bounds of X.
+        mission_data (dict, optional): Mission of the training points, for the fallback solver.
+        Returns:
+        ResponseSurface: Fitted model.
+        Raises:
+        ValueError: If the kind is unknown or there are not enough training points.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind {kind!r}, must be one of {KINDS}")
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float).reshape(len(X), -1)
+        low = np.min(X, axis=0) if low is None else np.asarray(low, dtype=float)
+        high = np.max(X, axis=0) if high is None else np.asarray(high, dtype=float)
+        model = cls(
+            names,
+            low,
+            high,
+            kind,
+            degree if kind == "polynomial" else 1,
+            outputs,
+            np.empty((0, Y.shape[1])),
+            mission_data=mission_data,
+        )
+        z = model.scale(X)
+        P = _monomials(z, model.exponents)
+        if len(X) < P.shape[1]:
+            raise ValueError(
+                f"A {kind} model of {len(names)} inputs needs at least {P.shape[1]} training points"
+            )
+        if kind == "polynomial":
+            model.coefficients = np.linalg.lstsq(P, Y, rcond=None)[0]
+        else:
+            n, t = P.shape
+            A = np.zeros((n + t, n + t))
+            A[:n, :n] = _distances(z, z) ** 3 + smoothing * np.eye(n)
+            A[:n, n:] = P
+            A[n:, :n] = P.T
+            b = np.vstack([Y, np.zeros((t, Y.shape[1]))])
+            model.coefficients = np.linalg.solve(A, b)
+            model.centers = z
+        return model
+
+    def _evaluate(self, z):
+        P = _monomials(z, self.exponents)
+        if self.kind == "polynomial":
+            return P @ self.coefficients
+        n = len(self.centers)
+        Y = np.empty((len(z), self.coefficients.shape[1]))
+        for start in range(0, len(z), _CHUNK):
+            stop = start + _CHUNK
+            Y[start:stop] = (
+                _distances(z[start:stop], self.centers) ** 3 @ self.coefficients[:n]
+                + P[start:stop] @ self.coefficients[n:]
+            )
+        return Y
+
+    def inside(self, X):
+        """True for the points inside the training box."""
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        return np.all((X >= self.low) & (X <= self.high), axis=1)
+
+    def predict(self, X, fallback=False) -> dict:
+        """
+        Predicts the outputs.
+        Parameters:
+        X (np.ndarray or dict): Inputs, shape (n, len(names)), or {input name: array (n,)}.
+        fallback (bool, optional): Solve the points outside the training box with the full solver
+                                   (`monte_carlo.solve_batch`). Defaults to False.
+        Returns:
+        dict: {output name: array (n,)}.
+        Raises:
+        ValueError: If fallback is requested but the model has no mission.
+        """
+        if isinstance(X, dict):
+            X = np.column_stack([np.asarray(X[name], dtype=float) for name in self.names])
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        Y = self._evaluate(self.scale(X))
+        if fallback:
+            outside = ~self.inside(X)
+            if np.any(outside):
+                if self.mission_data is None:
+                    raise ValueError("The model has no mission to fall back to the solver")
+                solved = solve_batch(
+                    self.mission_data,
+                    {name: X[outside, i] for i, name in enumerate(self.names)},
+                    Aircraft.Payload.Wcrew.value,
+                    Aircraft.Payload.Wpayload.value,
+                )
+                for j, name in enumerate(self.outputs):
+                    Y[outside, j] = solved[name]
+        return {name: Y[:, j] for j, name in enumerate(self.outputs)}
+
+    def save(self, path):
+        """Saves the model in a compressed .npz file."""
+        np.savez_compressed(
+            path,
+            names=np.array(self.names),
+            low=self.low,
+            high=self.high,
+            kind=np.array(self.kind),
+            degree=np.array(self.degree),
+            outputs=np.array(self.outputs),
+            coefficients=self.coefficients,
+            centers=self.centers,
+            cross_validation=np.array(json.dumps(self.cross_validation)),
+            mission_data=np.array(json.dumps(self.mission_data)),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                [str(name) for name in data["names"]],
+                data["low"],
+                data["high"],
+                str(data["kind"]),
+                int(data["degree"]),
+                [str(name) for name in data["outputs"]],
+                data["coefficients"],
+                centers=data["centers"],
+                cross_validation=json.loads(str(data["cross_validation"])),
+                mission_data=json.loads(str(data["mission_data"])),
+            )
+
+
+def cross_validate(X, Y, names, outputs=OUTPUTS, folds=5, seed=None, **fit_options) -> dict:
+    """
+    Estimates the prediction error of a surrogate model by k-fold cross-validation.
+    Parameters:
+    X, Y, names, outputs: See `ResponseSurface.fit`.
+    folds (int, optional): Number of folds. Defaults to 5.
+    seed (int, optional): Seed of the split in folds. Defaults to None.
+    fit_options: Options of `ResponseSurface.fit`.
+    Returns:
+    dict: {output name: {"rmse", "max_error", "relative_rmse"}}, the relative error being divided
+          by the mean absolute value of the output.
+    """
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float).reshape(len(X), -1)
+    order = np.random.default_rng(seed).permutation(len(X))
+    errors = np.empty_like(Y)
+    for fold in np.array_split(order, folds):
+        train_rows = np.setdiff1d(order, fold)
+        model = ResponseSurface.fit(
+            X[train_rows],
+            Y[train_rows],
+            names,
+            outputs,
+            low=np.min(X, axis=0),
+            high=np.max(X, axis=0),
+            **fit_options,
+        )
+        predicted = model.predict(X[fold])
+        errors[fold] = np.column_stack([predicted[name] for name in outputs]) - Y[fold]
+    report = {}
+    for j, name in enumerate(outputs):
+        rmse = float(np.sqrt(np.mean(errors[:, j] ** 2)))
+        report[name] = {
+            "rmse": rmse,
+            "max_error": float(np.max(np.abs(errors[:, j]))),
+            "relative_rmse": rmse / float(np.mean(np.abs(Y[:, j]))),
+        }
+    return report
+
+
+def train(
+    mission_data: dict,
+    bounds: dict,
+    n_points=1000,
+    kind="polynomial",
+    degree=3,
+    smoothing=0.0,
+    design="lhs",
+    folds=5,
+    processes=1,
+    checkpoint=None,
+    seed=None,
+) -> ResponseSurface:
+    """
+    Sizes the aircraft on a space-filling design (`Sizing.sweep.doe`) and fits a surrogate model on
+    the converged points, with its cross-validated error.
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `Data_formating.load_mission_data`.
+    bounds (dict): {input name: (low, high)}, the training box.
+    n_points (int, optional): Number of training points. Defaults to 1000.
+    kind, degree, smoothing: See `ResponseSurface.fit`.
+    design, processes, checkpoint, seed: See `Sizing.sweep.doe.run_doe`.
+    folds (int, optional): Number of folds of the cross-validation. Defaults to 5.
+    Returns:
+    ResponseSurface: Fitted model.
+    """
+    names = list(bounds.keys())
+    check_inputs(df.build_mission(mission_data), names)
+    doe = run_doe(
+        mission_data,
+        bounds,
+        n_points,
+        design=design,
+        processes=processes,
+        checkpoint=checkpoint,
+        seed=seed,
+    )
+    converged = doe.outputs["converged"]
+    X = np.column_stack([doe.samples[name][converged] for name in names])
+    Y = np.column_stack([doe.outputs[name][converged] for name in OUTPUTS])
+    options = {"kind": kind, "degree": degree, "smoothing": smoothing}
+    errors = cross_validate(X, Y, names, OUTPUTS, folds, seed, **options)
+    low = np.array([b[0] for b in bounds.values()], dtype=float)
+    high = np.array([b[1] for b in bounds.values()], dtype=float)
+    model = ResponseSurface.fit(
+        X, Y, names, OUTPUTS, low=low, high=high, mission_data=mission_data, **options
+    )
+    model.cross_validation = errors
+    return model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Surrogate model of the sizing loop")
+    parser.add_argument("bounds", help="JSON file {input name: [low, high]}")
+    parser.add_argument("--mission", default="Mission_Profile.json")
+    parser.add_argument("--points", type=int, default=1000)
+    parser.add_argument("--kind", choices=KINDS, default="polynomial")
+    parser.add_argument("--degree", type=int, default=3)
+    parser.add_argument("--smoothing", type=float, default=0.0)
+    parser.add_argument("--design", choices=DESIGNS, default="lhs")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--checkpoint", help="Checkpoint directory of the DOE")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default="surrogate.npz")
+    args = parser.parse_args(argv)
+
+    with open(args.bounds, "r") as file:
+        bounds = json.load(file)
+    mission_file = os.path.join(
+        os.path.dirname(__file__), "..", "..", "Inputs", args.mission
+    )
+    model = train(
+        df.load_mission_data(os.path.normpath(mission_file)),
+        bounds,
+        n_points=args.points,
+        kind=args.kind,
+        degree=args.degree,
+        smoothing=args.smoothing,
+        design=args.design,
+        folds=args.folds,
+        processes=args.processes,
+        checkpoint=args.checkpoint,
+        seed=args.seed,
+    )
+    model.save(args.output)
+    print(json.dumps({"cross_validation": model.cross_validation}, indent=4))
+    ## Query time of the saved model
+    X = model.low + np.random.default_rng(0).random((100000, len(model.names))) * (
+        model.high - model.low
+    )
+    start = time.perf_counter()
+    ResponseSurface.load(args.output).predict(X)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Saved to {args.output} ({os.path.getsize(args.output) / 1024:.1f} kB), "
+        f"{1e6 * elapsed / len(X):.2f} us per query"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import Data_formating as df
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.results.cache import case_key
+from Sizing.results.store import ResultStore, monte_carlo_batch
+from Sizing.uncertainty.monte_carlo import (
+    OUTPUTS,
+    MonteCarloResults,
+    check_inputs,
+    solve_batch,
+)
+
+"""
+This module generates space-filling designs of experiments (DOE) and sizes the aircraft on every
+point, e.g. to train surrogate models.
+The inputs are the ones of `Sizing.uncertainty.monte_carlo` (K1, K2, kTSFC, kWE, AR, Npax and the
+phase fields "<phase_number>.<field>"), each varied between two bounds:
+    {"K1": [0.05, 0.06], "7.range": [2000, 3500], "7.Mach": [0.72, 0.8]}
+Designs:
+    - "lhs": Latin hypercube (scipy.stats.qmc.LatinHypercube),
+    - "sobol": scrambled Sobol sequence (balanced when the number of points is a power of 2).
+The points are split in chunks, each chunk being solved at once by the vectorized solver
+(`monte_carlo.solve_batch`). The chunks are dispatched to a process pool whose workers write their
+outputs straight into an array in shared memory (`multiprocessing.shared_memory`): only the bounds
+of the chunk go back to the parent, which saves the finished rows as a checkpoint.
+With a checkpoint directory, the design and every completed chunk are saved, so an interrupted DOE
+resumes where it stopped when it is run again with the same directory and settings (a checkpoint
+of another mission, bounds, design, seed, number of points, chunk size or solver settings is
+rejected with a ValueError).
+Usage:
+    python -m Sizing.sweep.doe bounds.json --design lhs --points 100000 --processes 8 --checkpoint doe_run
+Functions:
+    lhs_design(bounds, n, seed) -> np.ndarray:
+        Latin hypercube design.
+    sobol_design(bounds, n, seed) -> np.ndarray:
+        Scrambled Sobol design.
+    run_doe(mission_data, bounds, n_points, ...) -> MonteCarloResults:
+        Builds the design (or loads it from the checkpoint) and solves it.
+"""
+
+DESIGNS = ("lhs", "sobol")
+## Columns of the shared result array: the outputs and the convergence flag
+COLUMNS = OUTPUTS + ("converged",)
+
+
+def _scale(unit_points, bounds: dict):
+    low = np.array([b[0] for b in bounds.values()], dtype=float)
+    high = np.array([b[1] for b in bounds.values()], dtype=float)
+    return low + unit_points * (high - low)
+
+
+def lhs_design(bounds: dict, n, seed=None) -> np.ndarray:
+    """
+    Latin hypercube design: each input is split in n intervals of equal probability, with one
+    point per interval.
+    Returns:
+    np.ndarray: Points of shape (n, d), in the order of bounds.
+    """
+    from scipy.stats import qmc
+
+    return _scale(qmc.LatinHypercube(len(bounds), seed=seed).random(n), bounds)
+
+
+def sobol_design(bounds: dict, n, seed=None) -> np.ndarray:
+    """
+    Scrambled Sobol design.
+    Returns:
+    np.ndarray: Points of shape (n, d), in the order of bounds.
+    """
+    from scipy.stats import qmc
+
+    return _scale(qmc.Sobol(len(bounds), scramble=True, seed=seed).random(n), bounds)
+
+
+### Worker side: the shared arrays are attached once per process
+_worker = {}
+
+
+def _init_worker(points_name, results_name, n, d, mission_data, names, settings):
+    from multiprocessing import shared_memory
+
+    points_memory = shared_memory.SharedMemory(name=points_name)
+    results_memory = shared_memory.SharedMemory(name=results_name)
+    _worker.update(
+        points_memory=points_memory,
+        results_memory=results_memory,
+        points=np.ndarray((n, d), dtype=float, buffer=points_memory.buf),
+        results=np.ndarray((n, len(COLUMNS)), dtype=float, buffer=results_memory.buf),
+        mission_data=mission_data,
+        names=names,
+        settings=settings,
+    )
+
+
+def _solve_chunk(bounds):
+    """Solves the points [start, stop) and writes their outputs in the shared result array."""
+    start, stop = bounds
+    points = _worker["points"][start:stop]
+    outputs = solve_batch(
+        _worker["mission_data"],
+        {name: points[:, i] for i, name in enumerate(_worker["names"])},
+        Aircraft.Payload.Wcrew.value,
+        Aircraft.Payload.Wpayload.value,
+        **_worker["settings"],
+    )
+    results = _worker["results"]
+    for j, name in enumerate(COLUMNS):
+        results[start:stop, j] = outputs[name]
+    return bounds
+
+
+def _chunk_path(checkpoint, start):
+    return os.path.join(checkpoint, f"chunk_{start:09d}.npy")
+
+
+def _load_design(checkpoint, names, points, settings: dict):
+    """
+    Returns the design saved in the checkpoint directory, or saves the new one with its settings
+    (bounds, design, seed, n_points, chunk_size, solver settings and hash of the sizing case: the
+    chunk results depend on all of them).
+    Raises a ValueError if the checkpoint holds a design of other inputs or settings.
+    """
+    path = os.path.join(checkpoint, "design.npz")
+    if os.path.exists(path):
+        with np.load(path) as data:
+            saved_names = [str(name) for name in data["names"]]
+            if saved_names != list(names):
+                raise ValueError(
+                    f"The checkpoint {checkpoint!r} holds a design of {saved_names}, not {list(names)}"
+                )
+            if "settings" not in data:
+                raise ValueError(
+                    f"The checkpoint {checkpoint!r} has no saved settings, it cannot be resumed"
+                )
+            saved_settings = json.loads(str(data["settings"]))
+            changed = [
+                key for key in settings if saved_settings.get(key) != settings[key]
+            ]
+            if changed:
+                raise ValueError(
+                    f"The checkpoint {checkpoint!r} holds a design with other settings: "
+                    + ", ".join(
+                        f"{key} {saved_settings.get(key)} instead of {settings[key]}"
+                        for key in changed
+                    )
+                )
+            return data["points"]
+    os.makedirs(checkpoint, exist_ok=True)
+    np.savez(
+        path, names=np.array(names), points=points, settings=np.array(json.dumps(settings))
+    )
+    return points
+
+
+def run_doe(
+    mission_data: dict,
+    bounds: dict,
+    n_points,
+    design="lhs",
+    chunk_size=5000,
+    processes=1,
+    checkpoint=None,
+    seed=None,
+    max_iteration=20,
+    tolerance=0.001,
+    verbose=False,
+) -> MonteCarloResults:
+    """
+    Builds a space-filling design and sizes the aircraft on every point.
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `Data_formating.load_mission_data`.
+    bounds (dict): {input name: (low, high)}.
+    n_points (int): Number of points of the design.
+    design (str, optional): "lhs" or "sobol". Defaults to "lhs".
+    chunk_size (int, optional): Number of points solved at once by a worker. Defaults to 5000.
+    processes (int, optional): Number of worker processes. Defaults to 1.
+    checkpoint (str, optional): Directory of the checkpoint. If it holds a design of the same
+                                inputs and settings (mission, bounds, design, seed, n_points,
+                                chunk_size, max_iteration, tolerance),
+                                this design is solved and its completed chunks are loaded instead
+                                of being solved again. Defaults to None (no checkpoint).
+    seed (int, optional): Seed of the design. Defaults to None.
+    max_iteration, tolerance: See `Beta_loop.main_loop`.
+    verbose (bool, optional): Print the progress of the chunks. Defaults to False.
+    Returns:
+    MonteCarloResults: Points of the design ("samples") and outputs, as the Monte Carlo results.
+    Raises:
+    ValueError: If the design or an input is unknown, or the checkpoint holds a design of other
+                inputs or settings.
+    """
+    from multiprocessing import Pool, shared_memory
+
+    if design not in DESIGNS:
+        raise ValueError(f"Unknown design {design!r}, must be one of {DESIGNS}")
+    names = list(bounds.keys())
+    Mission = df.build_mission(mission_data)
+    check_inputs(Mission, names)
+    points = (lhs_design if design == "lhs" else sobol_design)(bounds, n_points, seed)
+    if checkpoint is not None:
+        settings = {
+            "bounds": {name: [float(b) for b in bounds[name]] for name in names},
+            "design": design,
+            "seed": seed,
+            "n_points": n_points,
+            "chunk_size": chunk_size,
+            "max_iteration": max_iteration,
+            "tolerance": tolerance,
+            ## Hash of the normalized mission, nominal inputs and solver settings
+            "case": case_key(
+                Mission,
+                Aircraft.Payload.Wcrew.value,
+                Aircraft.Payload.Wpayload.value,
+                max_iteration,
+                tolerance,
+            ),
+        }
+        points = _load_design(checkpoint, names, points, settings)
+    n, d = points.shape
+    chunks = [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+
+    points_memory = shared_memory.SharedMemory(create=True, size=max(points.nbytes, 1))
+    results_memory = shared_memory.SharedMemory(
+        create=True, size=max(n * len(COLUMNS) * 8, 1)
+    )
+    try:
+        shared_points = np.ndarray((n, d), dtype=float, buffer=points_memory.buf)
+        shared_points[:] = points
+        results = np.ndarray((n, len(COLUMNS)), dtype=float, buffer=results_memory.buf)
+        results[:] = np.nan
+
+        ## Completed chunks of the checkpoint
+        remaining = []
+        for start, stop in chunks:
+            path = None if checkpoint is None else _chunk_path(checkpoint, start)
+            if path is not None and os.path.exists(path):
+                results[start:stop] = np.load(path)
+            else:
+                remaining.append((start, stop))
+        if verbose and len(remaining) < len(chunks):
+            print(f"Resuming: {len(chunks) - len(remaining)}/{len(chunks)} chunks done")
+
+        initargs = (
+            points_memory.name,
+            results_memory.name,
+            n,
+            d,
+            mission_data,
+            names,
+            {"max_iteration": max_iteration, "tolerance": tolerance},
+        )
+        start_time = time.perf_counter()
+        if processes > 1 and len(remaining) > 1:
+            pool = Pool(processes, initializer=_init_worker, initargs=initargs)
+            solved = pool.imap_unordered(_solve_chunk, remaining)
+        else:
+            pool = None
+            _init_worker(*initargs)
+            solved = map(_solve_chunk, remaining)
+        try:
+            for done, (start, stop) in enumerate(solved, 1):
+                if checkpoint is not None:
+                    tmp_path = _chunk_path(checkpoint, start) + ".tmp.npy"
+                    np.save(tmp_path, results[start:stop])
+                    os.replace(tmp_path, _chunk_path(checkpoint, start))
+                if verbose:
+                    print(
+                        f"Chunk {done}/{len(remaining)} ({stop - start} points), "
+                        f"{time.perf_counter() - start_time:.1f} s"
+                    )
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            else:
+                _worker.clear()
+
+        outputs = {name: results[:, j].copy() for j, name in enumerate(COLUMNS)}
+        outputs["converged"] = outputs["converged"] == 1
+        samples = {name: shared_points[:, i].copy() for i, name in enumerate(names)}
+    finally:
+        points_memory.close()
+        points_memory.unlink()
+        results_memory.close()
+        results_memory.unlink()
+    return MonteCarloResults(samples, outputs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Design of experiments")
+    parser.add_argument("bounds", help="JSON file {input name: [low, high]}")
+    parser.add_argument("--mission", default="Mission_Profile.json")
+    parser.add_argument("--design", choices=DESIGNS, default="lhs")
+    parser.add_argument("--points", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--checkpoint", help="Checkpoint directory, to resume a DOE")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Save the points and outputs to a .npz file")
+    parser.add_argument(
+        "--store", help="Append the results to a result store (.nc, .h5 or directory)"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.bounds, "r") as file:
+        bounds = json.load(file)
+    mission_file = os.path.join(
+        os.path.dirname(__file__), "..", "..", "Inputs", args.mission
+    )
+    results = run_doe(
+        df.load_mission_data(os.path.normpath(mission_file)),
+        bounds,
+        args.points,
+        design=args.design,
+        chunk_size=args.chunk_size,
+        processes=args.processes,
+        checkpoint=args.checkpoint,
+        seed=args.seed,
+        verbose=True,
+    )
+    print(json.dumps(results.summary(), indent=4))
+    if args.output:
+        results.save(args.output)
+    if args.store:
+        with ResultStore(args.store) as store:
+            store.append(monte_carlo_batch(results))
+
+
+if __name__ == "__main__":
+    main()
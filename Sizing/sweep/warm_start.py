@@ -0,0 +1,238 @@
+import numpy as np
+import Beta_loop as bl
+import Data_formating as df
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.MissionProfile.segments import segments
+from Sizing.utils.feasibility import InfeasibleDesign
+from typing import List
+
+"""
+This module runs parametric sweeps of the sizing loop with continuation (warm start).
+Neighbouring points of a sweep have nearly identical solutions, so instead of starting every
+`main_loop` call from the default guesses (WTO=10000, WSR=110, TWR=0.3), each point starts from
+the converged WSR, TWR and WTO of the nearest point already solved. The weight fractions are not
+seeded: the mission analysis recomputes the whole beta chain from the WSR/TWR guesses on the
+first iteration, so the solved beta chain of a neighbour would be overwritten before being read.
+The points are visited along a Hilbert curve so that consecutive points are close to each other.
+Classes:
+    WarmStart:
+        Stores the solved points of a sweep and finds the nearest one to a new point.
+Functions:
+    hilbert_index(coords, bits) -> int:
+        Position of integer coordinates along the Hilbert curve.
+    sweep_order(points, bits=10) -> List[int]:
+        Order in which to visit the points so that consecutive points are neighbours.
+    seed_mission(Mission, betas):
+        Sets the weight fractions of the segments from a converged beta chain (e.g. to restore
+        cached results).
+    run_sweep(mission_data, points, ...) -> List[tuple]:
+        Runs the sizing loop on every point of a sweep with warm start.
+With skip_infeasible=True, an infeasible point stops at the first failed feasibility check (see
+`Sizing.utils.feasibility`) and its result is the error, so feasibility maps are cheap:
+    reasons = [getattr(r, "reason", "feasible") for r in run_sweep(data, points, skip_infeasible=True)]
+"""
+
+
+def hilbert_index(coords, bits):
+    """
+    Computes the position of a point along the Hilbert curve (Skilling's algorithm).
+    Parameters:
+    coords (List[int]): Integer coordinates of the point, each between 0 and 2**bits - 1.
+    bits (int): Number of bits used for each coordinate.
+    Returns:
+    int: Index of the point along the Hilbert curve.
+    """
+    X = [int(c) for c in coords]
+    n = len(X)
+    M = 1 << (bits - 1)
+    # Inverse undo
+    Q = M
+    while Q > 1:
+        P = Q - 1
+        for i in range(n):
+            if X[i] & Q:
+                X[0] ^= P
+            else:
+                t = (X[0] ^ X[i]) & P
+                X[0] ^= t
+                X[i] ^= t
+        Q >>= 1
+    # Gray encode
+    for i in range(1, n):
+        X[i] ^= X[i - 1]
+    t = 0
+    Q = M
+    while Q > 1:
+        if X[n - 1] & Q:
+            t ^= Q - 1
+        Q >>= 1
+    for i in range(n):
+        X[i] ^= t
+    # Interleave the bits of the transposed coordinates
+    index = 0
+    for b in range(bits - 1, -1, -1):
+        for i in range(n):
+            index = (index << 1) | ((X[i] >> b) & 1)
+    return index
+
+
+def sweep_order(points, bits=10):
+    """
+    Computes the order in which the points of a sweep should be solved, so that consecutive
+    points are close to each other (ordering along a Hilbert curve).
+    Parameters:
+    points (array-like): Coordinates of the points, shape (number of points, number of parameters).
+    bits (int, optional): Resolution of the curve in each direction. Defaults to 10.
+    Returns:
+    List[int]: Indices of the points in the visiting order.
+    """
+    points = np.asarray(points, dtype=float)
+    if points.ndim == 1:
+        points = points[:, None]
+    if points.shape[1] == 1:
+        return [int(i) for i in np.argsort(points[:, 0], kind="stable")]
+    low = points.min(axis=0)
+    span = points.max(axis=0) - low
+    span[span == 0] = 1
+    grid = np.round((points - low) / span * (2**bits - 1)).astype(int)
+    keys = [hilbert_index(coords, bits) for coords in grid]
+    return [int(i) for i in np.argsort(keys, kind="stable")]
+
+
+def seed_mission(Mission: List[segments], betas):
+    """
+    Sets the weight fraction at the beginning of each segment from a converged beta chain
+    (the beta at the end of segment i is the beta at the beginning of segment i+1).
+    Parameters:
+    Mission (List[segments]): Mission segments to seed, modified in place.
+    betas (List[float]): Weight fractions at the end of each segment of a converged mission.
+    """
+    for i in range(len(Mission) - 1):
+        Mission[i + 1].weight_fraction.value = float(betas[i])
+
+
+class WarmStart:
+    """
+    Stores the converged solutions of the points already solved in a sweep.
+    Attributes:
+        coordinates (List[np.ndarray]): Normalized coordinates of the solved points.
+        results (List[tuple]): `main_loop` results of the solved points.
+        scale (np.ndarray): Scale used to normalize each parameter, so distances are comparable.
+    """
+
+    def __init__(self, scale=None):
+        self.coordinates = []
+        self.results = []
+        self.scale = None if scale is None else np.asarray(scale, dtype=float)
+
+    def add(self, coords, results):
+        self.coordinates.append(self._normalize(coords))
+        self.results.append(results)
+
+    def nearest(self, coords):
+        """
+        Returns the `main_loop` results of the solved point closest to coords, None if
+        no point has been solved yet.
+        """
+        if not self.results:
+            return None
+        distances = np.linalg.norm(
+            np.array(self.coordinates) - self._normalize(coords), axis=1
+        )
+        return self.results[int(np.argmin(distances))]
+
+    def guesses(self, coords, default_guesses: dict) -> dict:
+        """
+        Returns the initial guesses (guess_WTO, WSR_guess, TWR_guess) to give to `main_loop`,
+        from the solution of the nearest solved point.
+        """
+        results = self.nearest(coords)
+        if results is None:
+            return dict(default_guesses)
+        WTO, WSR, TWR = results[:3]
+        return {
+            "guess_WTO": float(WTO),
+            "WSR_guess": float(WSR),
+            "TWR_guess": float(TWR),
+        }
+
+    def _normalize(self, coords):
+        coords = np.atleast_1d(np.asarray(coords, dtype=float))
+        if self.scale is None:
+            return coords
+        return coords / self.scale
+
+
+def run_sweep(
+    mission_data: dict,
+    points: List[dict],
+    max_iteration=20,
+    tolerance=0.001,
+    guess_WTO=10000,
+    WSR_guess=110,
+    TWR_guess=0.3,
+    warm_start=True,
+    order=True,
+    cache=None,
+    skip_infeasible=False,
+):
+    """
+    Runs the sizing loop on every point of a sweep.
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `Data_formating.load_mission_data`.
+    points (List[dict]): Mission overrides for each point, e.g. [{"7.range": 2500}, ...].
+                         All the points must override the same fields.
+    max_iteration (int, optional): Maximum number of iterations of the loops. Defaults to 20.
+    tolerance (float, optional): Convergence tolerance for WSR and TWR. Defaults to 0.001.
+    guess_WTO, WSR_guess, TWR_guess (float, optional): Initial guesses of the first point.
+    warm_start (bool, optional): If True, each point starts from the nearest solved point. Defaults to True.
+    order (bool, optional): If True, the points are solved along a Hilbert curve. Defaults to True.
+    cache (ResultCache or RunCatalog, optional): If given, points already solved in a previous run
+                                                 are read from this cache or catalog instead of
+                                                 being solved (see `Sizing.results.cache` and
+                                                 `Sizing.results.catalog`). Defaults to None.
+    skip_infeasible (bool, optional): If True, the result of an infeasible point is its
+                                      InfeasibleDesign error and the sweep goes on. Defaults to
+                                      False (the error is raised).
+    Returns:
+    List[tuple]: `main_loop` results for each point, in the order of `points`.
+    """
+    if len(points) == 0:
+        return []
+    keys = list(points[0].keys())
+    coords = np.array([[float(point[key]) for key in keys] for point in points])
+    if coords.size == 0:
+        coords = np.zeros((len(points), 1))
+    scale = np.ptp(coords, axis=0)
+    scale[scale == 0] = 1
+    visit = sweep_order(coords) if order else list(range(len(points)))
+    default_guesses = {
+        "guess_WTO": guess_WTO,
+        "WSR_guess": WSR_guess,
+        "TWR_guess": TWR_guess,
+    }
+    warm = WarmStart(scale)
+    results = [None] * len(points)
+    for index in visit:
+        Mission = df.build_mission(mission_data, points[index])
+        if warm_start:
+            guesses = warm.guesses(coords[index], default_guesses)
+        else:
+            guesses = default_guesses
+        run = bl.main_loop if cache is None else cache.main_loop
+        try:
+            results[index] = run(
+                Mission=Mission,
+                WC=Aircraft.Payload.Wcrew.value,
+                WP=Aircraft.Payload.Wpayload.value,
+                max_iteration=max_iteration,
+                tolerance=tolerance,
+                **guesses,
+            )
+        except InfeasibleDesign as error:
+            if not skip_infeasible:
+                raise
+            results[index] = error
+            continue
+        warm.add(coords[index], results[index])
+    return results
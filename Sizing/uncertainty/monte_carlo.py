@@ -0,0 +1,545 @@
+import argparse
+import json
+import os
+import numpy as np
+import Beta_loop as bl
+import Data_formating as df
+import Sizing.aerodynamics.Assumptions as aerodynamics
+import Sizing.constraint_analysis.Additional_Constraints as Additional_Constraints
+from Sizing.Mission_analysis.Main_Mission_Parametric import Compute_Beta_Segment
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.results.store import ResultStore, monte_carlo_batch
+from Sizing.utils import atmosphere, dual
+from Sizing.MissionProfile.segments import segments
+from typing import List
+
+"""
+This module propagates the uncertainty of the model coefficients to the sized aircraft (Monte Carlo).
+The coefficients K1, K2 (Inputs/aerodynamics.json), kTSFC (Inputs/propulsion.json), kWE
+(Inputs/structural.json), the wing aspect ratio AR (through K1), the number of passengers Npax
+(through the payload weight) and optionally some segment parameters ("<phase_number>.<field>", e.g.
+"7.range") are sampled from user-given distributions.
+The samples are not solved one by one: a batch of samples is solved at once by broadcasting the
+sample axis through the segment physics. The coefficients and the sampled segment parameters are
+set to column arrays of shape (n, 1), so the mission analysis computes n beta chains at once and the
+constraint analysis n envelopes of shape (n, 700). The atmosphere model, which dominates the run
+time, is evaluated once per altitude for the whole batch (see `atmosphere.cached`), so its cost does
+not depend on the number of samples. The Beta and WTO loops converge sample by sample: converged
+samples are removed from the batch, as in `Beta_loop.main_loop`.
+Batches can also be spread over a process pool.
+Distributions are given as a dictionary (or a JSON file):
+    {
+        "K1": {"distribution": "normal", "mean": 0.04, "std": 0.002},
+        "kTSFC": {"distribution": "uniform", "low": 0.95, "high": 1.05},
+        "7.range": {"distribution": "triangular", "low": 2800, "mode": 3000, "high": 3300}
+    }
+Supported distributions: normal (mean, std), uniform (low, high), triangular (low, mode, high),
+lognormal (mean, sigma of the underlying normal distribution).
+Usage:
+    python -m Sizing.uncertainty.monte_carlo distributions.json --samples 10000
+Classes:
+    MonteCarloResults:
+        Samples, outputs (WTO, fuel weight, WSR, TWR, Beta_final) and their statistics.
+Functions:
+    sample(distributions, n_samples, rng) -> dict:
+        Draws the samples of each uncertain input.
+    solve_batch(mission_data, values, ...) -> dict:
+        Sizes the aircraft for a batch of samples at once.
+    run_monte_carlo(mission_data, distributions, n_samples, ...) -> MonteCarloResults:
+        Samples the inputs and solves them by batches.
+"""
+
+COEFFICIENTS = ("K1", "K2", "kTSFC", "kWE", "AR", "Npax")
+## Fields that define the discretization or the nature of a segment, they cannot be sampled
+NON_SAMPLED_FIELDS = (
+    "name",
+    "phase_number",
+    "weight_fraction",
+    "start_altitude",
+    "end_altitude",
+    "KEAS_start",
+    "KEAS_end",
+    "climb_rate",
+    "flight_path_angle",
+)
+OUTPUTS = ("WTO", "fuel_weight", "WSR", "TWR", "Beta_final")
+
+
+def sample(distributions: dict, n_samples, rng=None) -> dict:
+    """
+    Draws n_samples values of each uncertain input.
+    Parameters:
+    distributions (dict): {input name: {"distribution": ..., parameters}}, see the module docstring.
+    n_samples (int): Number of samples.
+    rng (np.random.Generator, optional): Random generator. Defaults to np.random.default_rng().
+    Returns:
+    dict: {input name: array of shape (n_samples,)}.
+    Raises:
+    ValueError: If a distribution is unknown.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    samples = {}
+    for name, spec in distributions.items():
+        match spec["distribution"]:
+            case "normal":
+                values = rng.normal(spec["mean"], spec["std"], n_samples)
+            case "uniform":
+                values = rng.uniform(spec["low"], spec["high"], n_samples)
+            case "triangular":
+                values = rng.triangular(
+                    spec["low"], spec["mode"], spec["high"], n_samples
+                )
+            case "lognormal":
+                values = rng.lognormal(spec["mean"], spec["sigma"], n_samples)
+            case _:
+                raise ValueError(
+                    f"Unknown distribution {spec['distribution']!r} for {name}"
+                )
+        samples[name] = values
+    return samples
+
+
+def _segments_by_phase(Mission: List[segments]) -> dict:
+    return {str(segment.phase_number): segment for segment in Mission}
+
+
+def check_inputs(Mission: List[segments], names):
+    """
+    Raises a ValueError if an input name is neither a coefficient nor a sampled segment field.
+    """
+    phases = _segments_by_phase(Mission)
+    for name in names:
+        if name in COEFFICIENTS:
+            continue
+        phase_number, _, field = name.partition(".")
+        if phase_number not in phases or not hasattr(phases[phase_number], field):
+            raise ValueError(
+                f"Unknown input {name!r}, expected one of {COEFFICIENTS} "
+                f"or '<phase_number>.<field>'"
+            )
+        if field in NON_SAMPLED_FIELDS:
+            raise ValueError(f"The field {field!r} of {name!r} cannot be sampled")
+
+
+def input_values(Mission: List[segments], names) -> dict:
+    """Returns the current values of the inputs (coefficients and segment fields)."""
+    coefficients = {
+        "K1": aerodynamics.K1,
+        "K2": aerodynamics.K2,
+        "kTSFC": Aircraft.Propulsion.ktsfc.value,
+        "kWE": Aircraft.Structure.KWE.value,
+        "AR": Aircraft.Geometry.Wing.Aspect_Ratio.value,
+        "Npax": Aircraft.Payload.Npax.value,
+    }
+    phases = _segments_by_phase(Mission)
+    values = {}
+    for name in names:
+        if name in coefficients:
+            values[name] = float(coefficients[name])
+        else:
+            phase_number, _, field = name.partition(".")
+            values[name] = float(getattr(phases[phase_number], field).value)
+    return values
+
+
+class AppliedInputs:
+    """
+    Context manager setting the coefficients and the segment fields of Mission to the given
+    values, and restoring the coefficients on exit.
+    With column=True, the values are arrays of samples, set as column arrays of shape (n, 1);
+    otherwise they are scalars (floats or dual numbers).
+    The aspect ratio "AR" only enters the physics through the induced drag: K1 = 1 / (pi e AR), so
+    K1 is scaled by the ratio of the nominal aspect ratio to the new one.
+    The number of passengers "Npax" sets the payload weight Wpayload.
+    """
+
+    def __init__(self, Mission: List[segments], values: dict, column=True):
+        self.Mission = Mission
+        self.values = values
+        self.column = column
+
+    def __enter__(self):
+        self.saved = (
+            aerodynamics.K1,
+            aerodynamics.K2,
+            Aircraft.Propulsion.ktsfc.value,
+            Aircraft.Structure.KWE.value,
+            Aircraft.Geometry.Wing.Aspect_Ratio.value,
+            Aircraft.Payload.Npax.value,
+            Aircraft.Payload.Wpayload.value,
+        )
+        if self.column:
+            columns = {name: np.asarray(v)[:, None] for name, v in self.values.items()}
+        else:
+            columns = {
+                name: v if isinstance(v, dual.Dual) else float(v)
+                for name, v in self.values.items()
+            }
+        if "K1" in columns:
+            aerodynamics.K1 = columns["K1"]
+        if "K2" in columns:
+            aerodynamics.K2 = columns["K2"]
+        if "kTSFC" in columns:
+            Aircraft.Propulsion.ktsfc.value = columns["kTSFC"]
+        if "kWE" in columns:
+            Aircraft.Structure.KWE.value = columns["kWE"]
+        if "AR" in columns:
+            aerodynamics.K1 = aerodynamics.K1 * (
+                Aircraft.Geometry.Wing.Aspect_Ratio.value / columns["AR"]
+            )
+            Aircraft.Geometry.Wing.Aspect_Ratio.value = columns["AR"]
+        if "Npax" in columns:
+            Aircraft.Payload.Npax.value = columns["Npax"]
+            Aircraft.Payload.Wpayload.value = columns["Npax"] * (
+                Aircraft.Payload.Pax_weight.value + Aircraft.Payload.Baggage_weight.value
+            )
+        phases = _segments_by_phase(self.Mission)
+        for name, column in columns.items():
+            if name not in COEFFICIENTS:
+                phase_number, _, field = name.partition(".")
+                getattr(phases[phase_number], field).value = column
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        (
+            aerodynamics.K1,
+            aerodynamics.K2,
+            Aircraft.Propulsion.ktsfc.value,
+            Aircraft.Structure.KWE.value,
+            Aircraft.Geometry.Wing.Aspect_Ratio.value,
+            Aircraft.Payload.Npax.value,
+            Aircraft.Payload.Wpayload.value,
+        ) = self.saved
+        return False
+
+
+def mission_betas(WSR, TWR, Mission: List[segments]) -> list:
+    """
+    Vectorized `Compute_Mission_Profile_Parametric`: WSR, TWR and the sampled inputs are column
+    arrays, the betas are returned as arrays instead of floats.
+    """
+    Betas_list = []
+    for i, segment in enumerate(Mission):
+        Beta = Compute_Beta_Segment(WSR, TWR, segment)
+        Betas_list.append(Beta)
+        if i != len(Mission) - 1:
+            Mission[i + 1].weight_fraction.value = Beta
+    return Betas_list
+
+
+def design_point(Mission: List[segments], n):
+    """
+    Vectorized design point of `constraint_analysis_main`, for the weight fractions stored in the
+    segments. Only the envelope of the constraints is kept in memory.
+    Returns:
+    tuple: (wing loading, thrust-to-weight ratio) of the design point of each sample, shape (n,).
+    """
+    wing_min = 30
+    wing_max = 170
+    num_points = 700
+    wing_loading = np.linspace(wing_min, wing_max, num_points)
+    y_max = np.full((n, num_points), -np.inf)
+    for segment in Mission:
+        y_max = np.maximum(y_max, segment.Thrust_Weight_Ratio(wing_loading))
+        if segment.type == "Landing":
+            landing_segment = segment
+        if segment.phase_number == 7:  ## Top of climb = begining of cruise
+            weight_fraction_top_of_climb = segment.weight_fraction.value
+    _, additional = Additional_Constraints.Additional_constraints(
+        [], [], wing_loading, weight_fraction_top_of_climb
+    )
+    for TWR in additional:
+        y_max = np.maximum(y_max, TWR)
+
+    wing_loading_landing = np.broadcast_to(
+        np.asarray(landing_segment.landing_constraint(), dtype=float).reshape(-1), (n,)
+    )
+    min_index = np.argmin(y_max, axis=1)
+    rows = np.arange(n)
+    wing_loading_design = wing_loading[min_index]
+    TWR_design = y_max[rows, min_index]
+    ## Landing constraint more restrictive than the design point
+    landing = wing_loading_design > wing_loading_landing
+    if np.any(landing):
+        landing_index = np.argmax(
+            np.abs(wing_loading[None, :] - wing_loading_landing[landing, None])
+            <= (wing_max - wing_min) / num_points,
+            axis=1,
+        )
+        wing_loading_design = np.where(landing, wing_loading_landing, wing_loading_design)
+        TWR_design[landing] = y_max[rows[landing], landing_index]
+    return wing_loading_design, TWR_design
+
+
+def _column(value, n):
+    return np.broadcast_to(np.asarray(value, dtype=float).reshape(-1, 1), (n, 1)).copy()
+
+
+def solve_batch(
+    mission_data: dict,
+    values: dict,
+    WC,
+    WP,
+    guess_WTO=10000,
+    max_iteration=20,
+    tolerance=0.001,
+    WSR_guess=110,
+    TWR_guess=0.3,
+) -> dict:
+    """
+    Sizes the aircraft for a batch of samples at once (vectorized `Beta_loop.main_loop`).
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `Data_formating.load_mission_data`.
+    values (dict): {input name: array of shape (n,)} values of the uncertain inputs.
+    WC, WP (float): Crew and payload weights (WP is replaced by the sampled payload weights when
+                    Npax is an input).
+    guess_WTO, max_iteration, tolerance, WSR_guess, TWR_guess: See `Beta_loop.main_loop`.
+    Returns:
+    dict: Arrays of shape (n,) for "WTO", "fuel_weight", "WSR", "TWR", "Beta_final" and
+          "converged" (True if both loops converged for the sample).
+    """
+    with atmosphere.cached():
+        return _solve_batch(
+            mission_data,
+            values,
+            WC,
+            WP,
+            guess_WTO,
+            max_iteration,
+            tolerance,
+            WSR_guess,
+            TWR_guess,
+        )
+
+
+def _solve_batch(
+    mission_data,
+    values,
+    WC,
+    WP,
+    guess_WTO,
+    max_iteration,
+    tolerance,
+    WSR_guess,
+    TWR_guess,
+):
+    n = len(next(iter(values.values()))) if values else 1
+    Mission = df.build_mission(mission_data)
+    check_inputs(Mission, values)
+    results = {name: np.full(n, np.nan) for name in OUTPUTS}
+    converged = np.zeros(n, dtype=bool)
+
+    ### Beta loop, the converged samples leave the batch
+    active = np.arange(n)
+    WSR = _column(WSR_guess, n)
+    TWR = _column(TWR_guess, n)
+    for i in range(max_iteration):
+        m = active.size
+        Mission = df.build_mission(mission_data)
+        with AppliedInputs(Mission, {name: v[active] for name, v in values.items()}):
+            betas = mission_betas(WSR, TWR, Mission)
+            WSR_new, TWR_new = design_point(Mission, m)
+        WSR_new = WSR_new.reshape(m, 1)
+        TWR_new = TWR_new.reshape(m, 1)
+        results["WSR"][active] = WSR_new[:, 0]
+        results["TWR"][active] = TWR_new[:, 0]
+        results["Beta_final"][active] = _column(betas[-1], m)[:, 0]
+        done = (
+            (np.abs(WSR_new - WSR) < tolerance) & (np.abs(TWR_new - TWR) < tolerance)
+        )[:, 0]
+        converged[active[done]] = True
+        active = active[~done]
+        WSR = WSR_new[~done]
+        TWR = TWR_new[~done]
+        if active.size == 0:
+            break
+
+    ### WTO loop
+    beta = results["Beta_final"][:, None]
+    active = np.arange(n)
+    WTO_guess = np.full((n, 1), float(guess_WTO))
+    WTO_converged = np.zeros(n, dtype=bool)
+    for i in range(max_iteration):
+        ## Only kWE and the payload weight enter the WTO loop
+        inputs = {name: values[name][active] for name in ("kWE", "Npax") if name in values}
+        with AppliedInputs(Mission, inputs):
+            if "Npax" in values:
+                WP = Aircraft.Payload.Wpayload.value
+            WTO = (WC + WP) / (1 - 1.06 * (1 - beta[active]) - bl.gamma(WTO_guess))
+        results["WTO"][active] = WTO[:, 0]
+        done = (np.abs(WTO - WTO_guess) < 1)[:, 0]
+        WTO_converged[active[done]] = True
+        active = active[~done]
+        WTO_guess = WTO[~done]
+        if active.size == 0:
+            break
+
+    results["fuel_weight"] = 1.06 * (1 - results["Beta_final"]) * results["WTO"]
+    results["converged"] = converged & WTO_converged
+    return results
+
+
+def _solve_batch_worker(args):
+    return solve_batch(*args)
+
+
+class MonteCarloResults:
+    """
+    Results of a Monte Carlo study.
+    Attributes:
+        samples (dict): {input name: array (n,)} sampled inputs.
+        outputs (dict): {output name: array (n,)} WTO, fuel weight, WSR, TWR, Beta_final and
+                        the convergence flag of each sample.
+    """
+
+    def __init__(self, samples: dict, outputs: dict):
+        self.samples = samples
+        self.outputs = outputs
+
+    def percentiles(self, q=(5, 50, 95)) -> dict:
+        """
+        Returns {output name: {percentile: value}} over the converged samples.
+        """
+        mask = self.outputs["converged"]
+        return {
+            name: {
+                p: float(v)
+                for p, v in zip(q, np.percentile(self.outputs[name][mask], q))
+            }
+            for name in OUTPUTS
+        }
+
+    def summary(self, q=(5, 50, 95)) -> dict:
+        mask = self.outputs["converged"]
+        summary = {
+            "samples": int(mask.size),
+            "converged": int(np.count_nonzero(mask)),
+            "outputs": {},
+        }
+        percentiles = self.percentiles(q)
+        for name in OUTPUTS:
+            values = self.outputs[name][mask]
+            summary["outputs"][name] = {
+                "mean": float(np.mean(values)),
+                "std": float(np.std(values)),
+                "percentiles": percentiles[name],
+            }
+        return summary
+
+    def save(self, path):
+        """Saves the samples and the outputs in a compressed .npz file."""
+        np.savez_compressed(
+            path,
+            **{"input/" + name: v for name, v in self.samples.items()},
+            **{"output/" + name: v for name, v in self.outputs.items()},
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            samples = {
+                name[len("input/") :]: data[name]
+                for name in data.files
+                if name.startswith("input/")
+            }
+            outputs = {
+                name[len("output/") :]: data[name]
+                for name in data.files
+                if name.startswith("output/")
+            }
+        return cls(samples, outputs)
+
+
+def run_monte_carlo(
+    mission_data: dict,
+    distributions: dict,
+    n_samples,
+    batch_size=10000,
+    processes=1,
+    seed=None,
+    max_iteration=20,
+    tolerance=0.001,
+) -> MonteCarloResults:
+    """
+    Samples the uncertain inputs and sizes the aircraft for every sample.
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `Data_formating.load_mission_data`.
+    distributions (dict): Distributions of the uncertain inputs, see the module docstring.
+    n_samples (int): Number of samples.
+    batch_size (int, optional): Number of samples solved at once. The memory used by a batch is
+                                about 100 MB per 10000 samples. Defaults to 10000.
+    processes (int, optional): Number of processes solving batches in parallel. Defaults to 1.
+    seed (int, optional): Seed of the random generator. Defaults to None.
+    max_iteration, tolerance: See `Beta_loop.main_loop`.
+    Returns:
+    MonteCarloResults: Samples and outputs.
+    """
+    check_inputs(df.build_mission(mission_data), distributions)
+    samples = sample(distributions, n_samples, np.random.default_rng(seed))
+    if processes > 1:
+        ## At least one batch per process
+        batch_size = min(batch_size, -(-n_samples // processes))
+    starts = range(0, n_samples, batch_size)
+    tasks = [
+        (
+            mission_data,
+            {name: v[start : start + batch_size] for name, v in samples.items()},
+            Aircraft.Payload.Wcrew.value,
+            Aircraft.Payload.Wpayload.value,
+            10000,
+            max_iteration,
+            tolerance,
+        )
+        for start in starts
+    ]
+    if processes > 1:
+        from multiprocessing import Pool
+
+        with Pool(processes) as pool:
+            batches = pool.map(_solve_batch_worker, tasks)
+    else:
+        batches = [_solve_batch_worker(task) for task in tasks]
+    outputs = {
+        name: np.concatenate([batch[name] for batch in batches])
+        for name in OUTPUTS + ("converged",)
+    }
+    return MonteCarloResults(samples, outputs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo on the model coefficients")
+    parser.add_argument("distributions", help="JSON file of the input distributions")
+    parser.add_argument("--mission", default="Mission_Profile.json")
+    parser.add_argument("--samples", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Save the samples and outputs to a .npz file")
+    parser.add_argument(
+        "--store", help="Append the results to a result store (.nc, .h5 or directory)"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.distributions, "r") as file:
+        distributions = json.load(file)
+    mission_file = os.path.join(
+        os.path.dirname(__file__), "..", "..", "Inputs", args.mission
+    )
+    results = run_monte_carlo(
+        df.load_mission_data(os.path.normpath(mission_file)),
+        distributions,
+        args.samples,
+        batch_size=args.batch_size,
+        processes=args.processes,
+        seed=args.seed,
+    )
+    print(json.dumps(results.summary(), indent=4))
+    if args.output:
+        results.save(args.output)
+    if args.store:
+        with ResultStore(args.store) as store:
+            store.append(monte_carlo_batch(results))
+
+
+if __name__ == "__main__":
+    main()
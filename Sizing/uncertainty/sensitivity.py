@@ -0,0 +1,370 @@
+import argparse
+import json
+import os
+import numpy as np
+import Beta_loop as bl
+import Data_formating as df
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.results.cache import DEFAULT_CACHE_DIR, ResultCache
+from Sizing.uncertainty.monte_carlo import AppliedInputs, check_inputs, solve_batch
+from Sizing.utils import atmosphere
+
+"""
+This module ranks the inputs that drive the sized aircraft (global sensitivity analysis).
+The inputs are the coefficients K1, K2, kTSFC, kWE and the fields of the mission phases
+("<phase_number>.<field>", e.g. "7.range"), each varied uniformly between two bounds:
+    {"K1": [0.05, 0.06], "kWE": [1.1, 1.2], "7.range": [2500, 3500]}
+Two methods are available:
+    - "sobol": Saltelli design (matrices A, B and the d matrices A_B^i built from a scrambled Sobol
+      sequence) giving the first-order (S1) and total (ST) Sobol indices of each input, with
+      bootstrap confidence intervals. The design needs n (d + 2) solves, n being a power of 2.
+    - "morris": r one-at-a-time trajectories on a grid of levels, giving the mean of the absolute
+      elementary effects (mu_star) and their standard deviation (sigma). The design needs
+      r (d + 1) solves, so it is used to screen many inputs with few solves.
+The size of the design is chosen so that the number of sizing solves stays within `budget`.
+The points are solved with `Beta_loop.main_loop` (engine "main_loop"), in parallel over a process
+pool and through the results cache (points already solved in a previous study are not solved
+again), or all at once by the vectorized solver of `Sizing.uncertainty.monte_carlo` (engine
+"batch"). The inputs that can be varied are the ones of the Monte Carlo module.
+The indices are computed for the WTO and the fuel weight.
+Usage:
+    python -m Sizing.uncertainty.sensitivity bounds.json --method sobol --budget 500 --processes 4
+Functions:
+    saltelli_design(bounds, n, seed) -> np.ndarray:
+        Points of the Saltelli design.
+    morris_design(bounds, r, levels, seed) -> np.ndarray:
+        Points of the Morris trajectories.
+    evaluate(mission_data, names, points, ...) -> dict:
+        WTO and fuel weight of each point.
+    sobol_indices(outputs, n, d, ...) -> dict:
+        First-order and total Sobol indices with bootstrap confidence intervals.
+    morris_indices(outputs, points, bounds, r) -> dict:
+        Statistics of the elementary effects.
+    run_sensitivity(mission_data, bounds, method, budget, ...) -> dict:
+        Builds the design within the budget, evaluates it and computes the indices.
+"""
+
+METHODS = ("sobol", "morris")
+ENGINES = ("main_loop", "batch")
+OUTPUTS = ("WTO", "fuel_weight")
+
+
+def _scale(unit_points, bounds: dict):
+    low = np.array([b[0] for b in bounds.values()], dtype=float)
+    high = np.array([b[1] for b in bounds.values()], dtype=float)
+    return low + unit_points * (high - low)
+
+
+def saltelli_design(bounds: dict, n, seed=None) -> np.ndarray:
+    """
+    Builds the Saltelli design: the n rows of A, the n rows of B, then for each input i the n
+    rows of A_B^i (A with the column i taken from B).
+    Returns:
+    np.ndarray: Points of shape (n (d + 2), d), in the order of bounds.
+    """
+    from scipy.stats import qmc
+
+    d = len(bounds)
+    base = qmc.Sobol(2 * d, scramble=True, seed=seed).random(n)
+    A = base[:, :d]
+    B = base[:, d:]
+    blocks = [A, B]
+    for i in range(d):
+        AB = A.copy()
+        AB[:, i] = B[:, i]
+        blocks.append(AB)
+    return _scale(np.vstack(blocks), bounds)
+
+
+def morris_design(bounds: dict, r, levels=4, seed=None) -> np.ndarray:
+    """
+    Builds r Morris trajectories. Each trajectory starts from a random point of the grid of levels
+    and moves one input at a time (in a random order) by delta = levels / (2 (levels - 1)).
+    Returns:
+    np.ndarray: Points of shape (r (d + 1), d), in the order of bounds.
+    """
+    rng = np.random.default_rng(seed)
+    d = len(bounds)
+    delta = levels / (2 * (levels - 1))
+    grid = np.arange(levels // 2) / (levels - 1)  ## starts from which +delta stays in [0, 1]
+    trajectories = []
+    for _ in range(r):
+        point = rng.choice(grid, d)
+        ## Move down instead of up for a random half of the inputs
+        direction = rng.choice([-1, 1], d)
+        point = np.where(direction < 0, point + delta, point)
+        trajectory = [point.copy()]
+        for i in rng.permutation(d):
+            point[i] += direction[i] * delta
+            trajectory.append(point.copy())
+        trajectories.append(trajectory)
+    return _scale(np.array(trajectories).reshape(-1, d), bounds)
+
+
+def _init_worker():
+    ## One atmosphere memo for all the points solved by the worker, kept until it exits
+    atmosphere.cached().__enter__()
+
+
+def _solve_point(args):
+    """
+    Sizes the aircraft for one point of a design (run in the worker processes, inside the
+    atmosphere memo of the run, see `evaluate`).
+    """
+    mission_data, values, cache_directory, max_iteration, tolerance = args
+    Mission = df.build_mission(mission_data)
+    with AppliedInputs(Mission, values, column=False):
+        run = bl.main_loop
+        if cache_directory is not None:
+            run = ResultCache(cache_directory).main_loop
+        results = run(
+            Mission=Mission,
+            WC=Aircraft.Payload.Wcrew.value,
+            WP=Aircraft.Payload.Wpayload.value,
+            guess_WTO=10000,
+            max_iteration=max_iteration,
+            tolerance=tolerance,
+        )
+    WTO = float(results[0])
+    Beta_final = float(results[3])
+    return WTO, 1.06 * (1 - Beta_final) * WTO
+
+
+def evaluate(
+    mission_data: dict,
+    names,
+    points,
+    engine="main_loop",
+    processes=1,
+    cache_directory=DEFAULT_CACHE_DIR,
+    max_iteration=20,
+    tolerance=0.001,
+) -> dict:
+    """
+    Sizes the aircraft for every point of a design.
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `Data_formating.load_mission_data`.
+    names (List[str]): Names of the inputs, one per column of points.
+    points (np.ndarray): Values of the inputs, shape (number of points, len(names)).
+    engine (str, optional): "main_loop" or "batch". Defaults to "main_loop".
+    processes (int, optional): Number of processes of the "main_loop" engine. Defaults to 1.
+    cache_directory (str, optional): Results cache of the "main_loop" engine, None to disable it.
+    max_iteration, tolerance: See `Beta_loop.main_loop`.
+    Returns:
+    dict: Arrays of the WTO and fuel weight of each point.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, must be one of {ENGINES}")
+    if engine == "batch":
+        results = solve_batch(
+            mission_data,
+            {name: points[:, i] for i, name in enumerate(names)},
+            Aircraft.Payload.Wcrew.value,
+            Aircraft.Payload.Wpayload.value,
+            max_iteration=max_iteration,
+            tolerance=tolerance,
+        )
+        return {name: results[name] for name in OUTPUTS}
+
+    tasks = [
+        (
+            mission_data,
+            dict(zip(names, point)),
+            cache_directory,
+            max_iteration,
+            tolerance,
+        )
+        for point in points
+    ]
+    ## The atmosphere memo is shared by all the points (one per worker), each point starting with
+    ## an empty memo would compute the atmosphere of the whole mission again
+    if processes > 1:
+        from multiprocessing import Pool
+
+        with Pool(processes, initializer=_init_worker) as pool:
+            solved = pool.map(_solve_point, tasks)
+    else:
+        with atmosphere.cached():
+            solved = [_solve_point(task) for task in tasks]
+    solved = np.array(solved, dtype=float).reshape(-1, 2)
+    return {"WTO": solved[:, 0], "fuel_weight": solved[:, 1]}
+
+
+def _sobol(fA, fB, fAB):
+    ## Centering the outputs reduces the variance of the estimators
+    mean = np.mean(np.concatenate([fA, fB]))
+    fA, fB, fAB = fA - mean, fB - mean, fAB - mean
+    variance = np.var(np.concatenate([fA, fB]))
+    ## Saltelli (2010) first-order and Jansen total estimators
+    S1 = np.mean(fB[None, :] * (fAB - fA[None, :]), axis=1) / variance
+    ST = 0.5 * np.mean((fA[None, :] - fAB) ** 2, axis=1) / variance
+    return S1, ST
+
+
+def sobol_indices(outputs, n, d, n_bootstrap=200, confidence=0.95, seed=None) -> dict:
+    """
+    Computes the first-order and total Sobol indices from the outputs of a Saltelli design.
+    Parameters:
+    outputs (np.ndarray): Outputs of the n (d + 2) points of the design.
+    n (int): Number of rows of A and B.
+    d (int): Number of inputs.
+    n_bootstrap (int, optional): Number of bootstrap resamples. Defaults to 200.
+    confidence (float, optional): Level of the confidence intervals. Defaults to 0.95.
+    Returns:
+    dict: Arrays of size d "S1", "ST" and the half-widths of their confidence intervals
+          "S1_conf", "ST_conf".
+    """
+    outputs = np.asarray(outputs, dtype=float)
+    fA = outputs[:n]
+    fB = outputs[n : 2 * n]
+    fAB = outputs[2 * n :].reshape(d, n)
+    S1, ST = _sobol(fA, fB, fAB)
+    rng = np.random.default_rng(seed)
+    S1_boot = np.empty((n_bootstrap, d))
+    ST_boot = np.empty((n_bootstrap, d))
+    for b in range(n_bootstrap):
+        rows = rng.integers(0, n, n)
+        S1_boot[b], ST_boot[b] = _sobol(fA[rows], fB[rows], fAB[:, rows])
+    alpha = 100 * (1 - confidence) / 2
+
+    def half_width(boot):
+        low, high = np.percentile(boot, [alpha, 100 - alpha], axis=0)
+        return (high - low) / 2
+
+    return {
+        "S1": S1,
+        "S1_conf": half_width(S1_boot),
+        "ST": ST,
+        "ST_conf": half_width(ST_boot),
+    }
+
+
+def morris_indices(outputs, points, bounds: dict, r) -> dict:
+    """
+    Computes the statistics of the elementary effects of Morris trajectories. The effects are
+    computed in the unit space, so the indices of the inputs can be compared with each other.
+    Returns:
+    dict: Arrays of size d "mu", "mu_star" and "sigma".
+    """
+    d = len(bounds)
+    low = np.array([b[0] for b in bounds.values()], dtype=float)
+    high = np.array([b[1] for b in bounds.values()], dtype=float)
+    unit = (np.asarray(points, dtype=float) - low) / (high - low)
+    unit = unit.reshape(r, d + 1, d)
+    outputs = np.asarray(outputs, dtype=float).reshape(r, d + 1)
+    effects = np.empty((r, d))
+    for t in range(r):
+        steps = np.diff(unit[t], axis=0)
+        moved = np.argmax(np.abs(steps), axis=1)
+        effects[t, moved] = np.diff(outputs[t]) / steps[np.arange(d), moved]
+    return {
+        "mu": np.mean(effects, axis=0),
+        "mu_star": np.mean(np.abs(effects), axis=0),
+        "sigma": np.std(effects, axis=0, ddof=1) if r > 1 else np.zeros(d),
+    }
+
+
+def run_sensitivity(
+    mission_data: dict,
+    bounds: dict,
+    method="sobol",
+    budget=500,
+    engine="main_loop",
+    processes=1,
+    cache_directory=DEFAULT_CACHE_DIR,
+    levels=4,
+    n_bootstrap=200,
+    seed=None,
+) -> dict:
+    """
+    Runs a global sensitivity analysis within a budget of sizing solves.
+    Parameters:
+    mission_data (dict): Raw mission data, as loaded by `Data_formating.load_mission_data`.
+    bounds (dict): {input name: (low, high)}.
+    method (str, optional): "sobol" or "morris". Defaults to "sobol".
+    budget (int, optional): Maximum number of sizing solves. Defaults to 500.
+    engine, processes, cache_directory: See `evaluate`.
+    levels (int, optional): Number of levels of the Morris grid. Defaults to 4.
+    n_bootstrap (int, optional): Bootstrap resamples of the Sobol indices. Defaults to 200.
+    seed (int, optional): Seed of the design and of the bootstrap. Defaults to None.
+    Returns:
+    dict: {"method", "inputs", "solves", "indices": {output: {input: {index: value}}}}.
+    Raises:
+    ValueError: If the method is unknown or the budget is too small for the method.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, must be one of {METHODS}")
+    names = list(bounds.keys())
+    d = len(names)
+    check_inputs(df.build_mission(mission_data), names)
+    if method == "sobol":
+        ## Sobol sequences are balanced for powers of 2
+        n = 2 ** int(np.log2(budget // (d + 2))) if budget >= 2 * (d + 2) else 0
+        if n < 2:
+            raise ValueError(
+                f"A Sobol analysis of {d} inputs needs a budget of at least {2 * (d + 2)} solves"
+            )
+        points = saltelli_design(bounds, n, seed)
+    else:
+        r = budget // (d + 1)
+        if r < 1:
+            raise ValueError(
+                f"A Morris analysis of {d} inputs needs a budget of at least {d + 1} solves"
+            )
+        points = morris_design(bounds, r, levels, seed)
+
+    outputs = evaluate(mission_data, names, points, engine, processes, cache_directory)
+    indices = {}
+    for output in OUTPUTS:
+        if method == "sobol":
+            values = sobol_indices(outputs[output], n, d, n_bootstrap, seed=seed)
+        else:
+            values = morris_indices(outputs[output], points, bounds, r)
+        indices[output] = {
+            name: {index: float(v[i]) for index, v in values.items()}
+            for i, name in enumerate(names)
+        }
+    return {
+        "method": method,
+        "inputs": names,
+        "solves": int(len(points)),
+        "indices": indices,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Global sensitivity analysis")
+    parser.add_argument("bounds", help="JSON file {input name: [low, high]}")
+    parser.add_argument("--mission", default="Mission_Profile.json")
+    parser.add_argument("--method", choices=METHODS, default="sobol")
+    parser.add_argument("--budget", type=int, default=500, help="Maximum number of solves")
+    parser.add_argument("--engine", choices=ENGINES, default="main_loop")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the results cache")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Write the indices to a JSON file")
+    args = parser.parse_args(argv)
+
+    with open(args.bounds, "r") as file:
+        bounds = json.load(file)
+    mission_file = os.path.join(
+        os.path.dirname(__file__), "..", "..", "Inputs", args.mission
+    )
+    report = run_sensitivity(
+        df.load_mission_data(os.path.normpath(mission_file)),
+        bounds,
+        method=args.method,
+        budget=args.budget,
+        engine=args.engine,
+        processes=args.processes,
+        cache_directory=None if args.no_cache else DEFAULT_CACHE_DIR,
+        seed=args.seed,
+    )
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
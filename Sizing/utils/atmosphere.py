@@ -1,14 +1,122 @@
-import ussa1976 as ussa
 from Sizing.Variable_info.Variable import Variable
+from Sizing.utils import instrumentation
 import numpy as np
 
-### SEA LEVEL VALUES SL = Sea Level values
-
-SL_VALUES = ussa.compute(z=np.array([0]), variables=["t", "p", "rho", "cs"])
-SL_TEMPERATURE = SL_VALUES["t"].values
-SL_PRESSURE = SL_VALUES["p"].values
-SL_DENSITY = SL_VALUES["rho"].values
-SL_SOUND_SPEED = SL_VALUES["cs"].values
+## ussa1976 pulls in xarray, pandas and scipy (most of the import time of the sizing modules):
+## it is imported, and the sea level values computed, on the first atmosphere computation.
+_ussa = None
+_sea_level = None
+
+### SEA LEVEL VALUES SL = Sea Level values, computed on first access (see `__getattr__`)
+SEA_LEVEL_NAMES = {
+    "SL_TEMPERATURE": "t",
+    "SL_PRESSURE": "p",
+    "SL_DENSITY": "rho",
+    "SL_SOUND_SPEED": "cs",
+}
+
+
+def _ussa1976():
+    global _ussa
+    if _ussa is None:
+        import ussa1976
+
+        _ussa = ussa1976
+    return _ussa
+
+
+def sea_level():
+    """
+    Sea level values of the US Standard Atmosphere 1976, computed once.
+    Returns:
+        dict: Arrays of shape (1,) for "t" (K), "p" (Pa), "rho" (kg/m^3) and "cs" (m/s).
+    """
+    global _sea_level
+    if _sea_level is None:
+        values = _ussa1976().compute(z=np.array([0]), variables=["t", "p", "rho", "cs"])
+        _sea_level = {variable: values[variable].values for variable in ("t", "p", "rho", "cs")}
+    return _sea_level
+
+
+def __getattr__(name):
+    ## Lazy module constants SL_TEMPERATURE, SL_PRESSURE, SL_DENSITY and SL_SOUND_SPEED
+    if name in SEA_LEVEL_NAMES:
+        return sea_level()[SEA_LEVEL_NAMES[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_memo = None  ## (variable, altitude) -> values, only inside a `cached()` block
+
+
+def _compute(variable, altitude):
+    """
+    Computes one variable of the US Standard Atmosphere 1976 at the given altitude (m).
+    """
+    if _memo is not None and np.ndim(altitude) == 0:
+        key = (variable, float(altitude))
+        values = _memo.get(key)
+        if values is None:
+            values = _memo[key] = _compute_ussa(variable, altitude)
+        return values.copy()
+    return _compute_ussa(variable, altitude)
+
+
+def _compute_ussa(variable, altitude):
+    if instrumentation.enabled:
+        instrumentation.count("atmosphere")
+    return _ussa1976().compute(variables=[variable], z=np.array([altitude]))[variable].values
+
+
+class cached:
+    """
+    Context manager keeping the atmosphere properties computed in its body, so each altitude is
+    computed only once. Used by the studies that evaluate the same mission many times.
+    """
+
+    def __enter__(self):
+        global _memo
+        self.previous = _memo
+        if _memo is None:
+            _memo = {}
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _memo
+        _memo = self.previous
+        return False
+
+
+def compute_properties(altitudes, meter=False):
+    """
+    Computes the properties of the atmosphere at many altitudes with a single call to ussa1976.
+    Parameters:
+        altitudes (array-like): Altitudes in ft (or in m if meter is True).
+        meter (bool, optional): True if the altitudes are in meters. Defaults to False.
+    Returns:
+        dict: Arrays with the shape of altitudes for "temperature" (K), "pressure" (Pa),
+        "density" (kg/m^3), "speed_of_sound" (m/s), "density_ratio", "pressure_ratio" and
+        "temperature_ratio". Same values as the properties of the Atmosphere class.
+    """
+    altitudes = np.asarray(altitudes, dtype=float)
+    z = altitudes if meter else altitudes * 0.3048
+    ## ussa1976 needs unique altitudes
+    unique_z, inverse = np.unique(z.ravel(), return_inverse=True)
+    if instrumentation.enabled:
+        instrumentation.count("atmosphere")
+    values = _ussa1976().compute(z=unique_z, variables=["t", "p", "rho", "cs"])
+    properties = {
+        name: values[variable].values[inverse].reshape(altitudes.shape)
+        for name, variable in (
+            ("temperature", "t"),
+            ("pressure", "p"),
+            ("density", "rho"),
+            ("speed_of_sound", "cs"),
+        )
+    }
+    properties["density_ratio"] = properties["density"] / sea_level()["rho"]
+    properties["pressure_ratio"] = properties["pressure"] / sea_level()["p"]
+    properties["temperature_ratio"] = properties["temperature"] / sea_level()["t"]
+    return properties
 
 
 class Atmosphere:
@@ -51,12 +159,9 @@ class Atmosphere:
         Returns:
             float: Temperature of the atmosphere.
         """
-        temperature = ussa.compute(
-            variables=["t"],
-            z=np.array([self.altitude.value]),
-        )
+        temperature = _compute("t", self.altitude.value)
         return Variable(
-            "temperature", temperature["t"].values, "K", "Temperature of the atmosphere"
+            "temperature", temperature, "K", "Temperature of the atmosphere"
         )
 
     @property
@@ -66,11 +171,8 @@ class Atmosphere:
         Returns:
             float: Pressure of the atmosphere.
         """
-        pressure = ussa.compute(
-            variables=["p"],
-            z=np.array([self.altitude.value]),
-        )
-        return Variable("pressure", pressure["p"].values, "Pa", "Pressure")
+        pressure = _compute("p", self.altitude.value)
+        return Variable("pressure", pressure, "Pa", "Pressure")
 
     @property
     def density(self):
@@ -79,11 +181,8 @@ class Atmosphere:
         Returns:
             float: Density of the atmosphere.
         """
-        density = ussa.compute(
-            variables=["rho"],
-            z=np.array([self.altitude.value]),
-        )
-        return Variable("density", density["rho"].values, "kg/m^3", "Density")
+        density = _compute("rho", self.altitude.value)
+        return Variable("density", density, "kg/m^3", "Density")
 
     @property
     def density_slug_ft3(self):
@@ -108,10 +207,7 @@ class Atmosphere:
         """
         return Variable(
             "speed_of_sound",
-            ussa.compute(
-                variables=["cs"],
-                z=np.array([self.altitude.value]),
-            )["cs"].values,
+            _compute("cs", self.altitude.value),
             "m/s",
             "Speed of sound",
         )
@@ -125,7 +221,7 @@ class Atmosphere:
         """
         return Variable(
             "density_ratio",
-            self.density.value / SL_DENSITY,
+            self.density.value / sea_level()["rho"],
             "",
             "Density ratio of the atmosphere",
         )
@@ -139,7 +235,7 @@ class Atmosphere:
         """
         return Variable(
             "pressure_ratio",
-            self.pressure.value / SL_PRESSURE,
+            self.pressure.value / sea_level()["p"],
             "",
             "Pressure ratio of the atmosphere",
         )
@@ -153,7 +249,7 @@ class Atmosphere:
         """
         return Variable(
             "temperature_ratio",
-            self.temperature.value / SL_TEMPERATURE,
+            self.temperature.value / sea_level()["t"],
             "",
             "Temperature ratio of the atmosphere",
         )
\ No newline at end of file
@@ -0,0 +1,214 @@
+import numpy as np
+
+"""
+This module provides dual numbers for forward-mode automatic differentiation.
+A `Dual` holds a value (float or array) and its gradient with respect to k variables (an array of
+shape value.shape + (k,)). Arithmetic operations and the numpy functions used by the segment
+models (exp, sqrt, log, trigonometric functions...) propagate the gradient, so any closed-form
+expression of the segments can be differentiated by evaluating it once with dual inputs:
+    WSR, TWR = dual.variables(110, 0.3)
+    wf = segment.wf_wi(WSR, TWR)
+    wf.value, wf.grad  # weight fraction and its derivatives with respect to WSR and TWR
+Comparisons use the values only, so the branches and the convergence tests of the models behave
+as with floats.
+Classes:
+    Dual:
+        Dual number (value and gradient).
+Functions:
+    variables(*values) -> List[Dual]:
+        Independent variables, the gradient of the i-th one is the i-th unit vector.
+    value(x), gradient(x, k):
+        Value and gradient of a dual number or of a constant.
+"""
+
+
+def value(x):
+    return x.value if isinstance(x, Dual) else x
+
+
+def gradient(x, k):
+    """Gradient of x with respect to the k variables (zeros for a constant)."""
+    if isinstance(x, Dual):
+        return x.grad
+    return np.zeros(np.shape(x) + (k,))
+
+
+def _expand(x):
+    """Adds the axis of the variables to a value, to multiply a gradient."""
+    return np.asarray(x)[..., None]
+
+
+def _chain(x, derivative, result):
+    return Dual(result, x.grad * _expand(derivative))
+
+
+class Dual:
+    """
+    Dual number: value and gradient with respect to k variables.
+    Attributes:
+        value (float or np.ndarray): Value.
+        grad (np.ndarray): Gradient, shape np.shape(value) + (k,).
+    """
+
+    __array_priority__ = 100
+
+    def __init__(self, value, grad):
+        self.value = value
+        self.grad = np.asarray(grad, dtype=float)
+
+    @property
+    def k(self):
+        return self.grad.shape[-1]
+
+    def __repr__(self):
+        return f"Dual({self.value!r}, grad={self.grad!r})"
+
+    ### Arithmetic
+    def __add__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value + other.value, self.grad + other.grad)
+        return Dual(self.value + other, self.grad + 0 * _expand(other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __neg__(self):
+        return Dual(-self.value, -self.grad)
+
+    def __pos__(self):
+        return self
+
+    def __mul__(self, other):
+        if isinstance(other, Dual):
+            return Dual(
+                self.value * other.value,
+                self.grad * _expand(other.value) + other.grad * _expand(self.value),
+            )
+        return Dual(self.value * other, self.grad * _expand(other))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            result = self.value / other.value
+            return Dual(
+                result,
+                (self.grad - other.grad * _expand(result)) / _expand(other.value),
+            )
+        return Dual(self.value / other, self.grad / _expand(other))
+
+    def __rtruediv__(self, other):
+        result = other / self.value
+        return Dual(result, -self.grad * _expand(result / self.value))
+
+    def __pow__(self, other):
+        if isinstance(other, Dual):
+            result = self.value**other.value
+            return Dual(
+                result,
+                self.grad * _expand(other.value * self.value ** (other.value - 1))
+                + other.grad * _expand(result * np.log(self.value)),
+            )
+        return _chain(self, other * self.value ** (other - 1), self.value**other)
+
+    def __rpow__(self, other):
+        result = other**self.value
+        return _chain(self, result * np.log(other), result)
+
+    def __abs__(self):
+        return _chain(self, np.sign(self.value), abs(self.value))
+
+    ### Comparisons on the values
+    def __lt__(self, other):
+        return self.value < value(other)
+
+    def __le__(self, other):
+        return self.value <= value(other)
+
+    def __gt__(self, other):
+        return self.value > value(other)
+
+    def __ge__(self, other):
+        return self.value >= value(other)
+
+    def __float__(self):
+        return float(self.value)
+
+    ### Numpy functions
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != "__call__" or kwargs:
+            return NotImplemented
+        if len(inputs) == 2:
+            binary = {
+                np.add: lambda a, b: a + b,
+                np.subtract: lambda a, b: a - b,
+                np.multiply: lambda a, b: a * b,
+                np.true_divide: lambda a, b: a / b,
+                np.power: lambda a, b: a**b,
+                np.less: lambda a, b: value(a) < value(b),
+                np.less_equal: lambda a, b: value(a) <= value(b),
+                np.greater: lambda a, b: value(a) > value(b),
+                np.greater_equal: lambda a, b: value(a) >= value(b),
+            }
+            if ufunc not in binary:
+                return NotImplemented
+            a, b = inputs
+            if not isinstance(a, Dual):
+                ## a is a constant array, use the reflected operation of b
+                return {
+                    np.add: lambda: b.__radd__(a),
+                    np.subtract: lambda: b.__rsub__(a),
+                    np.multiply: lambda: b.__rmul__(a),
+                    np.true_divide: lambda: b.__rtruediv__(a),
+                    np.power: lambda: b.__rpow__(a),
+                }.get(ufunc, lambda: binary[ufunc](a, b))()
+            return binary[ufunc](a, b)
+        (x,) = inputs
+        v = x.value
+        match ufunc:
+            case np.exp:
+                result = np.exp(v)
+                return _chain(x, result, result)
+            case np.sqrt:
+                result = np.sqrt(v)
+                return _chain(x, 0.5 / result, result)
+            case np.log:
+                return _chain(x, 1 / v, np.log(v))
+            case np.sin:
+                return _chain(x, np.cos(v), np.sin(v))
+            case np.cos:
+                return _chain(x, -np.sin(v), np.cos(v))
+            case np.tan:
+                return _chain(x, 1 / np.cos(v) ** 2, np.tan(v))
+            case np.arcsin:
+                return _chain(x, 1 / np.sqrt(1 - v**2), np.arcsin(v))
+            case np.arccos:
+                return _chain(x, -1 / np.sqrt(1 - v**2), np.arccos(v))
+            case np.arctan:
+                return _chain(x, 1 / (1 + v**2), np.arctan(v))
+            case np.square:
+                return _chain(x, 2 * v, v**2)
+            case np.absolute:
+                return abs(x)
+            case np.negative:
+                return -x
+        return NotImplemented
+
+
+def variables(*values):
+    """
+    Returns the independent variables of a differentiation: the gradient of the i-th variable is
+    the i-th unit vector (broadcast to the shape of its value).
+    """
+    k = len(values)
+    duals = []
+    for i, v in enumerate(values):
+        grad = np.zeros(np.shape(v) + (k,))
+        grad[..., i] = 1
+        duals.append(Dual(v, grad))
+    return duals
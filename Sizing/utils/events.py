@@ -0,0 +1,239 @@
+import logging
+import time
+
+"""
+This module provides the event hooks of the sizing loops.
+The mission analysis and the Beta/WTO loops emit structured events (mission and segment
+start/end, iteration residuals, convergence) to the observers subscribed to `dispatcher`.
+By default no observer is subscribed and emitting an event costs a single attribute check,
+so batch runs do not pay for progress bars or terminal output.
+Usage:
+    from Sizing.utils import events
+    events.subscribe(events.TerminalProgress())
+Classes:
+    Observer:
+        Base class of the observers, every event is a no-op.
+    Dispatcher:
+        Forwards the events to the subscribed observers.
+    TerminalProgress:
+        Progress bar over the mission segments and iteration messages in the terminal (tqdm).
+    LoggingObserver:
+        Writes the events to a logger.
+    MetricsObserver:
+        Collects counts, residual histories and timings of the events.
+Functions:
+    subscribe(observer) -> Observer:
+        Subscribes an observer to the dispatcher.
+    unsubscribe(observer):
+        Unsubscribes an observer from the dispatcher.
+"""
+
+
+class Observer:
+    """
+    Base class of the observers of the sizing loops. Subclasses override the events they need.
+    """
+
+    def mission_start(self, segments_list):
+        pass
+
+    def segment_start(self, index, segment):
+        pass
+
+    def segment_end(self, index, segment, beta):
+        pass
+
+    def mission_end(self, betas_list):
+        pass
+
+    def iteration(self, loop, iteration, values, residuals):
+        """
+        Called after each iteration of a loop.
+        Parameters:
+        loop (str): Name of the loop ("Beta" or "WTO").
+        iteration (int): Iteration number.
+        values (dict): Values computed by the iteration, e.g. {"WSR": ..., "TWR": ...}.
+        residuals (dict): Absolute change of these values since the previous iteration.
+        """
+        pass
+
+    def converged(self, loop, iteration, values):
+        pass
+
+    def not_converged(self, loop, iteration, values):
+        pass
+
+
+class Dispatcher(Observer):
+    """
+    Forwards every event to the subscribed observers.
+    The emitting code checks `dispatcher.observers` before building the event arguments.
+    """
+
+    def __init__(self):
+        self.observers = []
+
+    def mission_start(self, segments_list):
+        for observer in self.observers:
+            observer.mission_start(segments_list)
+
+    def segment_start(self, index, segment):
+        for observer in self.observers:
+            observer.segment_start(index, segment)
+
+    def segment_end(self, index, segment, beta):
+        for observer in self.observers:
+            observer.segment_end(index, segment, beta)
+
+    def mission_end(self, betas_list):
+        for observer in self.observers:
+            observer.mission_end(betas_list)
+
+    def iteration(self, loop, iteration, values, residuals):
+        for observer in self.observers:
+            observer.iteration(loop, iteration, values, residuals)
+
+    def converged(self, loop, iteration, values):
+        for observer in self.observers:
+            observer.converged(loop, iteration, values)
+
+    def not_converged(self, loop, iteration, values):
+        for observer in self.observers:
+            observer.not_converged(loop, iteration, values)
+
+
+dispatcher = Dispatcher()
+
+
+def subscribe(observer: Observer) -> Observer:
+    if observer not in dispatcher.observers:
+        dispatcher.observers.append(observer)
+    return observer
+
+
+def unsubscribe(observer: Observer):
+    if observer in dispatcher.observers:
+        dispatcher.observers.remove(observer)
+
+
+def _format_values(values):
+    return ", ".join(f"{name}: {float(value)}" for name, value in values.items())
+
+
+class TerminalProgress(Observer):
+    """
+    Displays a progress bar over the segments of each mission evaluation and prints the
+    iterations and the convergence of the loops (same output as the interactive tool).
+    """
+
+    def __init__(self):
+        self._bar = None
+
+    def mission_start(self, segments_list):
+        from tqdm import tqdm
+
+        self._bar = tqdm(total=len(segments_list), leave=False)
+
+    def segment_start(self, index, segment):
+        if self._bar is not None:
+            self._bar.set_description(str(segment.name))
+
+    def segment_end(self, index, segment, beta):
+        if self._bar is not None:
+            self._bar.update(1)
+
+    def mission_end(self, betas_list):
+        if self._bar is not None:
+            self._bar.close()
+            self._bar = None
+
+    def iteration(self, loop, iteration, values, residuals):
+        if loop == "Beta":
+            print(f"Iteration {iteration} for Beta loop, {_format_values(values)}")
+
+    def converged(self, loop, iteration, values):
+        print(f"Convergence {loop} reached at iteration {iteration}")
+        if loop == "Beta":
+            print(_format_values(values))
+
+    def not_converged(self, loop, iteration, values):
+        print(f"{loop} loop did not converge after {iteration + 1} iterations")
+
+
+class LoggingObserver(Observer):
+    """
+    Writes the events to a logger (segment events at DEBUG level, loop events at INFO level).
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger if logger is not None else logging.getLogger("Sizing")
+
+    def segment_end(self, index, segment, beta):
+        self.logger.debug("Segment %s (%s): beta %s", index, segment.name, float(beta))
+
+    def iteration(self, loop, iteration, values, residuals):
+        self.logger.info(
+            "%s loop iteration %s: %s (residuals %s)",
+            loop,
+            iteration,
+            _format_values(values),
+            _format_values(residuals),
+        )
+
+    def converged(self, loop, iteration, values):
+        self.logger.info(
+            "%s loop converged at iteration %s: %s",
+            loop,
+            iteration,
+            _format_values(values),
+        )
+
+    def not_converged(self, loop, iteration, values):
+        self.logger.warning(
+            "%s loop did not converge after %s iterations", loop, iteration + 1
+        )
+
+
+class MetricsObserver(Observer):
+    """
+    Collects metrics of the sizing loops.
+    Attributes:
+        missions (int): Number of mission evaluations.
+        segments (dict): Number of evaluations and total time per segment type.
+        iterations (dict): Number of iterations per loop.
+        residuals (dict): History of the residuals per loop.
+        convergence (dict): Iteration at which each loop converged (None if it did not).
+    """
+
+    def __init__(self):
+        self.missions = 0
+        self.segments = {}
+        self.iterations = {}
+        self.residuals = {}
+        self.convergence = {}
+        self._segment_start = None
+
+    def mission_start(self, segments_list):
+        self.missions += 1
+
+    def segment_start(self, index, segment):
+        self._segment_start = time.perf_counter()
+
+    def segment_end(self, index, segment, beta):
+        count, total = self.segments.get(segment.type, (0, 0.0))
+        elapsed = 0.0
+        if self._segment_start is not None:
+            elapsed = time.perf_counter() - self._segment_start
+        self.segments[segment.type] = (count + 1, total + elapsed)
+
+    def iteration(self, loop, iteration, values, residuals):
+        self.iterations[loop] = self.iterations.get(loop, 0) + 1
+        self.residuals.setdefault(loop, []).append(
+            {name: float(value) for name, value in residuals.items()}
+        )
+
+    def converged(self, loop, iteration, values):
+        self.convergence[loop] = iteration
+
+    def not_converged(self, loop, iteration, values):
+        self.convergence[loop] = None
@@ -0,0 +1,122 @@
+import numpy as np
+from Sizing.utils import dual
+
+"""
+This module provides the feasibility checks of the mission and of the sizing loops.
+An infeasible design (not enough thrust to climb, takeoff field too short, no design point, weights
+that do not close) used to produce NaNs or negative weights that propagated through the remaining
+iterations. The checks now stop the evaluation at the segment or stage where the design becomes
+infeasible, with an `InfeasibleDesign` error whose class and `reason` tell why:
+    InsufficientThrust  ("insufficient_thrust"): drag above the available thrust (u >= 1) in a
+                                                 climb, an acceleration or the takeoff roll,
+    TakeoffInfeasible   ("takeoff_field"): no wing loading clears the obstacle within the field,
+    NoDesignPoint       ("no_design_point"): the constraint envelope has no finite, positive minimum,
+    WeightNotClosing    ("weight_not_closing"): non-positive weight fraction, or fuel and empty weight
+                                                fractions that leave no room for the payload.
+The errors are ValueErrors, so the callers that already catch ValueError keep working.
+The checks only raise for single evaluations (single design, off-design and derivative runs),
+whose values are scalars or one-element arrays. The vectorized batches (Monte Carlo, DOE, route
+networks) evaluate column arrays of samples: the segments set the weight fractions of their
+infeasible samples to NaN with `mask`, the NaN propagates through the mission and the design point,
+and the sample ends up not converged, so one sample cannot abort a whole batch.
+Usage:
+    try:
+        results = bl.main_loop(Mission, WC, WP, 10000)
+    except feasibility.InfeasibleDesign as error:
+        print(error.reason, error.phase)
+Functions:
+    require(ok, error, message, phase=None, value=None):
+        Raises error(message()) if the condition ok of a single evaluation is False.
+    mask(ok, value) -> float or np.ndarray:
+        value with NaN for the infeasible samples of a batch.
+    finite(x) -> bool or np.ndarray:
+        True where x (float, array or Dual) is finite.
+"""
+
+
+class InfeasibleDesign(ValueError):
+    """
+    Base class of the infeasible design errors.
+    Attributes:
+        reason (str): Short identifier of the cause, e.g. for feasibility maps.
+        phase (int): Phase number of the segment where the design became infeasible, None for the
+                     solver stages.
+        value: Value that failed the check (e.g. u, the weight fraction or the WTO denominator).
+    """
+
+    reason = "infeasible"
+
+    def __init__(self, message, phase=None, value=None):
+        super().__init__(message)
+        self.phase = phase
+        self.value = value
+
+
+class InsufficientThrust(InfeasibleDesign):
+    reason = "insufficient_thrust"
+
+
+class TakeoffInfeasible(InfeasibleDesign):
+    reason = "takeoff_field"
+
+
+class NoDesignPoint(InfeasibleDesign):
+    reason = "no_design_point"
+
+
+class WeightNotClosing(InfeasibleDesign):
+    reason = "weight_not_closing"
+
+
+def finite(x):
+    return np.isfinite(dual.value(x))
+
+
+def single(ok) -> bool:
+    """
+    True if the condition ok is the one of a single evaluation: a scalar, or the one-element array
+    produced by the atmosphere for a scalar altitude. Batches are column arrays, even of one sample.
+    """
+    return np.ndim(ok) <= 1 and np.size(ok) == 1
+
+
+def require(ok, error, message, phase=None, value=None):
+    """
+    Raises error(message(), phase, value) if the condition ok of a single evaluation is False.
+    Batch conditions never raise, see the module docstring and `mask`.
+    The checks run in the innermost loops of the mission analysis, so the message is only built
+    when the check fails.
+    Parameters:
+    ok (bool or np.ndarray): Feasibility condition.
+    error (type): InfeasibleDesign subclass to raise.
+    message (callable): Function returning the error message.
+    phase (int, optional): Phase number of the segment. Defaults to None.
+    value (optional): Value that failed the check. Defaults to None.
+    Raises:
+    InfeasibleDesign: If ok is the False condition of a single evaluation.
+    """
+    ok = np.asarray(dual.value(ok))
+    if single(ok) and not ok.all():
+        raise error(message(), phase, dual.value(value))
+
+
+def mask(ok, value):
+    """
+    Returns value with NaN where the batch condition ok is False. Single evaluations are returned
+    unchanged: `require` raises for them.
+    Parameters:
+    ok (bool or np.ndarray): Feasibility condition.
+    value (float, np.ndarray or Dual): Result of the evaluation, broadcastable with ok.
+    Returns:
+    float, np.ndarray or Dual: value, with NaN for the infeasible samples.
+    """
+    ok = np.asarray(dual.value(ok))
+    if single(ok):
+        return value
+    if isinstance(value, dual.Dual):
+        ## Batches of derivatives (off-design fuel solver): the gradient is masked too
+        ok = np.broadcast_to(ok, np.broadcast_shapes(ok.shape, np.shape(value.value)))
+        return dual.Dual(
+            np.where(ok, value.value, np.nan), np.where(ok[..., None], value.grad, np.nan)
+        )
+    return np.where(ok, value, np.nan)
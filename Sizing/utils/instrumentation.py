@@ -0,0 +1,165 @@
+import cProfile
+import json
+import os
+import pstats
+import time
+
+"""
+This module records where a sizing run spends its time.
+When enabled (`enable()`, `python Main.py --profile`, or the environment variable
+AE_SIZING_PROFILE=1), it records the wall time and the number of calls of each stage of the run
+(mission analysis per segment type, constraint analysis, additional constraints, WTO loop, GUI)
+and counts the atmosphere and propulsion model evaluations. The results are written to a JSON
+report; a cProfile/pstats file can also be written for a detailed analysis.
+When disabled, `stage()` returns a shared no-op context manager and `count()` is never called
+(the callers check `instrumentation.enabled` first), so the overhead is negligible.
+Functions:
+    enable(), disable(), reset():
+        Switch the recording on or off, clear the recorded data.
+    stage(name):
+        Context manager recording the wall time of a stage.
+    count(name, n=1):
+        Increments an evaluation counter.
+    report() -> dict:
+        Recorded stages and counters.
+    write_report(path) -> str:
+        Writes the report in a JSON file.
+    cprofile(path):
+        Context manager running cProfile and writing the statistics to a .pstats file.
+"""
+
+ENVIRONMENT_VARIABLE = "AE_SIZING_PROFILE"
+enabled = os.environ.get(ENVIRONMENT_VARIABLE, "") not in ("", "0")
+
+_stages = {}  ## name -> [calls, total wall time (s)]
+_counters = {}  ## name -> number of evaluations
+_start_time = time.perf_counter()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    global _start_time
+    _stages.clear()
+    _counters.clear()
+    _start_time = time.perf_counter()
+
+
+def count(name, n=1):
+    _counters[name] = _counters.get(name, 0) + n
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.start
+        record = _stages.setdefault(self.name, [0, 0.0])
+        record[0] += 1
+        record[1] += elapsed
+        return False
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name):
+    """
+    Context manager recording the wall time and the number of calls of a stage.
+    Stages can be nested, the time of a nested stage is also counted in its parent.
+    """
+    if not enabled:
+        return _NO_STAGE
+    return _Stage(name)
+
+
+def report() -> dict:
+    """
+    Returns the recorded data:
+        - "total_time": wall time since the last reset (s),
+        - "stages": {name: {"calls": ..., "total_time": ..., "mean_time": ...}}, slowest first,
+        - "counters": {name: number of evaluations}.
+    """
+    stages = {
+        name: {
+            "calls": calls,
+            "total_time": total,
+            "mean_time": total / calls if calls else 0.0,
+        }
+        for name, (calls, total) in sorted(
+            _stages.items(), key=lambda item: item[1][1], reverse=True
+        )
+    }
+    return {
+        "total_time": time.perf_counter() - _start_time,
+        "stages": stages,
+        "counters": dict(sorted(_counters.items())),
+    }
+
+
+def write_report(path) -> str:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(report(), file, indent=4)
+    return path
+
+
+def print_report():
+    data = report()
+    print("\n")
+    print("############################################")
+    print(f"Profiling report (total {data['total_time']:.3f} s)")
+    print("############################################")
+    for name, values in data["stages"].items():
+        print(
+            f"{name:<40} {values['calls']:>8} calls {values['total_time']:>10.3f} s"
+        )
+    for name, value in data["counters"].items():
+        print(f"{name:<40} {value:>8} evaluations")
+    print("############################################")
+
+
+class cprofile:
+    """
+    Context manager running cProfile on its body and writing the statistics to path
+    (readable with `python -m pstats path`).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.disable()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        pstats.Stats(self.profiler).sort_stats("cumulative").dump_stats(self.path)
+        return False
@@ -1,5 +1,5 @@
 import numpy as np
-from Sizing.utils.atmosphere import Atmosphere, SL_SOUND_SPEED
+from Sizing.utils.atmosphere import Atmosphere, sea_level
 
 
 """
@@ -57,7 +57,7 @@ def KEAS_to_Mach(KEAS, altitude, meter=False):
         float: Mach number.
     """
     atm = Atmosphere(altitude, meter)
-    return (knots_to_mps(KEAS) / SL_SOUND_SPEED) / (np.sqrt(atm.pressure_ratio.value))
+    return (knots_to_mps(KEAS) / sea_level()["cs"]) / (np.sqrt(atm.pressure_ratio.value))
 
 
 def Mach_to_KEAS(Mach, altitude, meter=False):
@@ -71,7 +71,7 @@ def Mach_to_KEAS(Mach, altitude, meter=False):
         float: Equivalent airspeed in knots.
     """
     atm = Atmosphere(altitude, meter)
-    KEAS = Mach * SL_SOUND_SPEED * np.sqrt(atm.pressure_ratio.value)
+    KEAS = Mach * sea_level()["cs"] * np.sqrt(atm.pressure_ratio.value)
     return mps_to_knots(KEAS)
 
 
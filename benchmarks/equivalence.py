@@ -0,0 +1,609 @@
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+"""
+Golden-reference equivalence harness.
+Any fast replacement of the current code paths (vectorized, tabulated, incremental, warm-started,
+reduced fidelity...) must reproduce the answers of the legacy implementation. This harness runs the
+legacy implementation and each registered fast engine on a corpus of missions (the shipped
+`Inputs/Mission_Profile.json` and randomized variants of the mission of `Inputs/Mission_example.py`)
+and compares their results within the tolerances declared by each engine.
+Five levels can be compared:
+    - "atmosphere": properties of the `Atmosphere` class on a grid of altitudes,
+    - "mission": beta chain of `Compute_Mission_Profile_Parametric` at a fixed design point,
+    - "constraints": design point and envelope of `constraint_analysis_main`,
+    - "main_loop": WTO, WSR, TWR and beta chain of `Beta_loop.main_loop`,
+    - "off_design": fuel and block fuel of the aircraft sized on the shipped mission flying each
+      mission of the corpus at several payloads and ranges, the fuel being solved by fixed point
+      iterations of `Compute_Mission_Profile_Parametric`.
+The engines that only compute some of the quantities of their level (e.g. the design point but not
+the envelope) declare the quantities they are compared on.
+For each engine, the report gives the largest absolute and relative deviation of every quantity,
+whether it is within tolerance, and the speedup over the legacy implementation.
+Usage (from the root of the project):
+    python -m benchmarks.equivalence
+    python -m benchmarks.equivalence --engines incremental_mission --random 5 --seed 1
+    python -m benchmarks.equivalence --levels atmosphere mission --output report.json
+New engines are declared with `register_engine(Engine(...))`.
+"""
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import Beta_loop as bl
+import Data_formating as df
+from Sizing.Mission_analysis import Main_Mission_Parametric
+from Sizing.Mission_analysis.Incremental_Mission import MissionEvaluator
+from Sizing.Mission_analysis.Off_Design_Mission import OffDesign
+from Sizing.constraint_analysis import Constraints_Parametric
+from Sizing.sweep.warm_start import WarmStart, seed_mission
+from Sizing.uncertainty import monte_carlo
+from Sizing.utils import atmosphere
+from Sizing.Variable_info.variables import Aircraft
+
+MISSION_FILE = os.path.join(ROOT_DIR, "Inputs", "Mission_Profile.json")
+LEVELS = ("atmosphere", "mission", "constraints", "main_loop", "off_design")
+ATMOSPHERE_PROPERTIES = (
+    "temperature",
+    "pressure",
+    "density",
+    "speed_of_sound",
+    "density_ratio",
+    "pressure_ratio",
+    "temperature_ratio",
+)
+## Design point used for the "mission" level
+WSR = 110.71530758226038
+TWR = 0.2968040450132129
+## Aircraft of the "off_design" level: main_loop results (WTO, WSR, TWR, Beta_final) on the shipped
+## mission
+OFF_DESIGN_AIRCRAFT = (169689.45474273723, WSR, TWR, 0.7726662569932862)
+## Payloads and cruise ranges of the "off_design" level, fractions of the design ones
+OFF_DESIGN_CASES = ((0.5, 0.5), (1.0, 0.5), (0.5, 1.0), (1.0, 1.0))
+
+
+class Engine:
+    """
+    A fast implementation of one level of the sizing tool.
+    Attributes:
+        name (str): Name of the engine.
+        level (str): Level replaced by the engine, one of LEVELS.
+        run (callable): Function taking the list of cases of the level and returning, for each
+                        case, a dictionary {quantity: value} (see the legacy_* functions).
+        tolerances (dict): {quantity: (rtol, atol)} allowed deviation from the legacy results.
+        description (str): Short description of the engine.
+        quantities (tuple): Quantities compared with the legacy results, None for all the
+                            quantities of the level.
+    """
+
+    def __init__(self, name, level, run, tolerances, description="", quantities=None):
+        if level not in LEVELS:
+            raise ValueError(f"Unknown level {level!r}, must be one of {LEVELS}")
+        self.name = name
+        self.level = level
+        self.run = run
+        self.tolerances = tolerances
+        self.description = description
+        self.quantities = quantities
+
+
+ENGINES = {}
+
+
+def register_engine(engine: Engine) -> Engine:
+    ENGINES[engine.name] = engine
+    return engine
+
+
+############################################
+# Corpus
+############################################
+
+
+def example_mission_data() -> dict:
+    """Mission data of `Inputs/Mission_example.py`, in the JSON format of the Inputs folder."""
+    import Inputs.Mission_example as Mission_example
+
+    return {
+        "phases": [
+            df.extract_attributes(segment) for segment in Mission_example.example()
+        ]
+    }
+
+
+def randomize_mission(mission_data: dict, rng) -> dict:
+    """
+    Returns a randomized variant of a mission: cruise ranges, loiter time, climb rates and
+    takeoff distance are scaled by random factors.
+    """
+    data = copy.deepcopy(mission_data)
+    for phase in data["phases"]:
+        match phase["type"]:
+            case "cruise":
+                phase["range"] = float(phase["range"] * rng.uniform(0.7, 1.3))
+            case "loiter":
+                phase["time"] = float(phase["time"] * rng.uniform(0.5, 1.5))
+            case "climb" if (phase["climb_rate"] or 0) > 0:
+                phase["climb_rate"] = float(phase["climb_rate"] * rng.uniform(0.8, 1.2))
+            case "takeoff":
+                phase["takeoff_distance"] = float(
+                    phase["takeoff_distance"] * rng.uniform(0.9, 1.1)
+                )
+    return data
+
+
+def build_corpus(n_random=3, seed=0):
+    """
+    Returns the list of (name, mission data) of the corpus: the shipped mission and n_random
+    randomized variants of the example mission.
+    """
+    corpus = [("Mission_Profile.json", df.load_mission_data(MISSION_FILE))]
+    if n_random > 0:
+        rng = np.random.default_rng(seed)
+        example = example_mission_data()
+        for i in range(n_random):
+            corpus.append((f"random_{seed}_{i}", randomize_mission(example, rng)))
+    return corpus
+
+
+def design_phases(mission_data: dict) -> tuple:
+    """
+    Indices of the design cruise (first cruise of the mission) and of the end of the block (first
+    approach after it, the following phases being the reserves) in the phases of a mission.
+    """
+    types = [phase["type"] for phase in mission_data["phases"]]
+    cruise_index = types.index("cruise")
+    return cruise_index, types.index("approach", cruise_index)
+
+
+def atmosphere_altitudes(corpus):
+    """Grid of altitudes (ft) from sea level to 45000 ft and every altitude of the corpus."""
+    altitudes = set(float(h) for h in np.arange(0, 45001, 1000))
+    for _, mission_data in corpus:
+        for phase in mission_data["phases"]:
+            for field in ("altitude", "start_altitude", "end_altitude"):
+                if phase.get(field) is not None:
+                    altitudes.add(float(phase[field]))
+    return np.array(sorted(altitudes))
+
+
+############################################
+# Legacy implementations
+############################################
+
+
+def legacy_atmosphere(cases):
+    results = []
+    for altitudes in cases:
+        values = {name: [] for name in ATMOSPHERE_PROPERTIES}
+        for altitude in altitudes:
+            atm = atmosphere.Atmosphere(altitude)
+            for name in ATMOSPHERE_PROPERTIES:
+                values[name].append(float(getattr(atm, name).value[0]))
+        results.append({name: np.array(v) for name, v in values.items()})
+    return results
+
+
+def legacy_mission(cases):
+    results = []
+    for WSR_case, TWR_case, mission_data in cases:
+        mission = df.build_mission(mission_data)
+        betas, _ = Main_Mission_Parametric.Compute_Mission_Profile_Parametric(
+            WSR_case, TWR_case, mission
+        )
+        results.append({"betas": np.array(betas)})
+    return results
+
+
+def constraints_results(constraints):
+    return {
+        "WSR": float(constraints[0]),
+        "TWR": float(constraints[1]),
+        "y_max": np.asarray(constraints[4], dtype=float),
+        "wing_loading_landing": float(constraints[5]),
+    }
+
+
+def legacy_constraints(cases):
+    results = []
+    for betas, mission_data in cases:
+        mission = df.build_mission(mission_data)
+        seed_mission(mission, betas)
+        constraints = Constraints_Parametric.constraint_analysis_main(mission)
+        results.append(constraints_results(constraints))
+    return results
+
+
+def main_loop_results(results):
+    return {
+        "WTO": float(results[0]),
+        "WSR": float(results[1]),
+        "TWR": float(results[2]),
+        "betas": np.asarray(results[4], dtype=float),
+    }
+
+
+def legacy_main_loop(cases):
+    results = []
+    for mission_data in cases:
+        results.append(
+            main_loop_results(
+                bl.main_loop(
+                    df.build_mission(mission_data),
+                    Aircraft.Payload.Wcrew.value,
+                    Aircraft.Payload.Wpayload.value,
+                    guess_WTO=10000,
+                )
+            )
+        )
+    return results
+
+
+def legacy_off_design(cases):
+    """
+    Scalar off-design missions: the fuel is solved by fixed point iterations, each flying the
+    whole mission with `Compute_Mission_Profile_Parametric` (inside `atmosphere.cached()`, which does
+    not change the values). The aircraft is set up with the formulas of the sizing (empty weight
+    gamma(MTOW) MTOW, fuel 1.06 (1 - Beta_final) MTOW), not with `OffDesign`.
+    """
+    MTOW, WSR_design, TWR_design, Beta_final = OFF_DESIGN_AIRCRAFT
+    WE = bl.gamma(MTOW) * MTOW
+    WC = Aircraft.Payload.Wcrew.value
+    design_fuel = 1.06 * (1 - Beta_final) * MTOW
+    results = []
+    with atmosphere.cached():
+        for mission_data, payloads, ranges in cases:
+            cruise_index, block_index = design_phases(mission_data)
+            design_range = mission_data["phases"][cruise_index]["range"]
+            fuel = []
+            block_fuel = []
+            for payload, cruise_range in zip(payloads, ranges):
+                F = design_fuel * cruise_range / design_range
+                for _ in range(100):
+                    beta_0 = (WE + WC + payload + F) / MTOW
+                    mission = df.build_mission(mission_data)
+                    mission[cruise_index].range.value = cruise_range
+                    mission[0].weight_fraction.value = beta_0
+                    betas, _ = Main_Mission_Parametric.Compute_Mission_Profile_Parametric(
+                        WSR_design, TWR_design, mission
+                    )
+                    F_new = 1.06 * MTOW * (beta_0 - betas[-1])
+                    converged = abs(F_new - F) < 1e-8
+                    F = F_new
+                    if converged:
+                        break
+                fuel.append(F)
+                block_fuel.append(MTOW * (beta_0 - betas[block_index]))
+            results.append({"fuel": np.array(fuel), "block_fuel": np.array(block_fuel)})
+    return results
+
+
+LEGACY = {
+    "atmosphere": legacy_atmosphere,
+    "mission": legacy_mission,
+    "constraints": legacy_constraints,
+    "main_loop": legacy_main_loop,
+    "off_design": legacy_off_design,
+}
+
+
+############################################
+# Fast engines
+############################################
+
+
+def vectorized_atmosphere(cases):
+    results = []
+    for altitudes in cases:
+        properties = atmosphere.compute_properties(altitudes)
+        results.append({name: properties[name] for name in ATMOSPHERE_PROPERTIES})
+    return results
+
+
+def incremental_mission(cases):
+    results = []
+    for WSR_case, TWR_case, mission_data in cases:
+        evaluator = MissionEvaluator(df.build_mission(mission_data))
+        betas, _ = evaluator.evaluate(WSR_case, TWR_case)
+        results.append({"betas": np.array(betas)})
+    return results
+
+
+def warm_started_main_loop(cases):
+    """Solves the corpus in order, each mission starting from the previous solution."""
+    warm = WarmStart()
+    default_guesses = {"guess_WTO": 10000, "WSR_guess": 110, "TWR_guess": 0.3}
+    results = []
+    for mission_data in cases:
+        mission = df.build_mission(mission_data)
+        guesses = warm.guesses([0.0], default_guesses)
+        solution = bl.main_loop(
+            mission,
+            Aircraft.Payload.Wcrew.value,
+            Aircraft.Payload.Wpayload.value,
+            **guesses,
+        )
+        warm.add([0.0], solution)
+        results.append(main_loop_results(solution))
+    return results
+
+
+def vectorized_design_point(cases):
+    """Design point of the vectorized constraint analysis (monte_carlo.design_point), one sample."""
+    results = []
+    for betas, mission_data in cases:
+        mission = df.build_mission(mission_data)
+        seed_mission(mission, betas)
+        WSR_case, TWR_case = monte_carlo.design_point(mission, 1)
+        results.append({"WSR": float(WSR_case[0]), "TWR": float(TWR_case[0])})
+    return results
+
+
+def batch_main_loop(cases):
+    """Vectorized sizing loops of the Monte Carlo module (monte_carlo.solve_batch), one sample."""
+    results = []
+    for mission_data in cases:
+        outputs = monte_carlo.solve_batch(
+            mission_data, {}, Aircraft.Payload.Wcrew.value, Aircraft.Payload.Wpayload.value
+        )
+        results.append({name: float(outputs[name][0]) for name in ("WTO", "WSR", "TWR")})
+    return results
+
+
+def vectorized_off_design(cases):
+    """All the payloads and ranges of a mission at once (OffDesign.mission_fuel)."""
+    results = []
+    for mission_data, payloads, ranges in cases:
+        cruise_index, block_index = design_phases(mission_data)
+        phases = mission_data["phases"]
+        aircraft = OffDesign(
+            mission_data,
+            OFF_DESIGN_AIRCRAFT,
+            cruise_phase=phases[cruise_index]["phase_number"],
+        )
+        outputs = aircraft.mission_fuel(
+            payloads, ranges, block_end_phase=phases[block_index]["phase_number"]
+        )
+        results.append({name: outputs[name] for name in ("fuel", "block_fuel")})
+    return results
+
+
+register_engine(
+    Engine(
+        "vectorized_atmosphere",
+        "atmosphere",
+        vectorized_atmosphere,
+        {name: (1e-12, 0.0) for name in ATMOSPHERE_PROPERTIES},
+        "All the altitudes in a single ussa1976 call (atmosphere.compute_properties)",
+    )
+)
+register_engine(
+    Engine(
+        "incremental_mission",
+        "mission",
+        incremental_mission,
+        {"betas": (1e-12, 0.0)},
+        "MissionEvaluator of Sizing.Mission_analysis.Incremental_Mission",
+    )
+)
+register_engine(
+    Engine(
+        "warm_start",
+        "main_loop",
+        warm_started_main_loop,
+        {
+            "WTO": (1e-3, 0.0),
+            "WSR": (0.0, 2e-3),
+            "TWR": (0.0, 2e-3),
+            "betas": (0.0, 1e-4),
+        },
+        "main_loop seeded with the previous converged solution (Sizing.sweep.warm_start)",
+    )
+)
+register_engine(
+    Engine(
+        "vectorized_design_point",
+        "constraints",
+        vectorized_design_point,
+        {"WSR": (1e-12, 0.0), "TWR": (1e-12, 0.0)},
+        "Vectorized constraint envelope and design point (monte_carlo.design_point)",
+        quantities=("WSR", "TWR"),
+    )
+)
+register_engine(
+    Engine(
+        "batch_main_loop",
+        "main_loop",
+        batch_main_loop,
+        {"WTO": (1e-9, 0.0), "WSR": (1e-12, 0.0), "TWR": (1e-12, 0.0)},
+        "Vectorized Beta and WTO loops (monte_carlo.solve_batch)",
+        quantities=("WTO", "WSR", "TWR"),
+    )
+)
+register_engine(
+    Engine(
+        "vectorized_off_design",
+        "off_design",
+        vectorized_off_design,
+        ## Newton iterations stopped at 1e-3 lb
+        {"fuel": (0.0, 1e-2), "block_fuel": (0.0, 1e-2)},
+        "Vectorized Newton iterations on the fuel (OffDesign.mission_fuel)",
+    )
+)
+
+
+############################################
+# Harness
+############################################
+
+
+def compare(reference, candidate, tolerances, quantities=None):
+    """
+    Compares the results of an engine with the legacy results, on the given quantities (all the
+    quantities of the legacy results by default).
+    Returns:
+    dict: {quantity: {"max_abs": ..., "max_rel": ..., "passed": ...}}.
+    """
+    comparison = {}
+    for quantity in quantities or reference[0]:
+        rtol, atol = tolerances.get(quantity, (1e-9, 0.0))
+        max_abs = 0.0
+        max_rel = 0.0
+        passed = True
+        for ref_case, case in zip(reference, candidate):
+            ref_value = np.atleast_1d(np.asarray(ref_case[quantity], dtype=float))
+            value = np.atleast_1d(np.asarray(case.get(quantity, np.nan), dtype=float))
+            if ref_value.shape != value.shape:
+                passed = False
+                max_abs = max_rel = float("inf")
+                continue
+            deviation = np.abs(value - ref_value)
+            max_abs = max(max_abs, float(np.max(deviation)))
+            scale = np.maximum(np.abs(ref_value), np.finfo(float).tiny)
+            max_rel = max(max_rel, float(np.max(deviation / scale)))
+            passed = passed and bool(
+                np.all(deviation <= atol + rtol * np.abs(ref_value))
+            )
+        comparison[quantity] = {
+            "max_abs": max_abs,
+            "max_rel": max_rel,
+            "rtol": rtol,
+            "atol": atol,
+            "passed": passed,
+        }
+    return comparison
+
+
+def level_cases(level, corpus, reference):
+    """Builds the cases of a level. The constraints level needs the legacy mission results."""
+    if level == "atmosphere":
+        return [atmosphere_altitudes(corpus)]
+    if level == "mission":
+        return [(WSR, TWR, mission_data) for _, mission_data in corpus]
+    if level == "constraints":
+        return [
+            (result["betas"], mission_data)
+            for result, (_, mission_data) in zip(reference["mission"], corpus)
+        ]
+    if level == "off_design":
+        payload_fractions, range_fractions = np.array(OFF_DESIGN_CASES).T
+        cases = []
+        for _, mission_data in corpus:
+            cruise_index, _ = design_phases(mission_data)
+            cases.append(
+                (
+                    mission_data,
+                    payload_fractions * Aircraft.Payload.Wpayload.value,
+                    range_fractions * mission_data["phases"][cruise_index]["range"],
+                )
+            )
+        return cases
+    return [mission_data for _, mission_data in corpus]
+
+
+def _timed(function, cases):
+    start = time.perf_counter()
+    results = function(cases)
+    return results, time.perf_counter() - start
+
+
+def run_harness(engine_names=None, levels=None, n_random=3, seed=0):
+    """
+    Runs the legacy implementation and the selected engines on the corpus.
+    Parameters:
+    engine_names (List[str], optional): Engines to check, all the registered engines by default.
+    levels (List[str], optional): Levels to check, all the levels with an engine by default.
+    n_random (int, optional): Number of randomized missions in the corpus. Defaults to 3.
+    seed (int, optional): Seed of the randomized missions. Defaults to 0.
+    Returns:
+    dict: Report with, for each engine, the comparison of each quantity and the speedup.
+    """
+    engines = [
+        ENGINES[name] for name in (engine_names or ENGINES.keys()) if name in ENGINES
+    ]
+    if levels is None:
+        levels = [level for level in LEVELS if any(e.level == level for e in engines)]
+    if "constraints" in levels and "mission" not in levels:
+        levels = ["mission"] + list(levels)
+    corpus = build_corpus(n_random, seed)
+
+    reference = {}
+    legacy_times = {}
+    for level in LEVELS:
+        if level not in levels:
+            continue
+        cases = level_cases(level, corpus, reference)
+        reference[level], legacy_times[level] = _timed(LEGACY[level], cases)
+
+    report = {
+        "corpus": [name for name, _ in corpus],
+        "legacy_time": legacy_times,
+        "engines": {},
+    }
+    for engine in engines:
+        if engine.level not in reference:
+            continue
+        cases = level_cases(engine.level, corpus, reference)
+        results, elapsed = _timed(engine.run, cases)
+        comparison = compare(
+            reference[engine.level], results, engine.tolerances, engine.quantities
+        )
+        report["engines"][engine.name] = {
+            "level": engine.level,
+            "description": engine.description,
+            "time": elapsed,
+            "speedup": legacy_times[engine.level] / elapsed if elapsed > 0 else None,
+            "passed": all(q["passed"] for q in comparison.values()),
+            "quantities": comparison,
+        }
+    return report
+
+
+def print_report(report):
+    print("\n")
+    print("############################################")
+    print("Equivalence report, corpus: " + ", ".join(report["corpus"]))
+    print("############################################")
+    for name, engine in report["engines"].items():
+        status = "PASSED" if engine["passed"] else "FAILED"
+        speedup = engine["speedup"]
+        print(
+            f"{name} ({engine['level']}): {status}, "
+            f"{engine['time']:.3f} s vs legacy {report['legacy_time'][engine['level']]:.3f} s"
+            + (f" (speedup x{speedup:.1f})" if speedup else "")
+        )
+        for quantity, values in engine["quantities"].items():
+            print(
+                f"    {quantity:<22} max abs {values['max_abs']:.3e}  "
+                f"max rel {values['max_rel']:.3e}  "
+                f"(rtol {values['rtol']:.0e}, atol {values['atol']:.0e})"
+                + ("" if values["passed"] else "  OUT OF TOLERANCE")
+            )
+    print("############################################")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Equivalence of the fast engines")
+    parser.add_argument("--engines", nargs="*", help="Engines to check (default: all)")
+    parser.add_argument("--levels", nargs="*", choices=LEVELS, help="Levels to check")
+    parser.add_argument("--random", type=int, default=3, help="Randomized missions")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the randomized missions")
+    parser.add_argument("--output", help="Write the report to a JSON file")
+    args = parser.parse_args(argv)
+    report = run_harness(args.engines, args.levels, args.random, args.seed)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+    return 0 if all(e["passed"] for e in report["engines"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
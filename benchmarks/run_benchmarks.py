@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+"""
+Benchmark suite of the sizing tool.
+Times the main stages of a sizing run on the shipped `Inputs/Mission_Profile.json`:
+    - `Atmosphere` property access,
+    - `wf_wi` and `Thrust_Weight_Ratio` of each segment class, for a scalar wing loading and for
+      the 700 wing loadings of the constraint analysis,
+    - `Compute_Mission_Profile_Parametric`,
+    - `constraint_analysis_main`,
+    - `Beta_loop.main_loop` end to end.
+Each stage is run `repeat` times and the best time is kept. The timings are compared with the
+baseline stored in `benchmarks/baseline.json`: the suite fails (exit code 1) when a stage is slower
+than `--max-ratio` times its baseline (stages faster than `--min-time` are not checked, their timing
+is mostly noise). Baselines are machine dependent, update them with `--update-baseline`.
+Usage (from the root of the project):
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --quick            # skip the full mission and main_loop stages
+    python -m benchmarks.run_benchmarks --stages atmosphere segment/climb
+    python -m benchmarks.run_benchmarks --update-baseline
+"""
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import Beta_loop as bl
+import Data_formating as df
+from Sizing.Mission_analysis import Main_Mission_Parametric
+from Sizing.constraint_analysis import Constraints_Parametric
+from Sizing.utils.atmosphere import Atmosphere
+from Sizing.Variable_info.variables import Aircraft
+
+MISSION_FILE = os.path.join(ROOT_DIR, "Inputs", "Mission_Profile.json")
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+## Converged design of the shipped mission, used for the stages that need a design point
+WSR = 110.71530758226038
+TWR = 0.2968040450132129
+WING_LOADINGS = np.linspace(30, 170, 700)
+SLOW_STAGES = ("mission", "constraint_analysis", "main_loop")
+
+
+def load_mission():
+    return df.load_mission_profile(MISSION_FILE)
+
+
+def converged_mission():
+    """Mission with the weight fractions of the converged design, for the constraint analysis."""
+    mission = load_mission()
+    Main_Mission_Parametric.Compute_Mission_Profile_Parametric(WSR, TWR, mission)
+    return mission
+
+
+def time_stage(function, setup=None, repeat=3):
+    """
+    Returns the best wall time (s) of function over repeat runs. setup returns the arguments of
+    function and is not timed.
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def atmosphere_stage():
+    for altitude in (0, 10000, 35000):
+        atm = Atmosphere(altitude)
+        atm.temperature
+        atm.pressure
+        atm.density
+        atm.speed_of_sound
+        atm.density_ratio
+        atm.pressure_ratio
+        atm.temperature_ratio
+
+
+def stages(repeat=3):
+    """
+    Returns the list of (name, function, setup, repeat) of the benchmark stages.
+    """
+    stages_list = [("atmosphere", atmosphere_stage, None, repeat)]
+
+    ## One segment of each class of the shipped mission
+    mission = load_mission()
+    classes = {}
+    for segment in mission:
+        classes.setdefault(segment.__class__.__name__, segment)
+    for class_name, segment in classes.items():
+        for label, wing_loading in (("scalar", WSR), ("700", WING_LOADINGS)):
+            stages_list.append(
+                (
+                    f"segment/{class_name}/wf_wi/{label}",
+                    lambda segment=segment, wing_loading=wing_loading: segment.wf_wi(
+                        wing_loading, TWR
+                    ),
+                    None,
+                    repeat,
+                )
+            )
+            stages_list.append(
+                (
+                    f"segment/{class_name}/Thrust_Weight_Ratio/{label}",
+                    lambda segment=segment, wing_loading=wing_loading: (
+                        segment.Thrust_Weight_Ratio(wing_loading)
+                    ),
+                    None,
+                    repeat,
+                )
+            )
+
+    stages_list.append(
+        (
+            "mission",
+            lambda mission: Main_Mission_Parametric.Compute_Mission_Profile_Parametric(
+                WSR, TWR, mission
+            ),
+            lambda: (load_mission(),),
+            1,
+        )
+    )
+    stages_list.append(
+        (
+            "constraint_analysis",
+            lambda mission: Constraints_Parametric.constraint_analysis_main(mission),
+            lambda: (converged_mission(),),
+            1,
+        )
+    )
+    stages_list.append(
+        (
+            "main_loop",
+            lambda mission: bl.main_loop(
+                mission,
+                Aircraft.Payload.Wcrew.value,
+                Aircraft.Payload.Wpayload.value,
+                guess_WTO=10000,
+            ),
+            lambda: (load_mission(),),
+            1,
+        )
+    )
+    return stages_list
+
+
+def run(selected=None, quick=False, repeat=3):
+    """
+    Runs the benchmark stages and returns {stage name: best time (s)}.
+    selected is a list of stage name prefixes, quick skips the slow stages.
+    """
+    timings = {}
+    for name, function, setup, stage_repeat in stages(repeat):
+        if quick and name in SLOW_STAGES:
+            continue
+        if selected and not any(name.startswith(prefix) for prefix in selected):
+            continue
+        timings[name] = time_stage(function, setup, stage_repeat)
+        print(f"{name:<50} {timings[name]:>12.6f} s", flush=True)
+    return timings
+
+
+def compare(timings, baseline, max_ratio=1.5, min_time=0.005):
+    """
+    Compares the timings with the baseline.
+    Returns:
+    List[tuple]: (stage name, time, baseline time, ratio) of the stages that regressed.
+    """
+    regressions = []
+    for name, elapsed in timings.items():
+        reference = baseline.get(name)
+        if reference is None or max(elapsed, reference) < min_time:
+            continue
+        ratio = elapsed / reference if reference > 0 else float("inf")
+        if ratio > max_ratio:
+            regressions.append((name, elapsed, reference, ratio))
+    return regressions
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)["timings"]
+
+
+def save_baseline(timings, path=BASELINE_FILE):
+    baseline = load_baseline(path)
+    baseline.update(timings)
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "machine": platform.platform(),
+                "python": platform.python_version(),
+                "timings": dict(sorted(baseline.items())),
+            },
+            file,
+            indent=4,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the sizing tool")
+    parser.add_argument("--stages", nargs="*", help="Run only the stages with these prefixes")
+    parser.add_argument("--quick", action="store_true", help="Skip the slow stages")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of the fast stages")
+    parser.add_argument(
+        "--max-ratio",
+        type=float,
+        default=float(os.environ.get("AE_SIZING_BENCH_MAX_RATIO", 1.5)),
+        help="Maximum allowed time / baseline time ratio (default 1.5)",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.005,
+        help="Stages faster than this (s) are not checked (default 0.005)",
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store the timings of this run as the new baseline",
+    )
+    parser.add_argument("--output", help="Write the timings of this run to a JSON file")
+    args = parser.parse_args(argv)
+
+    timings = run(args.stages, args.quick, args.repeat)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(timings, file, indent=4)
+    if args.update_baseline:
+        save_baseline(timings, args.baseline)
+        print(f"Baseline updated in {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print("No baseline found, run with --update-baseline to create one")
+        return 0
+    regressions = compare(timings, baseline, args.max_ratio, args.min_time)
+    for name, elapsed, reference, ratio in regressions:
+        print(
+            f"REGRESSION {name}: {elapsed:.6f} s vs baseline {reference:.6f} s "
+            f"(x{ratio:.2f} > x{args.max_ratio})"
+        )
+    if regressions:
+        return 1
+    print(f"No stage slower than x{args.max_ratio} its baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
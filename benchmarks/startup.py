@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+"""
+Startup time of the sizing tool.
+Short command line runs and the worker processes of the parallel studies pay the import time of
+the sizing modules on every start. Each target is imported in `repeat` fresh interpreters and the
+median wall time of the import is reported, with the heavy optional libraries (plotting, GUI,
+atmosphere tables) that the import loaded. The solver path (`Beta_loop`, `Data_formating`) must not
+load any of them: they are imported on first use.
+Usage (from the root of the project):
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 10 --output startup.json
+    python -m benchmarks.startup --modules Beta_loop Sizing.uncertainty.monte_carlo
+"""
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_MODULES = (
+    "Beta_loop",
+    "Data_formating",
+    "Main",
+    "Sizing.uncertainty.monte_carlo",
+    "Sizing.sweep.doe",
+    "gui.Constraints_plot",
+)
+HEAVY_MODULES = ("matplotlib", "plotly", "tkinter", "ussa1976", "xarray", "pandas", "scipy")
+## Run in the child interpreter: time of the import and heavy modules it loaded
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"time": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, repeat=5) -> dict:
+    """
+    Imports module in repeat fresh interpreters.
+    Returns:
+    dict: "median" and "min" import times (s), "loaded" heavy modules.
+    """
+    times = []
+    loaded = []
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=ROOT_DIR,
+            env=env,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["time"])
+        loaded = result["loaded"]
+    return {"median": statistics.median(times), "min": min(times), "loaded": loaded}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import time of the sizing modules")
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_MODULES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'module':<35} {'median (s)':>10} {'min (s)':>10}  heavy modules loaded")
+    for module in args.modules:
+        results[module] = measure(module, args.repeat)
+        print(
+            f"{module:<35} {results[module]['median']:>10.3f} {results[module]['min']:>10.3f}  "
+            f"{', '.join(results[module]['loaded']) or '-'}"
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
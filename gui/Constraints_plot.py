@@ -3,21 +3,29 @@ from typing import List
 import plotly.graph_objects as go
 import Sizing.MissionProfile.segments as sg
 from Sizing.Variable_info.variables import Aircraft
+from Sizing.Mission_analysis.Snapshot import design_snapshot
+import gui.decimation as decimation
 import numpy as np
 
 
-def T_WS_WS_diagram(segment_list: List[sg.segments]):
+def T_WS_WS_diagram(
+    segment_list: List[sg.segments],
+    show=True,
+    output="outputs/TWR_and_WSR_per_phase.html",
+):
     """
     Generates and displays bar plots for Thrust-to-Weight Ratio (TWR) and Wing Loading (WSR)
     for each flight phase based on the provided segment list. The plots are saved as HTML files.
     Parameters:
     segment_list (List[sg.segments]): A list of flight segments, where each segment contains
                                       information about the flight phase and alpha segment.
+    show (bool, optional): Display the plots in the browser (blocking). Defaults to True.
+    output (str, optional): HTML file of the plots, None to not write it.
     Returns:
-    None
+    plotly.graph_objs._figure.Figure: The generated figure.
     The function performs the following steps:
     1. Retrieves weight fractions, thrust-to-weight ratio, and wing loading from the Aircraft design.
-    2. Extracts phase numbers and calculates alpha values for each segment.
+    2. Reads the names and thrust lapses of the segments from the design snapshot.
     3. Asserts that the number of alphas matches the number of weight fractions.
     4. Calculates TWR and WSR for each phase.
     5. Creates and displays a bar plot for TWR per phase.
@@ -29,9 +37,10 @@ def T_WS_WS_diagram(segment_list: List[sg.segments]):
     Betas_list = Aircraft.Design.Weight_fractions.value
     TWR_to = Aircraft.Design.THRUST_TO_WEIGHT.value
     WSR_to = Aircraft.Design.WING_LOADING.value
-    phases = [str(segment.phase_number) for segment in segment_list]
-    names = [str(segment.name) for segment in segment_list]
-    alphas = [segment.alpha_seg(WSR_to) for segment in segment_list]
+    snapshot = design_snapshot(segment_list)
+    phases = snapshot["phase"].tolist()
+    names = snapshot["name"].tolist()
+    alphas = snapshot["thrust_lapse"].tolist()
     ## Check if the number of alphas is the same as the number of segments
     assert len(alphas) == len(Betas_list)
     TWR = [float(alphas[i]) / Betas_list[i] * TWR_to for i in range(len(Betas_list))]
@@ -102,10 +111,11 @@ def T_WS_WS_diagram(segment_list: List[sg.segments]):
         yaxis=dict(tickformat=",.2f"),
     )
 
-    if not os.path.exists("outputs"):
-        os.mkdir("outputs")
-    fig.write_html("outputs/TWR_and_WSR_per_phase.html")
-    fig.show()
+    if output is not None:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        fig.write_html(output)
+    if show:
+        fig.show()
     return fig
 
 
@@ -115,27 +125,57 @@ def constraints_plots(
     y_max,
     wing_loading_landing,
     names,
+    show=True,
+    output="outputs/Constraint_analysis.html",
+    webgl=True,
+    tolerance=0.5,
+    envelope_only=False,
 ):
+    """
+    Constraint diagram: thrust-to-weight ratio of each constraint against the wing loading, the
+    feasible design space and the design point (see `constraint_analysis_main` for the inputs).
+    show (bool, optional): Display the diagram in the browser (blocking). Defaults to True.
+    output (str, optional): HTML file of the diagram, None to not write it.
+    webgl (bool, optional): Draw the curves with WebGL (Scattergl). Defaults to True.
+    tolerance (float, optional): Decimation tolerance of the curves in pixels (see
+                                 `gui.decimation`), None to draw all the points. Defaults to 0.5.
+    envelope_only (bool, optional): Only draw the feasible design space, not the curve of each
+                                    constraint. Defaults to False.
+    Returns:
+    plotly.graph_objs._figure.Figure: The generated figure.
+    """
 
     final_TWR = Aircraft.Design.THRUST_TO_WEIGHT.value
     final_WSR = Aircraft.Design.WING_LOADING.value
+    Scatter = go.Scattergl if webgl else go.Scatter
+    curves = [] if envelope_only else list(Thrusts_Weight_ratios)
+    ## y range: the feasible design space is filled up to 1
+    scales = decimation.pixel_scales([wing_loading], curves + [y_max, [1]])
+
+    def points(y):
+        if tolerance is None:
+            return wing_loading, y
+        return decimation.decimate(wing_loading, y, scales, tolerance)
+
     """Plotting"""
     fig = go.Figure()
-    for i, TWR in enumerate(Thrusts_Weight_ratios):
+    for i, TWR in enumerate(curves):
+        x, y = points(TWR)
         fig.add_trace(
-            go.Scatter(
-                x=wing_loading,
-                y=TWR,
+            Scatter(
+                x=x,
+                y=y,
                 mode="lines",
                 name=names[i],
                 line=dict(dash="dash" if i < 10 else "solid"),
             )
         )
 
+    x_envelope, y_envelope = points(y_max)
     fig.add_trace(
-        go.Scatter(
-            x=wing_loading,
-            y=y_max,
+        Scatter(
+            x=x_envelope,
+            y=y_envelope,
             mode="lines",
             name="feasible design space",
             line=dict(color="green", width=4),
@@ -144,7 +184,7 @@ def constraints_plots(
 
     # Add a red point for the final WSR and TWR
     fig.add_trace(
-        go.Scatter(
+        Scatter(
             x=[final_WSR],
             y=[final_TWR],
             mode="markers",
@@ -155,10 +195,10 @@ def constraints_plots(
 
     # Fill the feasible design space
     fig.add_trace(
-        go.Scatter(
-            x=np.concatenate([wing_loading, wing_loading[::-1]]),
+        Scatter(
+            x=np.concatenate([x_envelope, x_envelope[::-1]]),
             y=np.concatenate(
-                [y_max, np.ones_like(y_max)]
+                [y_envelope, np.ones_like(y_envelope)]
             ),  # fill to the top of the plot
             fill="toself",
             fillcolor="rgba(144, 238, 144, 0.5)",  # Light Green
@@ -168,9 +208,9 @@ def constraints_plots(
     )
 
     fig.add_trace(
-        go.Scatter(
+        Scatter(
             x=[wing_loading_landing] * 2,
-            y=[0, max(fig.data[-1].y) * 1.1],
+            y=[0, np.nanmax(fig.data[-1].y) * 1.1],
             mode="lines",
             name="Landing Constraint",
             line=dict(dash="dash", color="red"),
@@ -183,8 +223,104 @@ def constraints_plots(
         yaxis_title="Thrust to Weight Ratio",
         legend_title="Mission Segments",
     )
-    if not os.path.exists("outputs"):
-        os.mkdir("outputs")
-    fig.write_html("outputs/Constraint_analysis.html")
+    if output is not None:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        fig.write_html(output)
     # fig.write_image("outputs/TWR_vs_Wing_Loading.png")
-    fig.show()
+    if show:
+        fig.show()
+    return fig
+
+
+def envelopes_plot(
+    envelopes: dict,
+    envelope_only=True,
+    tolerance=0.5,
+    show=True,
+    output="outputs/Constraint_envelopes.html",
+):
+    """
+    Overlay of the constraint diagrams of many designs (e.g. the missions of a batch or the points
+    of a sweep). The curves of all the designs are drawn by a few WebGL traces (one for the feasible
+    design spaces, one per constraint, one for the design points and one for the landing
+    constraints, the designs being separated by NaNs), so hundreds of designs stay interactive.
+    Parameters:
+    envelopes (dict): {design name: constraints of `Beta_loop.main_loop` (results[5])}.
+    envelope_only (bool, optional): Only draw the feasible design space of each design, not the
+                                    curve of each constraint. Defaults to True.
+    tolerance (float, optional): Decimation tolerance of the curves in pixels, None to draw all the
+                                 points. Defaults to 0.5.
+    show (bool, optional): Display the diagram in the browser (blocking). Defaults to True.
+    output (str, optional): HTML file of the diagram, None to not write it.
+    Returns:
+    plotly.graph_objs._figure.Figure: The generated figure.
+    """
+    labels = list(envelopes)
+    constraints = list(envelopes.values())
+    scales = decimation.pixel_scales(
+        [c[2] for c in constraints],
+        [c[4] for c in constraints]
+        + ([] if envelope_only else [TWR for c in constraints for TWR in c[3]]),
+    )
+
+    def points(wing_loading, y):
+        if tolerance is None:
+            return wing_loading, y
+        return decimation.decimate(wing_loading, y, scales, tolerance)
+
+    def trace(curves, **kwargs):
+        x, y, index = decimation.join(curves)
+        hovertext = [labels[i] if i >= 0 else "" for i in index]
+        return go.Scattergl(x=x, y=y, hovertext=hovertext, **kwargs)
+
+    fig = go.Figure()
+    if not envelope_only:
+        ## One trace per constraint name, with the curves of all the designs
+        curves = {}
+        for c in constraints:
+            for name, TWR in zip(c[6], c[3]):
+                curves.setdefault(name, []).append(points(c[2], TWR))
+        for i, (name, constraint_curves) in enumerate(curves.items()):
+            fig.add_trace(
+                trace(
+                    constraint_curves,
+                    mode="lines",
+                    name=name,
+                    line=dict(dash="dash" if i < 10 else "solid", width=1),
+                )
+            )
+    fig.add_trace(
+        trace(
+            [points(c[2], c[4]) for c in constraints],
+            mode="lines",
+            name="feasible design space",
+            line=dict(color="green", width=2),
+        )
+    )
+    fig.add_trace(
+        trace(
+            [([c[5]] * 2, [0, np.nanmax(c[4]) * 1.1]) for c in constraints],
+            mode="lines",
+            name="Landing Constraint",
+            line=dict(dash="dash", color="red", width=1),
+        )
+    )
+    fig.add_trace(
+        trace(
+            [([float(c[0])], [float(c[1])]) for c in constraints],
+            mode="markers",
+            name="Design Points",
+            marker=dict(color="red", size=6, symbol="circle"),
+        )
+    )
+    fig.update_layout(
+        title=f"Thrust to Weight Ratio vs Wing Loading ({len(labels)} designs)",
+        xaxis_title="Wing Loading (lb/ft^2)",
+        yaxis_title="Thrust to Weight Ratio",
+    )
+    if output is not None:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        fig.write_html(output)
+    if show:
+        fig.show()
+    return fig
@@ -3,29 +3,38 @@ import Sizing.MissionProfile.segments as sg
 import plotly.graph_objects as go
 from typing import List
 from Sizing.Variable_info.variables import Aircraft
+from Sizing.Mission_analysis.Snapshot import design_snapshot
 
 import os
 
 
-def plots_aero_prop(segment_list: List[sg.segments]):
+def plots_aero_prop(
+    segment_list: List[sg.segments],
+    show=True,
+    output="outputs/aero_and_prop_characteristics.html",
+):
     """
     Generates a chart representing the lift-to-drag ratios of an aircraft for different flight phases.
     The function retrieves the lift-to-drag ratios for each flight phase and creates
     a chart using Plotly to visualize these ratios. The chart is saved as an HTML file in the "outputs"
     directory and is also displayed in the browser.
+    Parameters:
+        segment_list (List[sg.segments]): Segments of the sized mission.
+        show (bool, optional): Display the chart in the browser (blocking). Defaults to True.
+        output (str, optional): HTML file of the chart, None to not write it.
     Returns:
         fig (plotly.graph_objs._figure.Figure): The generated Plotly figure object.
     """
 
-    phases = [str(segment.phase_number) for segment in segment_list]
-    names = [str(segment.name) for segment in segment_list]
-    WSR = Aircraft.Design.WING_LOADING.value
+    ## Rendered from the segment snapshot of the design, the segment physics are not called here
+    snapshot = design_snapshot(segment_list)
+    names = snapshot["name"].tolist()
     TSL = Aircraft.Design.Sea_level_Thrust.value
-    lift_drag_ratios = [float(segment.lift_drag_ratio(WSR)) for segment in segment_list]
-    tsfc = [float(segment.tsfc(WSR)) * 3600 for segment in segment_list]
-    lift_coefficients = [float(segment.Cl(WSR)) for segment in segment_list]
-    drag_coefficients = [float(segment.Cd(WSR)) for segment in segment_list]
-    thruts = [float(segment.alpha_seg(WSR)) * TSL for segment in segment_list]
+    lift_drag_ratios = snapshot["lift_drag_ratio"].tolist()
+    tsfc = (snapshot["tsfc"] * 3600).tolist()
+    lift_coefficients = snapshot["Cl"].tolist()
+    drag_coefficients = snapshot["Cd"].tolist()
+    thruts = (snapshot["thrust_lapse"] * TSL).tolist()
 
     fig = go.Figure()
 
@@ -158,8 +167,9 @@ def plots_aero_prop(segment_list: List[sg.segments]):
         xaxis=dict(tickmode="array", tickvals=names),
     )
 
-    if not os.path.exists("outputs"):
-        os.mkdir("outputs")
-    fig.write_html("outputs/aero_and_prop_characteristics.html")
-    fig.show()
+    if output is not None:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        fig.write_html(output)
+    if show:
+        fig.show()
     return fig
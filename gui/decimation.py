@@ -0,0 +1,140 @@
+import numpy as np
+
+"""
+This module reduces the number of points of the curves drawn by the plots, so the HTML files and
+the browser stay light when many curves are overlaid (e.g. the constraint envelopes of hundreds of
+designs).
+The curves are simplified with the Douglas-Peucker algorithm in pixel units: a point is dropped if
+it is closer than `tolerance` pixels to the simplified curve, so the decimated curve cannot be told
+apart from the original one on screen. The pixel scales come from the ranges of the plotted data and
+the size of the plot (PLOT_WIDTH x PLOT_HEIGHT pixels, larger than the default plotly figure, so the
+decimation stays invisible when the plot is enlarged a little).
+Non-finite points (NaN, inf) are gaps of the curve: each finite part is decimated on its own and the
+parts are separated by a NaN, as drawn by plotly.
+Usage:
+    scales = decimation.pixel_scales([wing_loading], Thrusts_Weight_ratios)
+    x, y = decimation.decimate(wing_loading, TWR, scales)
+Functions:
+    douglas_peucker(x, y, tolerance) -> np.ndarray:
+        Indices of the points kept by the Douglas-Peucker algorithm.
+    pixel_scales(xs, ys, width=PLOT_WIDTH, height=PLOT_HEIGHT) -> tuple:
+        Pixels per unit of the x and y axes.
+    decimate(x, y, scales, tolerance=0.5) -> tuple:
+        Decimated curve.
+    join(curves) -> tuple:
+        Single curve of many curves separated by NaNs (one plotly trace).
+"""
+
+PLOT_WIDTH = 1600  ## pixels
+PLOT_HEIGHT = 900  ## pixels
+
+
+def douglas_peucker(x, y, tolerance) -> np.ndarray:
+    """
+    Douglas-Peucker simplification of the curve (x, y).
+    Parameters:
+    x, y (np.ndarray): Finite coordinates of the points, in the units of tolerance.
+    tolerance (float): Largest distance between a dropped point and the simplified curve.
+    Returns:
+    np.ndarray: Sorted indices of the points kept, first and last points included.
+    """
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    ## Iterative, the recursion depth would be the number of points for some curves
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx = x[end] - x[start]
+        dy = y[end] - y[start]
+        xs = x[start + 1 : end] - x[start]
+        ys = y[start + 1 : end] - y[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(xs, ys)
+        else:
+            distances = np.abs(dx * ys - dy * xs) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            middle = start + 1 + farthest
+            keep[middle] = True
+            stack.append((start, middle))
+            stack.append((middle, end))
+    return np.flatnonzero(keep)
+
+
+def pixel_scales(xs, ys, width=PLOT_WIDTH, height=PLOT_HEIGHT) -> tuple:
+    """
+    Pixels per unit of the axes of a plot showing the curves xs and ys.
+    Parameters:
+    xs, ys (list): x and y coordinates of the plotted curves (arrays), the ranges of the axes are
+                   the ranges of their finite values.
+    width, height (int, optional): Size of the plot in pixels.
+    Returns:
+    tuple: (x scale, y scale) in pixels per unit.
+    """
+
+    def scale(values, pixels):
+        values = np.concatenate([np.ravel(np.asarray(v, dtype=float)) for v in values])
+        values = values[np.isfinite(values)]
+        if values.size == 0 or values.max() == values.min():
+            return 1.0
+        return pixels / (values.max() - values.min())
+
+    return scale(xs, width), scale(ys, height)
+
+
+def decimate(x, y, scales, tolerance=0.5) -> tuple:
+    """
+    Decimates the curve (x, y) to the points needed to draw it within tolerance pixels.
+    Parameters:
+    x, y (array-like): Coordinates of the curve.
+    scales (tuple): Pixels per unit of the axes, see `pixel_scales`.
+    tolerance (float, optional): Tolerance in pixels. Defaults to 0.5.
+    Returns:
+    tuple: (x, y) arrays of the decimated curve, gaps as NaNs.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    ## Start and end (excluded) of the finite parts of the curve
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], finite, [False]]).astype(int)))
+    parts_x, parts_y = [], []
+    for start, end in zip(edges[::2], edges[1::2]):
+        kept = start + douglas_peucker(
+            x[start:end] * scales[0], y[start:end] * scales[1], tolerance
+        )
+        if parts_x:
+            parts_x.append([np.nan])
+            parts_y.append([np.nan])
+        parts_x.append(x[kept])
+        parts_y.append(y[kept])
+    if not parts_x:
+        return np.array([]), np.array([])
+    return np.concatenate(parts_x), np.concatenate(parts_y)
+
+
+def join(curves) -> tuple:
+    """
+    Joins curves into a single curve, separated by NaNs, so they are drawn by one plotly trace.
+    Parameters:
+    curves (list): (x, y) of each curve.
+    Returns:
+    tuple: (x, y) arrays, and the index of the curve of each point (-1 for the separators).
+    """
+    xs, ys, index = [], [], []
+    for i, (x, y) in enumerate(curves):
+        if xs:
+            xs.append([np.nan])
+            ys.append([np.nan])
+            index.append([-1])
+        xs.append(np.asarray(x, dtype=float))
+        ys.append(np.asarray(y, dtype=float))
+        index.append(np.full(len(xs[-1]), i))
+    if not xs:
+        return np.array([]), np.array([]), np.array([], dtype=int)
+    return np.concatenate(xs), np.concatenate(ys), np.concatenate(index)
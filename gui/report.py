@@ -0,0 +1,244 @@
+import html
+import os
+from typing import List
+from plotly.offline import get_plotlyjs
+import gui.Constraints_plot as Constraints_plot
+import gui.aero_prop as aero_prop
+import gui.weight_breakdown as weight_breakdown
+from Sizing.Variable_info.variables import Aircraft
+from Sizing.Mission_analysis.Snapshot import segment_snapshot
+
+"""
+This module writes the figures of a sized design into a single static HTML report, without opening
+a browser (headless mode of `Main.py`, e.g. batch jobs on servers).
+The figures of `gui.aero_prop`, `gui.weight_breakdown` and `gui.Constraints_plot` are generated with
+show=False and no HTML file of their own, then written one after the other in the report with the
+final design table. plotly.js (about 4 MB) is included once per report:
+    - "embed": inlined in the report, which is then self-contained,
+    - "directory": referenced as plotly.min.js, written once next to the reports,
+    - "cdn": referenced from the plotly CDN (needs an internet connection to view).
+The reports of many designs are rendered by a pool of worker processes.
+Usage:
+    python Main.py --headless
+    python Main.py mission_1.json mission_2.json --processes 4
+Functions:
+    apply_design(results):
+        Stores the `main_loop` results and the segment snapshot in the Aircraft class, as read by
+        the plots.
+    design_figures(results) -> List[tuple]:
+        (title, figure) of each plot of a design.
+    write_report(path, figures, title, tables=(), plotlyjs="embed") -> str:
+        Writes figures and HTML tables into a single report.
+    render_report(results, path, title=None, plotlyjs="embed") -> str:
+        Report of a design.
+    render_reports(designs, output_dir, processes=1, plotlyjs="directory") -> List[str]:
+        Reports of many designs, rendered in parallel.
+    render_envelopes(designs, path, envelope_only=True, plotlyjs="directory") -> str:
+        Overlay of the constraint diagrams of many designs.
+"""
+
+PLOTLYJS_MODES = {"embed": True, "directory": "directory", "cdn": "cdn"}
+
+
+def _write_plotlyjs(directory):
+    """Writes plotly.min.js in directory, for the reports written with plotlyjs="directory"."""
+    bundle = os.path.join(directory, "plotly.min.js")
+    if not os.path.exists(bundle):
+        with open(bundle, "w", encoding="utf-8") as file:
+            file.write(get_plotlyjs())
+
+
+def apply_design(results):
+    """
+    Stores the results of `Beta_loop.main_loop` in the Aircraft class: takeoff weight, wing
+    loading, thrust-to-weight ratio, weight fractions, aerodynamic and propulsion snapshot of the
+    segments, wing area and span, sea level thrust, empty and fuel weights.
+    """
+    WTO, WSR, TWR, Beta_final = results[:4]
+    updated_segments_list = results[6]
+    Aircraft.Design.TOW.value = WTO
+    Aircraft.Design.WING_LOADING.value = WSR
+    Aircraft.Design.THRUST_TO_WEIGHT.value = TWR
+    Aircraft.Design.Weight_fractions.value = [
+        seg.weight_fraction.value for seg in updated_segments_list
+    ]
+    Aircraft.Design.Segment_snapshot.value = segment_snapshot(
+        WSR, TWR, updated_segments_list
+    )
+    Aircraft.Design.Wing_Area.value = WTO / WSR
+    Aircraft.Design.Sea_level_Thrust.value = TWR * WTO
+    Aircraft.Geometry.Wing.Span.value = (
+        Aircraft.Geometry.Wing.Aspect_Ratio.value * Aircraft.Design.Wing_Area.value
+    ) ** 0.5
+
+    # Calculate the empty weight and fuel weight
+    def empty_weight(WTO):
+        kwe = 1.15
+        return WTO * kwe / (WTO**0.06)
+
+    def fuel_weight(WTO, beta_final):
+        ### 1.06 is obtained from empirical data
+        return 1.06 * (1 - beta_final) * WTO
+
+    Aircraft.Structure.Empty_Weight.value = empty_weight(WTO)
+    Aircraft.Design.Fuel_Weight.value = fuel_weight(WTO, Beta_final)
+
+
+def design_figures(results) -> List[tuple]:
+    """
+    Figures of a design, once its results are stored in the Aircraft class (see `apply_design`).
+    Returns:
+    List[tuple]: (title, plotly figure) of each plot.
+    """
+    segments_list = results[6]
+    constraints = results[5]
+    return [
+        (
+            "Constraint analysis",
+            Constraints_plot.constraints_plots(
+                wing_loading=constraints[2],
+                Thrusts_Weight_ratios=constraints[3],
+                y_max=constraints[4],
+                wing_loading_landing=constraints[5],
+                names=constraints[6],
+                show=False,
+                output=None,
+            ),
+        ),
+        (
+            "Weights",
+            weight_breakdown.combined_weight_plot(segments_list, show=False, output=None),
+        ),
+        (
+            "Aerodynamics and propulsion",
+            aero_prop.plots_aero_prop(segments_list, show=False, output=None),
+        ),
+        (
+            "Thrust-to-weight ratio and wing loading per phase",
+            Constraints_plot.T_WS_WS_diagram(segments_list, show=False, output=None),
+        ),
+    ]
+
+
+def write_report(path, figures, title="Sizing report", tables=(), plotlyjs="embed") -> str:
+    """
+    Writes figures and HTML tables into a single HTML file, with plotly.js included once.
+    Parameters:
+    path (str): HTML file of the report.
+    figures (List[tuple]): (title, plotly figure) of each plot.
+    title (str, optional): Title of the report. Defaults to "Sizing report".
+    tables (tuple, optional): HTML fragments written before the figures. Defaults to ().
+    plotlyjs (str, optional): "embed", "directory" or "cdn", see the module docstring.
+                              Defaults to "embed".
+    Returns:
+    str: Path of the report.
+    Raises:
+    ValueError: If plotlyjs is unknown.
+    """
+    if plotlyjs not in PLOTLYJS_MODES:
+        raise ValueError(
+            f"Unknown plotlyjs mode {plotlyjs!r}, must be one of {list(PLOTLYJS_MODES)}"
+        )
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    if plotlyjs == "directory":
+        _write_plotlyjs(directory)
+    parts = [
+        "<!DOCTYPE html>",
+        '<html><head><meta charset="utf-8">',
+        f"<title>{html.escape(title)}</title></head><body>",
+        f"<h1>{html.escape(title)}</h1>",
+        *tables,
+    ]
+    for i, (figure_title, figure) in enumerate(figures):
+        parts.append(f"<h2>{html.escape(figure_title)}</h2>")
+        parts.append(
+            figure.to_html(
+                full_html=False,
+                include_plotlyjs=PLOTLYJS_MODES[plotlyjs] if i == 0 else False,
+            )
+        )
+    parts.append("</body></html>")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(parts))
+    return path
+
+
+def render_report(results, path, title=None, plotlyjs="embed") -> str:
+    """
+    Writes the report of a design (final design table and figures), without displaying anything.
+    Parameters:
+    results (tuple): `Beta_loop.main_loop` results.
+    path (str): HTML file of the report.
+    title (str, optional): Title of the report. Defaults to None (file name).
+    plotlyjs (str, optional): See `write_report`. Defaults to "embed".
+    Returns:
+    str: Path of the report.
+    """
+    apply_design(results)
+    if title is None:
+        title = os.path.splitext(os.path.basename(path))[0]
+    return write_report(
+        path,
+        design_figures(results),
+        title,
+        [weight_breakdown.final_design_table()],
+        plotlyjs,
+    )
+
+
+def _render_report_worker(args):
+    return render_report(*args)
+
+
+def render_reports(
+    designs: dict, output_dir, processes=1, plotlyjs="directory"
+) -> List[str]:
+    """
+    Writes the report of each design in output_dir (<name>.html), in parallel.
+    Parameters:
+    designs (dict): {name: `Beta_loop.main_loop` results}.
+    output_dir (str): Directory of the reports.
+    processes (int, optional): Number of worker processes. Defaults to 1.
+    plotlyjs (str, optional): See `write_report`. Defaults to "directory" (one plotly.min.js shared
+                              by the reports).
+    Returns:
+    List[str]: Paths of the reports, in the order of designs.
+    """
+    tasks = [
+        (results, os.path.join(output_dir, f"{name}.html"), name, plotlyjs)
+        for name, results in designs.items()
+    ]
+    os.makedirs(output_dir, exist_ok=True)
+    if plotlyjs == "directory":
+        ## Written before the workers start, so they do not race on it
+        _write_plotlyjs(output_dir)
+    if processes > 1 and len(tasks) > 1:
+        from multiprocessing import Pool
+
+        with Pool(min(processes, len(tasks))) as pool:
+            return pool.map(_render_report_worker, tasks)
+    return [_render_report_worker(task) for task in tasks]
+
+
+def render_envelopes(designs: dict, path, envelope_only=True, plotlyjs="directory") -> str:
+    """
+    Writes the overlay of the constraint diagrams of many designs (see
+    `Constraints_plot.envelopes_plot`).
+    Parameters:
+    designs (dict): {name: `Beta_loop.main_loop` results}.
+    path (str): HTML file of the report.
+    envelope_only (bool, optional): Only draw the feasible design spaces. Defaults to True.
+    plotlyjs (str, optional): See `write_report`. Defaults to "directory".
+    Returns:
+    str: Path of the report.
+    """
+    figure = Constraints_plot.envelopes_plot(
+        {name: results[5] for name, results in designs.items()},
+        envelope_only=envelope_only,
+        show=False,
+        output=None,
+    )
+    return write_report(
+        path, [("Constraint analysis", figure)], "Constraint envelopes", plotlyjs=plotlyjs
+    )
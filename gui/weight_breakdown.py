@@ -7,11 +7,17 @@ from Sizing.Variable_info.variables import Aircraft
 import os
 
 
-def combined_weight_plot(segment_list: List[sg.segments]):
+def combined_weight_plot(
+    segment_list: List[sg.segments],
+    show=True,
+    output="outputs/combined_weight_plot.html",
+):
     """
     Generates a combined plot with a dropdown menu to switch between weight breakdown and weight per phase.
     Args:
         segment_list (List[sg.segments]): A list of flight segments, where each segment contains a phase number.
+        show (bool, optional): Display the figure in the browser (blocking). Defaults to True.
+        output (str, optional): HTML file of the figure, None to not write it.
     Returns:
         plotly.graph_objs._figure.Figure: The generated figure with dropdown menu.
     """
@@ -107,10 +113,11 @@ def combined_weight_plot(segment_list: List[sg.segments]):
         xaxis_title="Weight Categories",
         yaxis_title="Weight (lbs)",
     )
-    if not os.path.exists("outputs"):
-        os.mkdir("outputs")
-    fig.write_html("outputs/combined_weight_plot.html")
-    fig.show()
+    if output is not None:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        fig.write_html(output)
+    if show:
+        fig.show()
     return fig
 
 
@@ -133,7 +140,14 @@ def print_Final_Design():
 
     def generate_table():
         with open("outputs/final_design_results.html", "w") as file:
-            html_table = f"""
+            file.write(final_design_table())
+
+    generate_table()
+
+
+def final_design_table() -> str:
+    """HTML table of the main results of the final design."""
+    return f"""
             <h2>Main Results</h2>
             <table>
             <tr>
@@ -183,6 +197,3 @@ def print_Final_Design():
             </tr>
             </table>
             """
-            file.write(html_table)
-
-    generate_table()
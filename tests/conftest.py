@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+"""
+Shared fixtures of the tests. The tests run from the root of the project:
+    python -m pytest -q tests
+"""
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import Data_formating as df
+from Sizing.utils import atmosphere
+
+MISSION_FILE = os.path.join(ROOT_DIR, "Inputs", "Mission_Profile.json")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cached_atmosphere():
+    ## Memoizes the atmosphere for the whole session, the sizing loops are too slow without it
+    with atmosphere.cached():
+        yield
+
+
+@pytest.fixture
+def mission_data():
+    return df.load_mission_data(MISSION_FILE)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import Beta_loop as bl
+import Data_formating as df
+from Sizing.Mission_analysis.Incremental_Mission import MissionEvaluator
+from Sizing.Mission_analysis.Main_Mission_Parametric import (
+    Compute_Mission_Profile_Parametric,
+)
+from Sizing.uncertainty import monte_carlo
+from Sizing.utils import feasibility
+from Sizing.Variable_info.variables import Aircraft
+
+"""
+Tests of the feasibility checks of the mission analysis: single evaluations raise, batches mask the
+infeasible samples.
+"""
+
+WSR = 110.71530758226038
+TWR = 0.2968040450132129
+## The cruise (phase 7) burns all the fuel the aircraft can carry
+TOO_LONG_CRUISE = {"7.range": 30000}
+
+
+def test_mission_paths_raise_weight_not_closing(mission_data):
+    with pytest.raises(feasibility.WeightNotClosing) as parametric:
+        Compute_Mission_Profile_Parametric(
+            WSR, TWR, df.build_mission(mission_data, TOO_LONG_CRUISE)
+        )
+    with pytest.raises(feasibility.WeightNotClosing) as incremental:
+        MissionEvaluator(df.build_mission(mission_data, TOO_LONG_CRUISE)).evaluate(
+            WSR, TWR
+        )
+    assert parametric.value.phase == incremental.value.phase == 7
+
+
+def test_mission_paths_agree_on_feasible_mission(mission_data):
+    betas, _ = Compute_Mission_Profile_Parametric(
+        WSR, TWR, df.build_mission(mission_data)
+    )
+    evaluator_betas, _ = MissionEvaluator(df.build_mission(mission_data)).evaluate(
+        WSR, TWR
+    )
+    assert evaluator_betas == pytest.approx(betas)
+
+
+def test_infeasible_sample_is_masked_in_batch(mission_data):
+    ## The second sample starts the Beta loop with too little thrust for the takeoff roll
+    results = monte_carlo.solve_batch(
+        mission_data,
+        {"kTSFC": np.array([0.64, 0.64])},
+        Aircraft.Payload.Wcrew.value,
+        Aircraft.Payload.Wpayload.value,
+        TWR_guess=np.array([0.3, 0.05]),
+    )
+    assert results["converged"].tolist() == [True, False]
+    assert results["WTO"][0] == pytest.approx(169689.45, abs=1)
+    assert np.isnan(results["WTO"][1])
+
+
+def test_infeasible_guess_raises_in_single_design(mission_data):
+    with pytest.raises(feasibility.InsufficientThrust) as error:
+        bl.main_loop(
+            df.build_mission(mission_data),
+            Aircraft.Payload.Wcrew.value,
+            Aircraft.Payload.Wpayload.value,
+            10000,
+            TWR_guess=0.05,
+        )
+    assert error.value.phase == 2
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from Sizing.optimization import optimizer
+from Sizing.utils.feasibility import WeightNotClosing
+
+"""
+Tests of the rejection of the infeasible points by the optimizer.
+"""
+
+## The weights do not close above a cruise range of about 5000 nmi
+BOUNDS = {"7.range": [2000, 12000]}
+
+
+def test_infeasible_point_is_penalized(mission_data):
+    problem = optimizer._Problem(
+        mission_data, BOUNDS, "WTO", "10", None, None, 1e-3, 20, 1e-6
+    )
+    feasible, _ = problem.value_and_gradient(np.array([0.0]))
+    value, grad = problem.value_and_gradient(np.array([1.0]))
+    outputs = problem.solve([np.array([1.0])], problem.dual_names)[0]
+    assert isinstance(outputs, WeightNotClosing)
+    assert value == pytest.approx(2 * feasible)
+    assert grad.tolist() == [0.0]
+    assert problem.feasibility(np.array([1.0])) == -1.0
+    assert problem.feasibility(np.array([0.0])) == 0.0
+    assert problem.rejected == 1
+
+
+def test_differential_evolution_over_infeasible_region(mission_data):
+    results = optimizer.optimize(
+        mission_data,
+        BOUNDS,
+        method="differential_evolution",
+        cache_directory=None,
+        maxiter=1,
+        popsize=3,
+        seed=0,
+    )
+    assert results.rejected > 0
+    assert results.x["7.range"] < 5000
+    assert np.isfinite(results.outputs["WTO"])
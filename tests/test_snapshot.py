@@ -0,0 +1,44 @@
+import Data_formating as df
+from Sizing.Mission_analysis.Main_Mission_Parametric import (
+    Compute_Mission_Profile_Parametric,
+)
+from Sizing.Mission_analysis.Snapshot import design_snapshot, is_current
+from Sizing.Variable_info.variables import Aircraft
+
+"""
+Tests of the reuse of the segment snapshot of the design by the plots.
+"""
+
+WSR = 110.71530758226038
+TWR = 0.2968040450132129
+
+
+def _design(monkeypatch, mission_data, WSR, TWR):
+    monkeypatch.setattr(Aircraft.Design.WING_LOADING, "value", WSR)
+    monkeypatch.setattr(Aircraft.Design.THRUST_TO_WEIGHT, "value", TWR)
+    _, segments_list = Compute_Mission_Profile_Parametric(
+        WSR, TWR, df.build_mission(mission_data)
+    )
+    return segments_list
+
+
+def test_snapshot_is_reused_for_the_same_design(monkeypatch, mission_data):
+    monkeypatch.setattr(Aircraft.Design.Segment_snapshot, "value", None)
+    segments_list = _design(monkeypatch, mission_data, WSR, TWR)
+    snapshot = design_snapshot(segments_list)
+    assert is_current(snapshot, WSR, TWR, segments_list)
+    assert design_snapshot(segments_list) is snapshot
+
+
+def test_stale_snapshot_is_recomputed(monkeypatch, mission_data):
+    monkeypatch.setattr(Aircraft.Design.Segment_snapshot, "value", None)
+    snapshot = design_snapshot(_design(monkeypatch, mission_data, WSR, TWR))
+    ## Same mission, other design: same number of segments, other weight fractions
+    segments_list = _design(monkeypatch, mission_data, 120.0, 0.32)
+    assert not is_current(snapshot, 120.0, 0.32, segments_list)
+    new_snapshot = design_snapshot(segments_list)
+    assert new_snapshot is not snapshot
+    assert (new_snapshot["WSR"] == 120.0).all()
+    assert new_snapshot["weight_fraction"].tolist() == [
+        float(segment.weight_fraction.value) for segment in segments_list
+    ]